@@ -0,0 +1,218 @@
+"""
+Cached, indexed catalog of the dataset images.
+
+The catalog indexes the image folder once (filename, class label,
+dimensions and byte size) and refreshes incrementally when the folder
+modification time changes, so listing the images no longer scans the
+folder on every request.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+
+class CatalogEntry(NamedTuple):
+    """
+    Metadata of a dataset image.
+
+    Attributes
+    ----------
+    filename : str
+        The filename of the image.
+    label : str
+        The class label parsed from the filename.
+    width : int
+        The width of the image in pixels.
+    height : int
+        The height of the image in pixels.
+    size : int
+        The size of the file in bytes.
+    """
+    filename: str
+    label: str
+    width: int
+    height: int
+    size: int
+
+
+def parse_label(filename: str) -> str:
+    """
+    Extracts the class label from a dataset filename.
+
+    Dataset filenames have the form "<wordnet id>_<label>.JPEG", with
+    underscores separating the words of the label.
+
+    Parameters
+    ----------
+    filename : str
+        The filename, e.g. "n01440764_tench.JPEG".
+
+    Returns
+    -------
+    str
+        The class label, e.g. "tench".
+    """
+    name, _ = os.path.splitext(filename)
+    _, _, label = name.partition("_")
+    return label.replace("_", " ")
+
+
+class ImageCatalog:
+    """
+    Index of the images of a folder, refreshed when the folder changes.
+
+    Attributes
+    ----------
+    folder : str
+        The indexed folder.
+    extension : str
+        The extension of the indexed files.
+    version : str
+        An identifier of the current content of the catalog, changing
+        whenever images are added, removed or modified.
+    """
+
+    def __init__(self, folder: str, extension: str = ".JPEG") -> None:
+        """
+        Initializes an empty catalog. It is built on first use.
+
+        Parameters
+        ----------
+        folder : str
+            The folder to be indexed.
+        extension : str, optional
+            The extension of the indexed files (default is ".JPEG").
+        """
+        self.folder = folder
+        self.extension = extension
+        self.version = ""
+        self._entries: dict[str, CatalogEntry] = {}
+        self._stats: dict[str, tuple[int, int]] = {}
+        self._filenames: list[str] = []
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """
+        Re-indexes the folder if its modification time changed.
+
+        Only the files that were added or modified since the last refresh
+        have their header read; the others keep their entry.
+        """
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime and self._mtime is not None:
+            return
+
+        with self._lock:
+            if mtime == self._mtime and self._mtime is not None:
+                return
+
+            entries: dict[str, CatalogEntry] = {}
+            stats: dict[str, tuple[int, int]] = {}
+            if mtime is not None:
+                for dir_entry in os.scandir(self.folder):
+                    if not dir_entry.name.endswith(self.extension):
+                        continue
+                    stat = dir_entry.stat()
+                    key = (stat.st_size, stat.st_mtime_ns)
+                    entry = self._entries.get(dir_entry.name)
+                    if entry is None or self._stats.get(dir_entry.name) != key:
+                        entry = self._read_entry(dir_entry.path, stat.st_size)
+                        if entry is None:
+                            continue
+                    entries[dir_entry.name] = entry
+                    stats[dir_entry.name] = key
+
+            self._entries = entries
+            self._stats = stats
+            self._filenames = sorted(entries)
+            self._mtime = mtime
+            digest = hashlib.sha1()
+            for filename in self._filenames:
+                digest.update(f"{filename}:{stats[filename]}".encode())
+            self.version = digest.hexdigest()
+            logging.info(f"Image catalog indexed {len(entries)} images")
+
+    def query(self,
+              offset: int = 0,
+              limit: Optional[int] = None,
+              prefix: Optional[str] = None,
+              label: Optional[str] = None) -> tuple[list[CatalogEntry], int]:
+        """
+        Returns a page of the images, sorted by filename.
+
+        Parameters
+        ----------
+        offset : int, optional
+            The number of matching images to skip (default is 0).
+        limit : int, optional
+            The maximum number of images returned (default is `None`, all).
+        prefix : str, optional
+            Only return images whose filename starts with this prefix.
+        label : str, optional
+            Only return images whose label contains this text, ignoring case.
+
+        Returns
+        -------
+        tuple
+            The matching entries of the page and the total number of matches.
+        """
+        self.refresh()
+        with self._lock:
+            filenames = self._filenames
+            entries = self._entries
+
+        if prefix:
+            filenames = [f for f in filenames if f.startswith(prefix)]
+        if label:
+            label = label.lower()
+            filenames = [f for f in filenames if label in entries[f].label.lower()]
+
+        end = None if limit is None else offset + limit
+        return [entries[f] for f in filenames[offset:end]], len(filenames)
+
+    def filenames(self) -> list[str]:
+        """
+        Returns the filenames of all the images, sorted.
+
+        Returns
+        -------
+        list of str
+            The filenames of the indexed images.
+        """
+        self.refresh()
+        with self._lock:
+            return list(self._filenames)
+
+    @staticmethod
+    def _read_entry(image_path: str, size: int) -> Optional[CatalogEntry]:
+        """
+        Builds the entry of an image, reading only its header.
+
+        Parameters
+        ----------
+        image_path : str
+            The file path of the image.
+        size : int
+            The size of the file in bytes.
+
+        Returns
+        -------
+        CatalogEntry or None
+            The entry, or `None` if the file is not a readable image.
+        """
+        filename = os.path.basename(image_path)
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+        except (OSError, SyntaxError) as e:
+            logging.warning(f"Skipping unreadable image {filename}: {e}")
+            return None
+        return CatalogEntry(filename, parse_label(filename), width, height, size)
@@ -21,6 +21,173 @@ class Configuration:
         models : tuple of str
             A tuple containing the names of the pre-defined models used for
             image classification.
+        input_sizes : dict
+            The side of the square input of the models that do not take
+            224x224 images.
+        model_memory_budget_mb : int or None
+            The maximum amount of memory (in MB) the resident models may use
+            before the least recently used ones are evicted. `None` disables
+            eviction.
+        model_backends : dict
+            The variant run for each model: "eager" (the default, the
+            torchvision model) or one of the variants compiled by
+            `prepare_models.py`: "torchscript", "dynamic_int8",
+            "static_int8" or "onnx" (run by ONNX Runtime). Models without an
+            entry run "eager", and so do the ones whose variant is missing
+            or failed the agreement check.
+        compiled_models_path : str
+            The folder of the compiled variants and of their manifest.
+        compiled_variants : tuple of str
+            The variants compiled by `prepare_models.py`.
+        onnx_intra_op_threads : int or None
+            The number of ONNX Runtime threads used inside a single operator,
+            or `None` for the ONNX Runtime default.
+        onnx_inter_op_threads : int or None
+            The number of ONNX Runtime threads running independent operators
+            in parallel, or `None` to run the graph sequentially.
+        onnx_graph_optimization : str
+            The ONNX Runtime graph optimization level: "disable", "basic",
+            "extended" or "all".
+        calibration_images : int
+            The number of dataset images used to calibrate static
+            quantization.
+        agreement_images : int
+            The number of dataset images on which the compiled variants are
+            compared with the fp32 models.
+        min_top5_agreement : float
+            The minimum mean fraction of top-5 classes a compiled variant
+            must share with the fp32 model to be used.
+        warm_up_models : tuple of str
+            The models loaded and pre-warmed with a dummy forward pass when
+            the app starts.
+        inference_executor : str
+            The pool used to run editing and classification, either "thread"
+            or "process".
+        inference_workers : int
+            The number of workers of the inference pool.
+        inference_queue_size : int
+            The number of requests that may wait for a free worker before new
+            ones are rejected with 503.
+        inference_timeout : float
+            The maximum number of seconds a request waits for its result.
+        inference_retry_after : int
+            The number of seconds suggested to rejected clients.
+        default_batching : dict
+            The micro-batching options used by models without an entry in
+            `batching`.
+        batching : dict
+            The micro-batching options of each model: `max_batch_size` images
+            are collected for up to `max_wait_ms` milliseconds and classified
+            with one forward pass. Batches can only grow up to the number of
+            concurrent requests, so `inference_workers` bounds them too.
+        channels_last : bool
+            Whether models and inputs use the channels-last memory format.
+        intra_op_threads : int or None
+            The number of torch intra-op threads per worker process, or `None`
+            for the torch default. `serve.py` replaces `None` with an even
+            split of the cores between its workers.
+        inter_op_threads : int or None
+            The number of torch inter-op threads per worker process, or `None`
+            for the torch default.
+        result_top_k : int
+            The number of classes returned by a classification.
+        result_scores : str
+            The scores returned with each class: "percentages",
+            "probabilities" or the raw "logits". The ensemble ranking always
+            uses percentages, since it averages probabilities.
+        result_cache_size : int
+            The maximum number of classification results cached in memory.
+        result_cache_dir : str or None
+            The folder of the on-disk result cache, surviving restarts, or
+            `None` to cache in memory only.
+        result_cache_disk_max_entries : int or None
+            The maximum number of results kept in `result_cache_dir`; the
+            least recently used ones are deleted above it. `None` disables
+            the limit.
+        store_edited_images : bool
+            Whether edited images are encoded to `edit_folder_path` for
+            display. When `False` they are rendered on demand by `/preview`.
+        enhancement_engine : str
+            The engine applying the image enhancements: "pil" chains Pillow's
+            `ImageEnhance` passes, "numpy" fuses them in one vectorized pass.
+        tensor_store_path : str
+            The path (without extension) of the memory-mapped store of
+            preprocessed dataset images written by `prepare_tensors.py`.
+        histogram_store_path : str
+            The path (without extension) of the store of the color histograms
+            of the dataset images written by `prepare_tensors.py`.
+        max_upload_size_mb : int
+            The maximum size of an uploaded image, in MB. Larger uploads are
+            rejected with 413.
+        max_upload_pixels : int
+            The maximum number of pixels of an uploaded image, checked from
+            its header. Larger images are rejected with 413.
+        upload_working_size : int or None
+            The length the shorter side of uploaded images is reduced to while
+            decoding, before editing and classification. `None` keeps the
+            original resolution.
+        ensemble_max_top_k : int
+            The maximum number of classes returned by the `/ensemble` endpoint.
+        batch_max_images : int
+            The maximum number of images (dataset images and uploaded files)
+            of a request to the `/batch` endpoint.
+        info_max_limit : int
+            The maximum number of images of a page of `/info` and
+            `/info/images`. Larger `limit` values are rejected with 422.
+        artifact_ttl : float
+            The number of seconds uploaded and edited images are kept.
+        artifact_sweep_interval : float
+            The number of seconds between two sweeps of expired artifacts.
+        artifact_high_water_mb : int or None
+            The disk usage of the artifacts, in MB, above which the oldest ones
+            are deleted before expiring. `None` disables early eviction.
+        server_workers : int
+            The number of worker processes forked by `serve.py`.
+        server_memory_report_interval : float
+            The number of seconds between two reports of the memory used by
+            the workers of `serve.py`, or 0 to report it only at startup.
+        job_queue_path : str
+            The SQLite database of the classification jobs.
+        job_workers : int
+            The number of worker processes running the jobs, started by the
+            app (or by the parent process of `serve.py`). With 0, the jobs
+            are run by `python -m app.jobs` instead.
+        job_worker_threads : int or None
+            The number of torch intra-op threads of each job worker.
+        job_queue_size : int
+            The maximum number of queued jobs; further submissions are
+            rejected with 503.
+        job_max_attempts : int
+            The number of times a job is run before it is marked as failed.
+        job_retry_delay : float
+            The number of seconds before a failed job is retried, multiplied
+            by the number of attempts so far.
+        job_lease : float
+            The number of seconds a running job stays owned by its worker
+            without news from it, after which another worker takes it over.
+        job_poll_interval : float
+            The number of seconds between two looks at the queue, by idle
+            workers and by the event streams of the jobs.
+        job_ttl : float
+            The number of seconds finished jobs, and the uploaded images of
+            the jobs, are kept.
+        live_budget : float or None
+            The number of seconds allowed from the start of a process to the
+            moment it serves requests; a warning is logged above it.
+        ready_budget : float or None
+            The number of seconds allowed from the start of a process to the
+            moment its models are warm; a warning is logged above it.
+        evaluation_batch_size : int
+            The number of images per forward pass of `python -m app.evaluate`.
+        evaluation_workers : int
+            The number of processes decoding the dataset images for
+            `python -m app.evaluate`.
+        evaluation_output_path : str
+            The folder of the accuracy summary and of the per-image results
+            written by `python -m app.evaluate`.
+        metrics_buckets : tuple of float
+            The upper bounds, in seconds, of the buckets of the stage latency
+            histograms exposed by `/metrics`.
         """
 
     # classification
@@ -33,3 +200,103 @@ class Configuration:
         "vgg16",
         "inception_v3",
     )
+    input_sizes = {"inception_v3": 299}
+
+    # model registry
+    model_memory_budget_mb = 1024
+
+    # compiled model variants
+    model_backends = {}
+    compiled_models_path = os.path.join(project_root, "cache/compiled_models")
+    compiled_variants = ("torchscript", "dynamic_int8", "static_int8", "onnx")
+    onnx_intra_op_threads = None
+    onnx_inter_op_threads = None
+    onnx_graph_optimization = "all"
+    calibration_images = 32
+    agreement_images = 200
+    min_top5_agreement = 0.9
+    warm_up_models = models
+
+    # inference execution
+    inference_executor = "thread"
+    inference_workers = 8
+    inference_queue_size = 16
+    inference_timeout = 30.0
+    inference_retry_after = 5
+
+    # micro-batching
+    default_batching = {"max_batch_size": 8, "max_wait_ms": 5}
+    batching = {
+        "resnet18": {"max_batch_size": 16, "max_wait_ms": 5},
+        "alexnet": {"max_batch_size": 16, "max_wait_ms": 5},
+        "vgg16": {"max_batch_size": 4, "max_wait_ms": 10},
+        "inception_v3": {"max_batch_size": 8, "max_wait_ms": 10},
+    }
+
+    # inference tuning
+    channels_last = True
+    intra_op_threads = None
+    inter_op_threads = None
+
+    # classification results
+    result_top_k = 5
+    result_scores = "percentages"
+
+    # result cache
+    result_cache_size = 4096
+    result_cache_dir = os.path.join(project_root, "cache/results")
+    result_cache_disk_max_entries = 100_000
+
+    # display of edited images
+    store_edited_images = False
+
+    # image enhancement
+    enhancement_engine = "pil"
+
+    # preprocessed dataset
+    tensor_store_path = os.path.join(project_root, "cache/imagenet_subset_224")
+    histogram_store_path = os.path.join(project_root, "cache/imagenet_subset_histograms")
+
+    # uploads
+    max_upload_size_mb = 10
+    max_upload_pixels = 40_000_000
+    upload_working_size = 512
+
+    # batch and ensemble classification
+    batch_max_images = 32
+    ensemble_max_top_k = 100
+
+    # image listing
+    info_max_limit = 1000
+
+    # temporary artifacts
+    artifact_ttl = 10.0
+    artifact_sweep_interval = 2.0
+    artifact_high_water_mb = 512
+
+    # pre-fork serving
+    server_workers = 2
+    server_memory_report_interval = 300.0
+
+    # job queue
+    job_queue_path = os.path.join(project_root, "cache/jobs.sqlite3")
+    job_workers = 1
+    job_worker_threads = None
+    job_queue_size = 256
+    job_max_attempts = 3
+    job_retry_delay = 2.0
+    job_lease = 30.0
+    job_poll_interval = 0.2
+    job_ttl = 3600.0
+
+    # startup
+    live_budget = 2.0
+    ready_budget = 60.0
+
+    # offline evaluation
+    evaluation_batch_size = 32
+    evaluation_workers = 2
+    evaluation_output_path = os.path.join(project_root, "cache/evaluation")
+
+    # metrics
+    metrics_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
@@ -0,0 +1,139 @@
+"""
+Vectorized image enhancement engine.
+
+Applies the color, brightness, contrast and sharpness adjustments of
+`app.utils.enhance_image` in one fused NumPy pass over a single float
+buffer, instead of four chained `ImageEnhance` passes that each allocate
+a full-size image. The output matches Pillow within a few intensity
+levels, and batches of same-sized images are processed at once.
+"""
+import numpy as np
+from PIL import Image
+
+# ITU-R 601-2 luma weights, as used by Pillow's "L" conversion
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def scale_factors(values: np.ndarray) -> np.ndarray:
+    """
+    Scales form values from the range [-100, 100] to enhancement factors in [0, 2].
+
+    Parameters
+    ----------
+    values : np.ndarray
+        The form values.
+
+    Returns
+    -------
+    np.ndarray
+        The enhancement factors, as float32.
+    """
+    return (np.asarray(values, dtype=np.float32) + 100) / 100
+
+
+def _sharpen(buffer: np.ndarray, sharpness: np.ndarray) -> None:
+    """
+    Blends a batch in place with its version smoothed by Pillow's SMOOTH kernel.
+
+    The kernel is 3x3 with weight 5 in the center and 1 elsewhere, divided by
+    13, so the blend `smooth + f * (pixel - smooth)` of the interior pixels
+    reduces to `a * pixel + b * box` where `box` is the 3x3 box sum. Border
+    pixels are left untouched, as Pillow copies them from the input.
+
+    Parameters
+    ----------
+    buffer : np.ndarray
+        The float32 images, with shape (N, H, W, 3), modified in place.
+    sharpness : np.ndarray
+        The sharpness factor of each image, with shape (N, 1, 1, 1).
+    """
+    if buffer.shape[1] < 3 or buffer.shape[2] < 3:
+        return
+    box = buffer[:, :-2] + buffer[:, 1:-1]
+    box += buffer[:, 2:]
+    box = box[:, :, :-2] + box[:, :, 1:-1] + box[:, :, 2:]
+
+    interior = buffer[:, 1:-1, 1:-1]
+    interior *= sharpness + 4 * (1 - sharpness) / 13
+    box *= (1 - sharpness) / 13
+    interior += box
+
+
+def enhance_batch(images: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Enhances a batch of same-sized RGB images in one fused pass.
+
+    Parameters
+    ----------
+    images : np.ndarray
+        The uint8 images, with shape (N, H, W, 3).
+    values : np.ndarray
+        The color, brightness, contrast and sharpness values of each image,
+        ranging from -100 to 100, with shape (N, 4).
+
+    Returns
+    -------
+    np.ndarray
+        The enhanced uint8 images, with shape (N, H, W, 3). They can be fed
+        to a batched classifier without going through PIL.
+    """
+    factors = scale_factors(values).reshape(-1, 4, 1, 1, 1)
+    color, brightness, contrast, sharpness = (factors[:, i] for i in range(4))
+
+    buffer = images.astype(np.float32)
+
+    # color: blend with the grayscale version
+    gray = (buffer @ LUMA_WEIGHTS)[..., None]
+    buffer -= gray
+    buffer *= color
+    buffer += gray
+    np.clip(buffer, 0, 255, out=buffer)
+
+    # brightness: blend with black
+    buffer *= brightness
+    np.clip(buffer, 0, 255, out=buffer)
+
+    # contrast: blend with the mean gray level
+    mean = np.floor((buffer @ LUMA_WEIGHTS).mean(axis=(1, 2)) + 0.5).reshape(-1, 1, 1, 1)
+    buffer -= mean
+    buffer *= contrast
+    buffer += mean
+    np.clip(buffer, 0, 255, out=buffer)
+
+    # sharpness: blend with the smoothed version
+    _sharpen(buffer, sharpness)
+    np.clip(buffer, 0, 255, out=buffer)
+
+    # Pillow truncates when converting back to 8 bits
+    return np.floor(buffer, out=buffer).astype(np.uint8)
+
+
+def enhance_image(image: Image.Image,
+                  color_value: int,
+                  brightness_value: int,
+                  contrast_value: int,
+                  sharpness_value: int) -> Image.Image:
+    """
+    Enhances a single image with the vectorized engine.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image to be enhanced. It is not modified.
+    color_value : int
+        The color enhancement factor, ranging from -100 to 100.
+    brightness_value : int
+        The brightness enhancement factor, ranging from -100 to 100.
+    contrast_value : int
+        The contrast enhancement factor, ranging from -100 to 100.
+    sharpness_value : int
+        The sharpness enhancement factor, ranging from -100 to 100.
+
+    Returns
+    -------
+    Image.Image
+        The enhanced RGB image.
+    """
+    pixels = np.asarray(image.convert("RGB"))[None]
+    values = np.array([[color_value, brightness_value, contrast_value, sharpness_value]])
+    return Image.fromarray(enhance_batch(pixels, values)[0])
@@ -0,0 +1,218 @@
+"""
+Evaluates the accuracy and throughput of the models on the ImageNet subset.
+
+The dataset images are decoded and preprocessed by the worker processes of
+a torch `DataLoader` while the main process runs batched inference, so the
+forward passes are not stalled by JPEG decoding. Each image is decoded once
+per input size and classified by all the models taking that size. The
+ground truth is parsed from the filenames of the dataset.
+
+The top-1 and top-5 accuracy and the images per second of each model are
+printed and written to `summary.json`; the top-5 predictions of every image
+are written, one column per array, to a compressed `<model_id>.npz` file in
+the output folder. The models run with the backend configured by
+`model_backends`, as they are served.
+
+Usage::
+
+    python -m app.evaluate --batch-size 64 --workers 4 --threads 8
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+from .catalog import parse_label
+from .config import Configuration
+from .ml.classification_utils import get_labels, input_size, model_registry, preprocess_image
+from .ml.inference import configure_threads, top_k
+
+conf = Configuration()
+
+
+class ImageFolderDataset(Dataset):
+    """
+    Dataset decoding and preprocessing the images of a folder.
+
+    Attributes
+    ----------
+    folder : str
+        The folder of the images.
+    filenames : list of str
+        The filenames of the images.
+    size : int
+        The side of the square crop fed to the models.
+    """
+
+    def __init__(self, folder: str, filenames: list[str], size: int = 224) -> None:
+        self.folder = folder
+        self.filenames = filenames
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, int]:
+        with Image.open(os.path.join(self.folder, self.filenames[index])) as img:
+            return preprocess_image(img, self.size), index
+
+
+def ground_truth(filenames: list[str], labels: tuple) -> np.ndarray:
+    """
+    Finds the class index of each image from its filename.
+
+    When the dataset holds one WordNet id per class, as the full ImageNet
+    sample does, the class index is the rank of the WordNet id, which is how
+    the ImageNet classes are numbered. Otherwise the label parsed from the
+    filename is looked up, ignoring the case, in the class labels.
+
+    Parameters
+    ----------
+    filenames : list of str
+        The dataset filenames, e.g. "n01440764_tench.JPEG".
+    labels : tuple of str
+        The class labels, indexed by class.
+
+    Returns
+    -------
+    np.ndarray
+        The class index of each image, or -1 if it could not be found.
+    """
+    wordnet_ids = [filename.partition("_")[0] for filename in filenames]
+    classes = sorted(set(wordnet_ids))
+    if len(classes) == len(labels):
+        rank = {wordnet_id: index for index, wordnet_id in enumerate(classes)}
+        return np.array([rank[wordnet_id] for wordnet_id in wordnet_ids], dtype=np.int16)
+
+    index_of = {label.lower(): index for index, label in reversed(list(enumerate(labels)))}
+    targets = np.array([index_of.get(parse_label(f).lower(), -1) for f in filenames], dtype=np.int16)
+    unknown = [f for f, target in zip(filenames, targets) if target < 0]
+    if unknown:
+        logging.warning(f"No class matches the label of {len(unknown)} images, e.g. {unknown[0]}; "
+                        f"they are left out of the accuracy")
+    return targets
+
+
+def evaluate(model_ids: list[str],
+             batch_size: int,
+             workers: int,
+             output_dir: str,
+             limit: Optional[int] = None) -> dict:
+    """
+    Classifies the dataset with several models and measures their accuracy.
+
+    Parameters
+    ----------
+    model_ids : list of str
+        The models to be evaluated.
+    batch_size : int
+        The number of images per forward pass.
+    workers : int
+        The number of processes decoding the images, 0 to decode them in the
+        main process.
+    output_dir : str
+        The folder of the per-image results and of the summary.
+    limit : int, optional
+        The maximum number of images evaluated (default is `None`, all).
+
+    Returns
+    -------
+    dict
+        For each model, the number of images and of labelled images, the
+        top-1 and top-5 accuracy and the images per second of the forward
+        passes.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the image folder does not exist. Run `prepare_images.py` first.
+    """
+    img_folder = conf.image_folder_path
+    filenames = sorted(f for f in os.listdir(img_folder) if f.endswith(".JPEG"))[:limit]
+    labels = get_labels()
+    targets = ground_truth(filenames, labels)
+    labelled = targets >= 0
+    os.makedirs(output_dir, exist_ok=True)
+
+    by_size: dict[int, list[str]] = {}
+    for model_id in model_ids:
+        by_size.setdefault(input_size(model_id), []).append(model_id)
+
+    summary = {}
+    for size, size_models in by_size.items():
+        indices = {m: np.zeros((len(filenames), 5), dtype=np.int16) for m in size_models}
+        scores = {m: np.zeros((len(filenames), 5), dtype=np.float32) for m in size_models}
+        forward_time = dict.fromkeys(size_models, 0.0)
+        backends = {m: model_registry.get(m) for m in size_models}
+
+        loader = DataLoader(ImageFolderDataset(img_folder, filenames, size), batch_size=batch_size,
+                            num_workers=workers)
+        start = time.perf_counter()
+        for batch, rows in loader:
+            for model_id, backend in backends.items():
+                forward_start = time.perf_counter()
+                logits = backend.predict(batch)
+                forward_time[model_id] += time.perf_counter() - forward_start
+                batch_scores, batch_indices = top_k(logits, 5)
+                indices[model_id][rows.numpy()] = batch_indices.numpy()
+                scores[model_id][rows.numpy()] = batch_scores.numpy()
+        elapsed = time.perf_counter() - start
+        logging.info(f"{len(filenames)} images of size {size} classified by {len(size_models)} models "
+                     f"in {elapsed:.1f} s")
+
+        for model_id in size_models:
+            hits = indices[model_id] == targets[:, None]
+            summary[model_id] = {
+                "images": len(filenames),
+                "labelled": int(labelled.sum()),
+                "top1": float(hits[labelled, 0].mean()) if labelled.any() else None,
+                "top5": float(hits[labelled].any(axis=1).mean()) if labelled.any() else None,
+                "images_per_sec": len(filenames) / forward_time[model_id] if forward_time[model_id] else None,
+            }
+            np.savez_compressed(os.path.join(output_dir, f"{model_id}.npz"),
+                                filename=np.array(filenames), label=targets,
+                                top5_indices=indices[model_id], top5_scores=scores[model_id])
+
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump({"batch_size": batch_size, "workers": workers, "threads": torch.get_num_threads(),
+                   "models": summary}, f, indent=2)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=list(conf.models))
+    parser.add_argument("--batch-size", type=int, default=conf.evaluation_batch_size)
+    parser.add_argument("--workers", type=int, default=conf.evaluation_workers,
+                        help="processes decoding the images, 0 to decode in the main process")
+    parser.add_argument("--threads", type=int, default=conf.intra_op_threads,
+                        help="torch intra-op threads of the forward passes")
+    parser.add_argument("--limit", type=int, help="evaluate the first LIMIT images only")
+    parser.add_argument("--output", default=conf.evaluation_output_path,
+                        help="folder of the per-image results and of the summary")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    configure_threads(args.threads)
+    summary = evaluate(args.models, args.batch_size, args.workers, args.output, args.limit)
+
+    def percent(value: Optional[float]) -> str:
+        return f"{value * 100:.1f}" if value is not None else "-"
+
+    print(f"{'model':<20}{'images':>8}{'top-1 %':>10}{'top-5 %':>10}{'images/s':>10}")
+    for model_id, result in summary.items():
+        rate = f"{result['images_per_sec']:.1f}" if result["images_per_sec"] else "-"
+        print(f"{model_id:<20}{result['labelled']:>8}{percent(result['top1']):>10}"
+              f"{percent(result['top5']):>10}{rate:>10}")
+    logging.info(f"Per-image results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
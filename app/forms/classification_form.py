@@ -206,8 +206,8 @@ class UploadedImageForm:
 
         Parameters
         ----------
-        filename : str
-            The filename of the uploaded file.
+        filename : str or None
+            The filename of the uploaded file, as given by the client.
 
         Returns
         -------
@@ -215,4 +215,4 @@ class UploadedImageForm:
             `True` if the file extension is valid, otherwise `False`.
         """
         allowed_extensions = {".jpg", ".jpeg", ".png"}
-        return any(filename.lower().endswith(ext) for ext in allowed_extensions)
+        return filename is not None and any(filename.lower().endswith(ext) for ext in allowed_extensions)
@@ -0,0 +1,130 @@
+"""
+Exact per-channel color histograms of the original and edited images.
+
+The histograms are counted with NumPy over every pixel of the image at its
+decoded resolution, instead of over a canvas redrawn at display size by the
+browser. The histograms of the dataset images are precomputed by
+`app/prepare_tensors.py` into a store with the layout of the tensor store;
+the ones of edited images are computed in the same pass that edits them.
+"""
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import Configuration
+from app.ml.tensor_store import TensorStore
+from app.utils import enhance_image, open_image
+
+conf = Configuration()
+
+CHANNELS = ("red", "green", "blue")
+HISTOGRAM_SHAPE = (3, 256)
+
+histogram_store = TensorStore(conf.histogram_store_path)
+
+
+def compute_histogram(image: Image.Image) -> np.ndarray:
+    """
+    Counts the pixels of each intensity in the red, green and blue channels.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image to be analyzed. Non-RGB images are converted first.
+
+    Returns
+    -------
+    np.ndarray
+        The counts, with shape (3, 256).
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    pixels = np.asarray(image).reshape(-1, 3)
+    # offset each channel into its own 256 bins, so a single bincount covers all three
+    bins = pixels.astype(np.intp) + np.arange(0, 768, 256)
+    return np.bincount(bins.ravel(), minlength=768).reshape(HISTOGRAM_SHAPE)
+
+
+def histogram_to_dict(histogram: np.ndarray) -> dict[str, list[int]]:
+    """
+    Converts a histogram to the JSON payload read by the pages.
+
+    Parameters
+    ----------
+    histogram : np.ndarray
+        The counts, with shape (3, 256).
+
+    Returns
+    -------
+    dict
+        The 256 counts of each channel, keyed by "red", "green" and "blue".
+    """
+    return dict(zip(CHANNELS, histogram.tolist()))
+
+
+def dataset_histogram(image_id: str) -> np.ndarray:
+    """
+    Returns the histogram of an unedited dataset image.
+
+    The precomputed histogram is used when available, otherwise the image
+    is decoded and analyzed.
+
+    Parameters
+    ----------
+    image_id : str
+        The filename of the dataset image.
+
+    Returns
+    -------
+    np.ndarray
+        The counts, with shape (3, 256).
+
+    Raises
+    ------
+    FileNotFoundError
+        If the image does not exist.
+    """
+    histogram = histogram_store.get(image_id)
+    if histogram is not None:
+        return np.asarray(histogram)
+    with Image.open(os.path.join(conf.image_folder_path, os.path.basename(image_id))) as img:
+        return compute_histogram(img)
+
+
+def edited_histogram(image_path: str,
+                     color_value: int,
+                     brightness_value: int,
+                     contrast_value: int,
+                     sharpness_value: int,
+                     working_size: Optional[int] = None) -> np.ndarray:
+    """
+    Computes the histogram of an image, after applying the given enhancements.
+
+    Parameters
+    ----------
+    image_path : str
+        The file path of the original image.
+    color_value : int
+        The color enhancement factor, ranging from -100 to 100.
+    brightness_value : int
+        The brightness enhancement factor, ranging from -100 to 100.
+    contrast_value : int
+        The contrast enhancement factor, ranging from -100 to 100.
+    sharpness_value : int
+        The sharpness enhancement factor, ranging from -100 to 100.
+    working_size : int, optional
+        The length the shorter side is reduced to while decoding, matching
+        the displayed image (default is `None`, keep the original resolution).
+
+    Returns
+    -------
+    np.ndarray
+        The counts, with shape (3, 256).
+    """
+    edit_values = (color_value, brightness_value, contrast_value, sharpness_value)
+    image = open_image(image_path, working_size)
+    if any(edit_values):
+        image = enhance_image(image, *edit_values)
+    return compute_histogram(image)
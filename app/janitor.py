@@ -0,0 +1,224 @@
+"""
+Centralized cleanup of the temporary artifacts (uploaded and edited images).
+
+Instead of one sleeping task per file, every artifact is registered in a
+single time-ordered expiry index. A periodic sweep deletes the expired
+ones in batches, evicts the oldest ones early when the artifacts use more
+disk than the high-water mark, and a startup sweep removes the expired
+orphans left behind by a previous process.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+from app.utils import EDITED_PREFIX, UPLOAD_PREFIX, ULID_ALPHABET
+
+# the names given by `new_artifact_id`, whatever their extension; ".part"
+# files are the leftovers of writes interrupted by a crash
+ARTIFACT_PATTERN = re.compile(
+    rf"(?:{re.escape(UPLOAD_PREFIX)}|{re.escape(EDITED_PREFIX)})[{ULID_ALPHABET}]{{26}}(?:\.\w+)?(?:\.part)?"
+)
+
+
+class ArtifactJanitor:
+    """
+    Expiry index of the temporary artifacts, with batched deletion.
+
+    Attributes
+    ----------
+    folders : tuple of str
+        The folders holding the artifacts.
+    ttl : float
+        The number of seconds an artifact is kept.
+    interval : float
+        The number of seconds between two sweeps.
+    high_water_mark : int or None
+        The disk usage (in bytes) above which artifacts are evicted before
+        expiring, or `None` to never evict early.
+    """
+
+    def __init__(self,
+                 folders: Iterable[str],
+                 ttl: float = 10.0,
+                 interval: float = 5.0,
+                 high_water_mb: Optional[int] = None) -> None:
+        """
+        Initializes an empty expiry index.
+
+        Parameters
+        ----------
+        folders : Iterable[str]
+            The folders holding the artifacts.
+        ttl : float, optional
+            The number of seconds an artifact is kept (default is 10).
+        interval : float, optional
+            The number of seconds between two sweeps (default is 5).
+        high_water_mb : int, optional
+            The disk usage in MB triggering early eviction (default is `None`).
+        """
+        self.folders = tuple(folders)
+        self.ttl = ttl
+        self.interval = interval
+        self.high_water_mark: Optional[int] = (
+            high_water_mb * 1024 * 1024 if high_water_mb is not None else None
+        )
+        self._heap: list[tuple[float, str]] = []
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, file_path: str, ttl: Optional[float] = None) -> None:
+        """
+        Registers an artifact for deletion once its time to live expires.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the artifact.
+        ttl : float, optional
+            The time to live in seconds (default is `None`, use `self.ttl`).
+        """
+        file_path = os.path.abspath(file_path)
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            heapq.heappush(self._heap, (expires_at, file_path))
+            self._sizes[file_path] = size
+
+    def disk_usage(self) -> int:
+        """
+        Returns the disk space used by the tracked artifacts.
+
+        Returns
+        -------
+        int
+            The total size of the tracked artifacts in bytes.
+        """
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def pending(self) -> int:
+        """
+        Returns the number of tracked artifacts.
+
+        Returns
+        -------
+        int
+            The number of artifacts waiting for deletion.
+        """
+        with self._lock:
+            return len(self._sizes)
+
+    def sweep(self) -> int:
+        """
+        Deletes the expired artifacts and, above the high-water mark, the oldest ones.
+
+        Returns
+        -------
+        int
+            The number of deleted files.
+        """
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, file_path = heapq.heappop(self._heap)
+                if self._sizes.pop(file_path, None) is not None:
+                    expired.append(file_path)
+
+            if self.high_water_mark is not None:
+                # evict down to 80% of the mark, so the next uploads have room
+                low_water_mark = self.high_water_mark * 0.8
+                usage = sum(self._sizes.values())
+                if usage > self.high_water_mark:
+                    while self._heap and usage > low_water_mark:
+                        _, file_path = heapq.heappop(self._heap)
+                        size = self._sizes.pop(file_path, None)
+                        if size is not None:
+                            usage -= size
+                            expired.append(file_path)
+
+        return self._delete(expired)
+
+    def sweep_orphans(self) -> int:
+        """
+        Deletes the expired artifacts not tracked by this process.
+
+        Called at startup, it removes the files left behind by a previous
+        process that stopped before deleting them. The artifacts younger
+        than the time to live may belong to another process serving the app,
+        as with `uvicorn --workers N`, so they are scheduled for deletion
+        once they expire instead.
+
+        Returns
+        -------
+        int
+            The number of deleted files.
+        """
+        with self._lock:
+            tracked = set(self._sizes)
+        now = time.time()
+        orphans = []
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if (not entry.is_file()
+                        or not ARTIFACT_PATTERN.fullmatch(entry.name)
+                        or os.path.abspath(entry.path) in tracked):
+                    continue
+                try:
+                    age = now - entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age >= self.ttl:
+                    orphans.append(entry.path)
+                else:
+                    self.schedule(entry.path, ttl=self.ttl - age)
+        return self._delete(orphans)
+
+    async def run(self) -> None:
+        """
+        Sweeps the artifacts every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logging.error(f"Artifact sweep failed: {e}")
+
+    @staticmethod
+    def _delete(file_paths: list[str]) -> int:
+        """
+        Deletes a batch of files, ignoring the ones already gone.
+
+        Parameters
+        ----------
+        file_paths : list of str
+            The paths of the files to be deleted.
+
+        Returns
+        -------
+        int
+            The number of deleted files.
+        """
+        deleted = 0
+        for file_path in file_paths:
+            try:
+                os.remove(file_path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not delete {file_path}: {e}")
+        if deleted:
+            logging.info(f"Janitor deleted {deleted} artifacts")
+        return deleted
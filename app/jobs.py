@@ -0,0 +1,664 @@
+"""
+Persistent queue of classification jobs, run by local worker processes.
+
+Submitting a job only records it in a SQLite database and returns its
+identifier, so the HTTP connection is released at once. Worker processes,
+started and supervised by the app, claim the queued jobs one at a time and
+record the stage they are running, which clients read by polling or
+through a server-sent event stream.
+
+A claimed job is leased to its worker, which renews the lease while it
+runs. The jobs of a worker that dies are released by the supervisor, and
+the ones whose lease expired (e.g. when the whole host stopped) are
+claimed again by the next worker, so no job is lost. A failing job is
+retried after a delay until it exhausts its attempts.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import Configuration
+from app.utils import generate_ulid
+
+conf = Configuration()
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+JOB_STATES = (QUEUED, RUNNING, DONE, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, available_at);
+"""
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of jobs shared by the app and the worker processes.
+
+    Every call opens its own connection, so the queue can be used from any
+    thread and survives forks. The database is only created by the first
+    call, so creating the queue does not touch the disk.
+
+    Attributes
+    ----------
+    path : str
+        The path of the SQLite database.
+    lease : float
+        The number of seconds a running job stays owned by its worker
+        without being renewed.
+    max_attempts : int
+        The number of times a job is run before it is marked as failed.
+    retry_delay : float
+        The number of seconds before a failed job is retried, multiplied by
+        the number of attempts so far.
+    """
+
+    def __init__(self,
+                 path: str,
+                 lease: float = 30.0,
+                 max_attempts: int = 3,
+                 retry_delay: float = 2.0) -> None:
+        """
+        Configures the queue, without opening the database yet.
+
+        Parameters
+        ----------
+        path : str
+            The path of the SQLite database.
+        lease : float, optional
+            The lease of a running job in seconds (default is 30).
+        max_attempts : int, optional
+            The number of times a job is run (default is 3).
+        retry_delay : float, optional
+            The base delay before a retry in seconds (default is 2).
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._created = False
+        self._create_lock = threading.Lock()
+
+    def _create(self) -> None:
+        """
+        Creates the database and its tables, if needed.
+        """
+        with self._create_lock:
+            if self._created:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            try:
+                # readers do not block the writers, and the other way round
+                db.execute("PRAGMA journal_mode=WAL")
+                db.executescript(SCHEMA)
+            finally:
+                db.close()
+            self._created = True
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a connection in autocommit mode, creating the database first.
+
+        Yields
+        ------
+        sqlite3.Connection
+            The connection, closed on exit.
+        """
+        if not self._created:
+            self._create()
+        db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs statements in a write transaction, committed on success.
+
+        Yields
+        ------
+        sqlite3.Connection
+            The connection holding the write lock.
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        """
+        Converts a row of the jobs table, decoding its JSON columns.
+
+        Parameters
+        ----------
+        row : sqlite3.Row
+            The row.
+
+        Returns
+        -------
+        dict
+            The job.
+        """
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def submit(self, kind: str, payload: dict, result: Optional[dict] = None) -> str:
+        """
+        Records a new job.
+
+        Parameters
+        ----------
+        kind : str
+            The type of job, telling the worker how to run it.
+        payload : dict
+            The JSON-serializable inputs of the job.
+        result : dict, optional
+            The result, when it is already known (e.g. from the result
+            cache): the job is then recorded as done.
+
+        Returns
+        -------
+        str
+            The identifier of the job.
+        """
+        job_id = generate_ulid()
+        now = time.time()
+        state = QUEUED if result is None else DONE
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, state, stage, available_at, result, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), state, state, now,
+                 json.dumps(result) if result is not None else None, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Returns a job.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier of the job.
+
+        Returns
+        -------
+        dict or None
+            The job, or `None` if it does not exist.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """
+        Leases the oldest runnable job to a worker.
+
+        Queued jobs whose retry delay elapsed are runnable, and so are the
+        running jobs whose lease expired: their worker stopped without
+        releasing them. Jobs that already used all their attempts are
+        marked as failed instead.
+
+        Parameters
+        ----------
+        worker : str
+            The identifier of the worker.
+
+        Returns
+        -------
+        dict or None
+            The claimed job, or `None` if no job is runnable.
+        """
+        while True:
+            now = time.time()
+            with self._transaction() as db:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_expires < ?)"
+                    " ORDER BY id LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    db.execute(
+                        "UPDATE jobs SET state = ?, stage = ?, error = ?, worker = NULL, updated = ? WHERE id = ?",
+                        (FAILED, FAILED, row["error"] or "The worker stopped while running the job.",
+                         now, row["id"]),
+                    )
+                    continue
+                db.execute(
+                    "UPDATE jobs SET state = ?, stage = ?, attempts = attempts + 1, worker = ?,"
+                    " lease_expires = ?, updated = ? WHERE id = ?",
+                    (RUNNING, "started", worker, now + self.lease, now, row["id"]),
+                )
+                row = db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            return self._to_dict(row)
+
+    def set_stage(self, job_id: str, worker: str, stage: str) -> None:
+        """
+        Records the stage a running job entered, renewing its lease.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier of the job.
+        worker : str
+            The identifier of the worker running it.
+        stage : str
+            The name of the stage.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET stage = ?, lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND state = ?",
+                (stage, now + self.lease, now, job_id, worker, RUNNING),
+            )
+
+    def renew(self, job_id: str, worker: str) -> None:
+        """
+        Extends the lease of a running job.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier of the job.
+        worker : str
+            The identifier of the worker running it.
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                (time.time() + self.lease, job_id, worker, RUNNING),
+            )
+
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        """
+        Records the result of a job.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier of the job.
+        worker : str
+            The identifier of the worker that ran it.
+        result : dict
+            The JSON-serializable result.
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, stage = ?, result = ?, error = NULL, worker = NULL, updated = ?"
+                " WHERE id = ? AND worker = ? AND state = ?",
+                (DONE, DONE, json.dumps(result), time.time(), job_id, worker, RUNNING),
+            )
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """
+        Records the failure of a job, queueing it again if it has attempts left.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier of the job.
+        worker : str
+            The identifier of the worker that ran it.
+        error : str
+            The description of the failure.
+
+        Returns
+        -------
+        bool
+            `True` if the job will be retried.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND state = ?",
+                (job_id, worker, RUNNING),
+            ).fetchone()
+            if row is None:
+                return False
+            retry = row["attempts"] < self.max_attempts
+            db.execute(
+                "UPDATE jobs SET state = ?, stage = ?, error = ?, worker = NULL, available_at = ?, updated = ?"
+                " WHERE id = ?",
+                (QUEUED if retry else FAILED, QUEUED if retry else FAILED, error,
+                 now + self.retry_delay * row["attempts"], now, job_id),
+            )
+        return retry
+
+    def release_worker(self, worker: str) -> int:
+        """
+        Makes the running jobs of a stopped worker claimable at once.
+
+        Parameters
+        ----------
+        worker : str
+            The identifier of the worker.
+
+        Returns
+        -------
+        int
+            The number of released jobs.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET lease_expires = 0 WHERE worker = ? AND state = ?",
+                (worker, RUNNING),
+            ).rowcount
+
+    def counts(self) -> dict[str, int]:
+        """
+        Counts the jobs in each state.
+
+        Returns
+        -------
+        dict
+            The number of jobs of each state of `JOB_STATES`.
+        """
+        with self._connect() as db:
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {**dict.fromkeys(JOB_STATES, 0), **{state: count for state, count in rows}}
+
+    def unfinished_payloads(self) -> list[dict]:
+        """
+        Returns the inputs of the jobs still queued or running.
+
+        Returns
+        -------
+        list of dict
+            The payload of each unfinished job.
+        """
+        with self._connect() as db:
+            rows = db.execute("SELECT payload FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    def purge(self, ttl: float) -> int:
+        """
+        Deletes the finished jobs older than a time to live.
+
+        Parameters
+        ----------
+        ttl : float
+            The number of seconds a finished job is kept.
+
+        Returns
+        -------
+        int
+            The number of deleted jobs.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?",
+                (DONE, FAILED, time.time() - ttl),
+            ).rowcount
+
+
+def open_job_queue() -> JobQueue:
+    """
+    Opens the job queue with the settings of the configuration.
+
+    Returns
+    -------
+    JobQueue
+        The queue at `conf.job_queue_path`.
+    """
+    return JobQueue(conf.job_queue_path, conf.job_lease, conf.job_max_attempts, conf.job_retry_delay)
+
+
+def run_job(queue: JobQueue, job: dict, worker: str) -> dict:
+    """
+    Edits and classifies the image of a job, recording each stage.
+
+    Parameters
+    ----------
+    queue : JobQueue
+        The queue the job was claimed from.
+    job : dict
+        The claimed job, whose payload holds the "source" ("dataset" or
+        "upload"), "image_id", "model_id" and "edit_values" of the image.
+    worker : str
+        The identifier of the worker.
+
+    Returns
+    -------
+    dict
+        The "classification_scores" and, for edited images, the
+        "histogram" of the edited image.
+    """
+    from app.histograms import compute_histogram, histogram_to_dict
+    from app.ml.classification_utils import (
+        classify_dataset_image, classify_pil_image, classify_uploaded_image, model_registry
+    )
+    from app.utils import enhance_image, open_image
+
+    payload = job["payload"]
+    model_id = payload["model_id"]
+    edit_values = payload["edit_values"]
+    upload = payload["source"] == "upload"
+    folder = conf.upload_folder_path if upload else conf.image_folder_path
+    image_path = os.path.join(folder, os.path.basename(payload["image_id"]))
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image not found: {payload['image_id']}")
+
+    queue.set_stage(job["id"], worker, "load_model")
+    model_registry.get(model_id)
+
+    if not any(edit_values):
+        queue.set_stage(job["id"], worker, "classify")
+        classify = classify_uploaded_image if upload else classify_dataset_image
+        return {"classification_scores": classify(model_id, payload["image_id"]), "histogram": None}
+
+    queue.set_stage(job["id"], worker, "edit")
+    image = enhance_image(open_image(image_path, conf.upload_working_size if upload else None), *edit_values)
+    histogram = histogram_to_dict(compute_histogram(image))
+    queue.set_stage(job["id"], worker, "classify")
+    return {"classification_scores": classify_pil_image(model_id, image), "histogram": histogram}
+
+
+def run_worker(poll_interval: float) -> None:
+    """
+    Runs the queued jobs one at a time, forever.
+
+    The entry point of the worker processes. The lease of the running job
+    is renewed by a background thread, so that long jobs are not claimed
+    again by another worker. The results are added to the on-disk tier of
+    the result cache.
+
+    Parameters
+    ----------
+    poll_interval : float
+        The number of seconds between two looks at an empty queue.
+    """
+    from app.ml.inference import configure_threads
+    from app.ml.result_cache import open_result_cache
+
+    # stopped by the supervisor, not by the Ctrl+C meant for the app
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(message)s")
+    configure_threads(conf.job_worker_threads, conf.inter_op_threads)
+    queue = open_job_queue()
+    # only the on-disk tier is shared with the app
+    result_cache = open_result_cache(0)
+    worker = str(os.getpid())
+    logging.info(f"Job worker {worker} started")
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        done = threading.Event()
+
+        def keep_lease(job_id: str = job["id"]) -> None:
+            while not done.wait(queue.lease / 3):
+                queue.renew(job_id, worker)
+
+        keeper = threading.Thread(target=keep_lease, daemon=True)
+        keeper.start()
+        try:
+            result = run_job(queue, job, worker)
+        except Exception as e:
+            retry = queue.fail(job["id"], worker, f"{type(e).__name__}: {e}")
+            logging.warning(f"Job {job['id']} failed (attempt {job['attempts']}), "
+                            f"{'retrying' if retry else 'giving up'}: {e}")
+        else:
+            if job["payload"].get("cache_key"):
+                result_cache.put(job["payload"]["cache_key"], result["classification_scores"])
+            queue.complete(job["id"], worker, result)
+        finally:
+            done.set()
+            keeper.join()
+
+
+class JobSupervisor:
+    """
+    Starts the worker processes and replaces the ones that die.
+
+    The workers are spawned rather than forked, so that they start from
+    a clean interpreter whatever thread pools the app already started.
+
+    Attributes
+    ----------
+    queue : JobQueue
+        The queue drained by the workers.
+    workers : int
+        The number of worker processes.
+    interval : float
+        The number of seconds between two checks of the workers.
+    ttl : float
+        The number of seconds a finished job is kept.
+    started : bool
+        Whether the workers were started, possibly by a parent process.
+    """
+
+    def __init__(self, queue: JobQueue, workers: int, interval: float = 1.0, ttl: float = 3600.0) -> None:
+        """
+        Initializes the supervisor without starting the workers.
+
+        Parameters
+        ----------
+        queue : JobQueue
+            The queue drained by the workers.
+        workers : int
+            The number of worker processes.
+        interval : float, optional
+            The number of seconds between two checks (default is 1).
+        ttl : float, optional
+            The number of seconds a finished job is kept (default is 3600).
+        """
+        self.queue = queue
+        self.workers = workers
+        self.interval = interval
+        self.ttl = ttl
+        self.started = False
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list = []
+
+    def _spawn(self):
+        """
+        Starts one worker process.
+
+        Returns
+        -------
+        multiprocessing.Process
+            The started process.
+        """
+        process = self._context.Process(target=run_worker, args=(conf.job_poll_interval,),
+                                        name="job-worker", daemon=True)
+        process.start()
+        return process
+
+    def start(self) -> None:
+        """
+        Starts the worker processes.
+        """
+        self.started = True
+        self._processes = [self._spawn() for _ in range(self.workers)]
+
+    def supervise(self) -> None:
+        """
+        Replaces the dead workers, releasing the jobs they were running,
+        and deletes the finished jobs older than `ttl`.
+        """
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            released = self.queue.release_worker(str(process.pid))
+            logging.warning(f"Job worker {process.pid} exited with code {process.exitcode}, "
+                            f"restarting it ({released} job(s) released)")
+            self._processes[index] = self._spawn()
+        self.queue.purge(self.ttl)
+
+    async def run(self) -> None:
+        """
+        Supervises the workers every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.supervise)
+            except Exception as e:
+                logging.error(f"Job supervision failed: {e}")
+
+    def stop(self) -> None:
+        """
+        Stops the workers, making their running jobs claimable again.
+        """
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+            self.queue.release_worker(str(process.pid))
+        self._processes = []
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Runs job workers without the web app.")
+    parser.add_argument("--workers", type=int, default=conf.job_workers)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(message)s")
+
+    supervisor = JobSupervisor(open_job_queue(), args.workers, ttl=conf.job_ttl)
+    supervisor.start()
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        supervisor.stop()
@@ -0,0 +1,275 @@
+"""
+Per-stage latency histograms exposed in the Prometheus text format.
+
+Every stage of the request pipelines (form parsing, upload storage,
+editing, preprocessing, model loading, forward pass, JPEG encoding) is
+timed with `stage_timer` and recorded in a histogram labelled by stage,
+endpoint and model. The endpoint is taken from `current_endpoint`, which
+the HTTP middleware sets for the duration of each request and which
+follows the request into the inference threads. The forward passes run
+by the batching schedulers serve several requests at once, so they are
+only labelled by model.
+
+Stages run by the "process" inference executor are timed in the worker
+processes and are not collected.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from app.config import Configuration
+
+conf = Configuration()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("current_endpoint", default="")
+
+
+class Histogram:
+    """
+    Counts observations in cumulative buckets, as Prometheus histograms do.
+
+    Attributes
+    ----------
+    buckets : tuple of float
+        The sorted upper bounds of the buckets, without the implicit +Inf one.
+    """
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        """
+        Initializes an empty histogram.
+
+        Parameters
+        ----------
+        buckets : Iterable[float]
+            The upper bounds of the buckets.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Records an observation.
+
+        Parameters
+        ----------
+        value : float
+            The observed value.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        """
+        Returns the current state of the histogram.
+
+        Returns
+        -------
+        tuple
+            The cumulative count of each bucket (the last one being +Inf),
+            the sum and the number of the observations.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class StageMetrics:
+    """
+    Keeps a latency histogram for each (stage, endpoint, model) triple.
+
+    Attributes
+    ----------
+    buckets : tuple of float
+        The upper bounds, in seconds, of the histogram buckets.
+    """
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        """
+        Initializes the metrics without any histogram.
+
+        Parameters
+        ----------
+        buckets : Iterable[float]
+            The upper bounds, in seconds, of the histogram buckets.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._histograms: dict[tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, model: str = "", endpoint: Optional[str] = None) -> None:
+        """
+        Records the duration of a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        seconds : float
+            The duration of the stage.
+        model : str, optional
+            The model involved in the stage, if any (default is "").
+        endpoint : str, optional
+            The endpoint serving the request (default is `None`, the
+            endpoint of the current request).
+        """
+        if endpoint is None:
+            endpoint = current_endpoint.get()
+        key = (stage, endpoint, model)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, model: str = "") -> Iterator[None]:
+        """
+        Times the body of a `with` block as a stage of the current request.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        model : str, optional
+            The model involved in the stage, if any (default is "").
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, model)
+
+    def render(self, name: str = "classifier_stage_seconds") -> list[str]:
+        """
+        Formats the histograms in the Prometheus text format.
+
+        Parameters
+        ----------
+        name : str, optional
+            The name of the metric (default is "classifier_stage_seconds").
+
+        Returns
+        -------
+        list of str
+            The lines of the metric.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        lines = [
+            f"# HELP {name} Duration of each stage of the request pipelines.",
+            f"# TYPE {name} histogram",
+        ]
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for (stage, endpoint, model), histogram in histograms:
+            labels = {"stage": stage, "endpoint": endpoint, "model": model}
+            cumulative, total, count = histogram.snapshot()
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {bucket_count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+def format_value(value: float) -> str:
+    """
+    Formats a sample value without a needless fractional part.
+
+    Parameters
+    ----------
+    value : float
+        The value to be formatted.
+
+    Returns
+    -------
+    str
+        The formatted value.
+    """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels: dict) -> str:
+    """
+    Formats the labels of a sample, escaping their values.
+
+    Parameters
+    ----------
+    labels : dict
+        The label names mapped to their values.
+
+    Returns
+    -------
+    str
+        The label set, e.g. `{stage="forward",model="resnet18"}`, or "" if
+        there are no labels.
+    """
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_samples(name: str, help_text: str, samples: dict, kind: str = "gauge") -> list[str]:
+    """
+    Formats a gauge or counter in the Prometheus text format.
+
+    Parameters
+    ----------
+    name : str
+        The name of the metric.
+    help_text : str
+        The description of the metric.
+    samples : dict
+        The samples of the metric, mapping a tuple of (label, value) pairs
+        (empty for an unlabelled sample) to the value.
+    kind : str, optional
+        The type of the metric, "gauge" or "counter" (default is "gauge").
+
+    Returns
+    -------
+    list of str
+        The lines of the metric.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{format_labels(dict(labels))} {format_value(value)}")
+    return lines
+
+
+stage_metrics = StageMetrics(conf.metrics_buckets)
+
+
+def stage_timer(stage: str, model: str = ""):
+    """
+    Times the body of a `with` block as a stage of the current request.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, e.g. "preprocess".
+    model : str, optional
+        The model involved in the stage, if any (default is "").
+
+    Returns
+    -------
+    contextmanager
+        The context manager recording the duration in `stage_metrics`.
+    """
+    return stage_metrics.time(stage, model)
@@ -0,0 +1,192 @@
+"""
+Pluggable inference backends of the classification models.
+
+A backend runs batches of preprocessed images through one model and
+returns its logits, hiding the runtime executing it. `TorchBackend` runs
+the torchvision models and their compiled TorchScript variants, while
+`OnnxRuntimeBackend` runs the ONNX exports written by
+`app/prepare_models.py` with ONNX Runtime. The model registry only deals
+with backends, so the runtime of each model is picked by the deployment
+through `Configuration.model_backends`.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+import torch
+
+from app.ml.inference import forward, prepare_model
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """
+    Computes the memory used by the parameters and buffers of a model.
+
+    Compiled TorchScript variants keep their weights as frozen constants or
+    packed int8 parameters, so the size recorded when compiling them
+    (`compiled_size`) is used instead.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model to be measured.
+
+    Returns
+    -------
+    int
+        The size of the model tensors in bytes.
+    """
+    compiled_size = getattr(model, "compiled_size", None)
+    if compiled_size is not None:
+        return compiled_size
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ClassifierBackend(ABC):
+    """
+    Interface of the inference backends.
+
+    A backend missing one of the methods cannot be instantiated.
+
+    Attributes
+    ----------
+    name : str
+        The name of the runtime, as used in `Configuration.model_backends`.
+    """
+    name = ""
+
+    @abstractmethod
+    def predict(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Runs a batch of preprocessed images through the model.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            The preprocessed images, with shape (N, 3, H, W).
+
+        Returns
+        -------
+        torch.Tensor
+            The logits, with shape (N, number of classes).
+        """
+
+    @abstractmethod
+    def size_bytes(self) -> int:
+        """
+        Returns the memory used by the weights of the model.
+
+        Returns
+        -------
+        int
+            The size of the weights in bytes.
+        """
+
+
+class TorchBackend(ClassifierBackend):
+    """
+    Runs a PyTorch model (eager or TorchScript) through the fast inference path.
+
+    Attributes
+    ----------
+    model : torch.nn.Module
+        The model, prepared with `prepare_model`.
+    channels_last : bool
+        Whether the model and its inputs use the channels-last memory format.
+    """
+    name = "torch"
+
+    def __init__(self, model: torch.nn.Module, channels_last: bool = False) -> None:
+        """
+        Prepares the model for inference.
+
+        Parameters
+        ----------
+        model : torch.nn.Module
+            The model to be run.
+        channels_last : bool, optional
+            Whether to use the channels-last memory format (default is `False`).
+        """
+        self.channels_last = channels_last
+        self.model = prepare_model(model, channels_last)
+
+    def predict(self, batch: torch.Tensor) -> torch.Tensor:
+        return forward(self.model, batch, self.channels_last)
+
+    def size_bytes(self) -> int:
+        return model_size_bytes(self.model)
+
+
+class OnnxRuntimeBackend(ClassifierBackend):
+    """
+    Runs an exported ONNX model with ONNX Runtime on the CPU.
+
+    Attributes
+    ----------
+    model_path : str
+        The path of the `.onnx` file.
+    session : onnxruntime.InferenceSession
+        The inference session of the model.
+    """
+    name = "onnx"
+
+    def __init__(self,
+                 model_path: str,
+                 intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None,
+                 graph_optimization: str = "all") -> None:
+        """
+        Creates the inference session.
+
+        Parameters
+        ----------
+        model_path : str
+            The path of the `.onnx` file.
+        intra_op_threads : int, optional
+            The number of threads used inside a single operator (default is
+            `None`, the ONNX Runtime default).
+        inter_op_threads : int, optional
+            The number of threads used to run independent operators. When
+            set, the graph is executed in parallel mode (default is `None`,
+            sequential execution).
+        graph_optimization : str, optional
+            The graph optimization level: "disable", "basic", "extended" or
+            "all" (default is "all").
+
+        Raises
+        ------
+        ImportError
+            If ONNX Runtime is not installed.
+        """
+        import onnxruntime as ort  # optional dependency, only needed by this backend
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+        )
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: torch.Tensor) -> torch.Tensor:
+        inputs = np.ascontiguousarray(batch.numpy(), dtype=np.float32)
+        logits = self.session.run(None, {self._input_name: inputs})[0]
+        return torch.from_numpy(logits)
+
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.model_path)
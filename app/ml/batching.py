@@ -0,0 +1,156 @@
+"""
+Dynamic micro-batching of concurrent classification requests.
+
+Requests for the same model are collected for up to `max_wait_ms`
+milliseconds or `max_batch_size` images, stacked into a single batch and
+run with one forward pass. The results are then fanned back out to the
+waiting requests.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable
+
+import torch
+
+
+class BatchScheduler:
+    """
+    Collects preprocessed images for one model and runs them in batches.
+
+    Attributes
+    ----------
+    model_id : str
+        The identifier of the model served by this scheduler.
+    run_batch : Callable[[torch.Tensor], list]
+        The function running a stacked batch, returning one result per image.
+    max_batch_size : int
+        The maximum number of images in a batch.
+    max_wait_ms : float
+        The maximum time, in milliseconds, the first request of a batch waits
+        for others to join it.
+    """
+
+    def __init__(self,
+                 model_id: str,
+                 run_batch: Callable[[torch.Tensor], list],
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 5.0) -> None:
+        """
+        Initializes the scheduler and starts its worker thread.
+
+        Parameters
+        ----------
+        model_id : str
+            The identifier of the model served by this scheduler.
+        run_batch : Callable[[torch.Tensor], list]
+            The function running a stacked batch, returning one result per image.
+        max_batch_size : int, optional
+            The maximum number of images in a batch (default is 8).
+        max_wait_ms : float, optional
+            The maximum batching delay in milliseconds (default is 5).
+        """
+        self.model_id = model_id
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue[tuple[torch.Tensor, Future]]" = queue.Queue()
+        self._batch_sizes: Counter = Counter()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(
+            target=self._serve, name=f"batcher-{model_id}", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, tensor: torch.Tensor) -> Future:
+        """
+        Queues a preprocessed image for the next batch.
+
+        Parameters
+        ----------
+        tensor : torch.Tensor
+            The preprocessed image, without the batch dimension.
+
+        Returns
+        -------
+        Future
+            A future resolved with the result for this image.
+        """
+        future: Future = Future()
+        self._queue.put((tensor, future))
+        return future
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Reports the batch sizes achieved so far.
+
+        Returns
+        -------
+        dict
+            The number of images waiting for a batch, the number of batches
+            and images processed, the mean batch size and a histogram mapping
+            each batch size to its number of occurrences.
+        """
+        with self._lock:
+            sizes = dict(sorted(self._batch_sizes.items()))
+        batches = sum(sizes.values())
+        images = sum(size * count for size, count in sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queued": self._queue.qsize(),
+            "batches": batches,
+            "images": images,
+            "mean_batch_size": images / batches if batches else 0.0,
+            "batch_sizes": sizes,
+        }
+
+    def _collect(self) -> list[tuple[torch.Tensor, Future]]:
+        """
+        Blocks until a request arrives, then gathers the ones joining its batch.
+
+        Returns
+        -------
+        list of tuple
+            The (tensor, future) pairs of the batch.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _serve(self) -> None:
+        """
+        Runs batches forever, resolving the futures of their requests.
+        """
+        while True:
+            batch = self._collect()
+            batch = [(tensor, future) for tensor, future in batch
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+
+            try:
+                results = self.run_batch(torch.stack([tensor for tensor, _ in batch]))
+            except Exception as e:
+                logging.error(f"Batch of {len(batch)} failed on {self.model_id}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
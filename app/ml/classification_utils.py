@@ -2,191 +2,684 @@
 This is a simple classification service. It accepts an url of an
 image and returns the top-5 classification labels and scores.
 """
+import functools
 import importlib
 import json
 import logging
 import os
+import threading
+import numpy as np
 import torch
 from PIL import Image
-from app.utils import get_filename
+from typing import Callable, Iterable, Optional
+from app.utils import enhance_image, open_image
 
 from torchvision import transforms
-from fastapi import UploadFile
 
 from app.config import Configuration
+from app.histograms import compute_histogram
+from app.metrics import stage_timer
+from app.ml.batching import BatchScheduler
+from app.ml.backends import ClassifierBackend, OnnxRuntimeBackend, TorchBackend
+from app.ml.compilation import TORCHSCRIPT_VARIANTS, compiled_model_path, load_compiled_model
+from app.ml.inference import top_k
+from app.ml.model_registry import ModelRegistry
+from app.ml.tensor_store import TensorStore
 
 conf = Configuration()
 
-import os
-from PIL import Image
+IMAGENET_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+IMAGENET_STD = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
 
 
-def fetch_image(image_id: str) -> Image.Image:
+@functools.lru_cache(maxsize=None)
+def get_labels() -> tuple:
     """
-    Retrieves an image from the edited, upload, or dataset folder.
+    Retrieves the ImageNet class labels.
 
-    This function attempts to fetch an image using the provided image ID.
-    - It first checks if an edited version of the image exists in the 'edited' folder.
-    - If not found, it looks in the upload folder.
-    - If still not found, it retrieves the image from the default dataset folder.
+    This function loads the ImageNet labels from a JSON file the first time
+    it is called, and returns the same immutable table afterwards.
+
+    Returns
+    -------
+    tuple of str
+        The ImageNet labels, where each index represents a class.
+    """
+    labels_path = os.path.join(conf.image_folder_path, "imagenet_labels.json")
+    with open(labels_path) as f:
+        labels = json.load(f)
+    return tuple(labels)
+
+
+def get_model(model_id: str):
+    """
+    Loads a pre-trained model from the configuration.
+
+    This function imports a specified model from `torchvision.models`
+    using the given model ID. The model is pre-downloaded to prevent
+    unnecessary waiting during classification. If `conf.model_backends`
+    selects a compiled TorchScript variant for the model, the variant
+    produced by `prepare_models.py` is loaded instead, falling back to the
+    torchvision model when it is missing or failed the agreement check.
 
     Parameters
     ----------
-    image_id : str
-        The filename or identifier of the image to be retrieved.
+    model_id : str
+        The identifier of the model to be loaded (must be in `conf.models`).
+
+    Returns
+    -------
+    torch.nn.Module
+        The loaded PyTorch model with default pretrained weights, or its
+        compiled TorchScript variant.
+
+    Raises
+    ------
+    ImportError
+        If the specified model is not found.
+    """
+    if model_id in conf.models:
+        backend = conf.model_backends.get(model_id, "eager")
+        if backend in TORCHSCRIPT_VARIANTS:
+            model = load_compiled_model(conf.compiled_models_path, model_id, backend)
+            if model is not None:
+                return model
+            logging.warning(f"Falling back to the eager {model_id} model")
+        try:
+            module = importlib.import_module("torchvision.models")
+            return module.__getattribute__(model_id)(weights="DEFAULT")
+        except ImportError:
+            logging.error(f"Model {model_id} not found")
+    else:
+        raise ImportError(f"Model {model_id} not found in configuration.")
+
+
+def get_backend(model_id: str) -> ClassifierBackend:
+    """
+    Builds the inference backend of a model.
+
+    Models whose `conf.model_backends` entry is "onnx" run their ONNX
+    export with ONNX Runtime. The others, and the ONNX models that are
+    missing, rejected by the agreement check or cannot be run because ONNX
+    Runtime is not installed (see `running_variant`), run on PyTorch with
+    the model of `get_model`.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model (must be in `conf.models`).
+
+    Returns
+    -------
+    ClassifierBackend
+        The backend running the model.
+
+    Raises
+    ------
+    ImportError
+        If the specified model is not found.
+    """
+    if model_id in conf.models and conf.model_backends.get(model_id) == "onnx":
+        model_path = compiled_model_path(conf.compiled_models_path, model_id, "onnx")
+        if model_path is not None:
+            return OnnxRuntimeBackend(
+                model_path,
+                intra_op_threads=conf.onnx_intra_op_threads,
+                inter_op_threads=conf.onnx_inter_op_threads,
+                graph_optimization=conf.onnx_graph_optimization,
+            )
+        logging.warning(f"Falling back to the PyTorch {model_id} model")
+
+    model = get_model(model_id)
+    if model is None:
+        raise ImportError(f"Model {model_id} could not be loaded.")
+    return TorchBackend(model, conf.channels_last)
+
+
+model_registry = ModelRegistry(get_backend, conf.model_memory_budget_mb)
+
+tensor_store = TensorStore(conf.tensor_store_path)
+
+_schedulers: dict[str, BatchScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def batching_options(model_id: str) -> dict:
+    """
+    Returns the micro-batching options of a model.
+
+    The options are read from `conf.batching`, falling back to
+    `conf.default_batching` for models without their own entry.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+
+    Returns
+    -------
+    dict
+        The `max_batch_size` and `max_wait_ms` of the model.
+    """
+    return {**conf.default_batching, **conf.batching.get(model_id, {})}
+
+
+def get_batch_scheduler(model_id: str) -> BatchScheduler:
+    """
+    Returns the batching scheduler of a model, creating it on first use.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model (must be in `conf.models`).
+
+    Returns
+    -------
+    BatchScheduler
+        The scheduler collecting the requests for `model_id`.
+    """
+    if model_id not in conf.models:
+        raise ImportError(f"Model {model_id} not found in configuration.")
+
+    with _schedulers_lock:
+        scheduler = _schedulers.get(model_id)
+        if scheduler is None:
+            options = batching_options(model_id)
+            scheduler = BatchScheduler(
+                model_id,
+                lambda batch: predict_batch(model_id, batch),
+                max_batch_size=options["max_batch_size"],
+                max_wait_ms=options["max_wait_ms"],
+            )
+            _schedulers[model_id] = scheduler
+        return scheduler
+
+
+def batching_stats() -> dict:
+    """
+    Reports the batch sizes achieved by each model so far.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each model with a scheduler to its statistics.
+    """
+    with _schedulers_lock:
+        return {model_id: scheduler.stats() for model_id, scheduler in _schedulers.items()}
+
+
+def crop_image(img: Image.Image) -> Image.Image:
+    """
+    Resizes and center-crops an image to the 224x224 input of the models.
+
+    Parameters
+    ----------
+    img : Image.Image
+        The image to be cropped.
 
     Returns
     -------
     Image.Image
-        The opened image file as a PIL Image object.
+        The 224x224 RGB crop.
     """
+    return get_transform(224, to_tensor=False)(img.convert("RGB"))
 
-    edited_image_path = os.path.join(conf.edit_folder_path, image_id)
-    upload_image_path = os.path.join(conf.upload_folder_path, image_id)
-    default_image_path = os.path.join(conf.image_folder_path, image_id)
 
-    if os.path.exists(edited_image_path):
-        print(f"Fetching edited image: {edited_image_path}")
-        return Image.open(edited_image_path)
+def crop_to_tensor(pixels: np.ndarray) -> torch.Tensor:
+    """
+    Converts a uint8 crop to the normalized tensor expected by the models.
 
-    if os.path.exists(upload_image_path):
-        print(f"Fetching uploaded image: {upload_image_path}")
-        return Image.open(upload_image_path)
+    This is equivalent to the `ToTensor` and `Normalize` steps of
+    `preprocess_image`, applied to an already cropped image.
 
-    if os.path.exists(default_image_path):
-        print(f"Fetching default image: {default_image_path}")
-        return Image.open(default_image_path)
+    Parameters
+    ----------
+    pixels : np.ndarray
+        The uint8 crop, with shape (224, 224, 3).
+
+    Returns
+    -------
+    torch.Tensor
+        The preprocessed image, with shape (3, 224, 224).
+    """
+    tensor = torch.from_numpy(pixels).permute(2, 0, 1).float().div(255)
+    return tensor.sub_(IMAGENET_MEAN).div_(IMAGENET_STD)
+
+
+def input_size(model_id: str) -> int:
+    """
+    Returns the side of the square input of a model.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
 
-    raise FileNotFoundError(f"Image not found in any folder: {image_id}")
+    Returns
+    -------
+    int
+        The input size, 224 unless the model has an entry in `conf.input_sizes`.
+    """
+    return conf.input_sizes.get(model_id, 224)
 
 
-def store_uploaded_image(file: UploadFile) -> str:
+@functools.lru_cache(maxsize=None)
+def get_transform(size: int = 224, to_tensor: bool = True) -> transforms.Compose:
     """
-    Saves an uploaded image to the designated upload folder with a unique filename.
+    Returns the preprocessing pipeline of an input size, built once.
 
-    This function stores the uploaded image file in the upload directory,
-    ensuring the filename does not overwrite existing files.
+    The image is resized keeping the 256/224 ratio between the short side
+    and the crop used by the torchvision models, then center-cropped.
 
     Parameters
     ----------
-    file : UploadFile
-        The uploaded file containing the image data.
+    size : int, optional
+        The side of the crop (default is 224).
+    to_tensor : bool, optional
+        Whether the pipeline also converts the crop to a normalized tensor
+        (default is `True`), or stops at the cropped image.
 
     Returns
     -------
-    str
-        The unique filename of the saved image.
+    transforms.Compose
+        The preprocessing pipeline.
     """
-    upload_dir = conf.upload_folder_path
-    os.makedirs(upload_dir, exist_ok=True)
+    steps = [
+        transforms.Resize(round(size * 256 / 224)),
+        transforms.CenterCrop(size),
+    ]
+    if to_tensor:
+        steps += [
+            transforms.ToTensor(),
+            transforms.Normalize(mean=IMAGENET_MEAN.flatten().tolist(), std=IMAGENET_STD.flatten().tolist()),
+        ]
+    return transforms.Compose(steps)
+
+
+def preprocess_image(img: Image.Image, size: int = 224) -> torch.Tensor:
+    """
+    Converts an image to the normalized tensor expected by the models.
 
-    filename = get_filename(upload_dir, os.path.basename(file.filename))
-    file_path = os.path.join(upload_dir, filename)
+    The pipeline of each input size is built once by `get_transform`.
 
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    Parameters
+    ----------
+    img : Image.Image
+        The image to be preprocessed.
+    size : int, optional
+        The side of the crop (default is 224).
 
-    return filename
+    Returns
+    -------
+    torch.Tensor
+        The preprocessed image, with shape (3, size, size).
+    """
+    return get_transform(size)(img.convert("RGB"))
 
 
-def get_labels() -> list:
+def preprocess_for_sizes(load_image: Callable[[], Image.Image],
+                         sizes: Iterable[int],
+                         pixels: Optional[np.ndarray] = None) -> dict[int, torch.Tensor]:
     """
-    Retrieves the ImageNet class labels.
+    Preprocesses an image for several input sizes, decoding it at most once.
 
-    This function loads the ImageNet labels from a JSON file and returns them
-    as a list, where each index corresponds to a class label.
+    Parameters
+    ----------
+    load_image : Callable[[], Image.Image]
+        The function decoding the image, only called if a size needs it.
+    sizes : Iterable[int]
+        The input sizes to be produced.
+    pixels : np.ndarray, optional
+        The stored 224x224 uint8 crop of the image, if any, which is used
+        instead of decoding for size 224 (default is `None`).
 
     Returns
     -------
-    list of str
-        A list of ImageNet labels where each index represents a class.
+    dict
+        A dictionary mapping each size to the preprocessed image.
     """
-    labels_path = os.path.join(conf.image_folder_path, "imagenet_labels.json")
-    with open(labels_path) as f:
-        labels = json.load(f)
-    return labels
+    tensors = {}
+    img = None
+    for size in sorted(set(sizes)):
+        if size == 224 and pixels is not None:
+            tensors[size] = crop_to_tensor(pixels)
+            continue
+        if img is None:
+            img = load_image().convert("RGB")
+        tensors[size] = preprocess_image(img, size)
+    return tensors
+
+
+def format_scores(scores: torch.Tensor, indices: torch.Tensor) -> list:
+    """
+    Pairs the top-k scores with the names of their classes.
 
+    Parameters
+    ----------
+    scores : torch.Tensor
+        The scores, with shape (N, k).
+    indices : torch.Tensor
+        The class indices, with shape (N, k).
 
-def get_model(model_id: str):
+    Returns
+    -------
+    list of list of tuple
+        For each image, the top-k classification results as tuples of
+        (label_name: str, score: float).
     """
-    Loads a pre-trained model from the configuration.
+    labels = get_labels()
+    return [
+        [(labels[idx], score) for idx, score in zip(row_indices, row_scores)]
+        for row_indices, row_scores in zip(indices.tolist(), scores.tolist())
+    ]
 
-    This function imports a specified model from `torchvision.models`
-    using the given model ID. The model is pre-downloaded to prevent
-    unnecessary waiting during classification.
+
+def predict_batch(model_id: str, batch: torch.Tensor) -> torch.Tensor:
+    """
+    Runs a batch of preprocessed images through the backend of a model.
 
     Parameters
     ----------
     model_id : str
-        The identifier of the model to be loaded (must be in `conf.models`).
+        The identifier of the pre-trained model.
+    batch : torch.Tensor
+        The stacked preprocessed images, with shape (N, 3, H, W).
 
     Returns
     -------
-    torch.nn.Module
-        The loaded PyTorch model with default pretrained weights.
+    torch.Tensor
+        The logits, with shape (N, number of classes).
+    """
+    model = model_registry.get(model_id)
+    with stage_timer("forward", model_id):
+        return model.predict(batch)
 
-    Raises
-    ------
-    ImportError
-        If the specified model is not found.
+
+def classify_batch(model_id: str, batch: torch.Tensor) -> list:
     """
-    if model_id in conf.models:
-        try:
-            module = importlib.import_module("torchvision.models")
-            return module.__getattribute__(model_id)(weights="DEFAULT")
-        except ImportError:
-            logging.error(f"Model {model_id} not found")
-    else:
-        raise ImportError(f"Model {model_id} not found in configuration.")
+    Classifies a batch of preprocessed images with a single forward pass.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    batch : torch.Tensor
+        The stacked preprocessed images, with shape (N, 3, H, W).
+
+    Returns
+    -------
+    list of list of tuple
+        For each image, the top-k classification results as tuples of
+        (label_name: str, score: float).
+    """
+    scores, indices = top_k(predict_batch(model_id, batch), conf.result_top_k, conf.result_scores)
+    return format_scores(scores, indices)
 
 
-def classify_image(model_id: str, img_id: str) -> list:
+def classify_tensors(model_id: str, tensors: list) -> list:
     """
-    Classifies an image using the specified pre-trained model.
+    Classifies already preprocessed images with a single forward pass.
 
-    This function feeds the specified image into a pre-trained model and
-    returns the top-5 classification results.
+    Unlike `classify_pil_image`, the images do not go through the batching
+    scheduler: the caller already holds a full batch.
 
     Parameters
     ----------
     model_id : str
         The identifier of the pre-trained model to be used for classification.
-    img_id : str
-        The identifier (filename) of the image to be classified.
+    tensors : list of torch.Tensor
+        The images preprocessed for the input size of the model.
+
+    Returns
+    -------
+    list of list of tuple
+        For each image, the top-k classification results as tuples of
+        (label_name: str, score: float).
+    """
+    return classify_batch(model_id, torch.stack(tensors))
+
+
+def classify_tensor(model_id: str, tensor: torch.Tensor) -> list:
+    """
+    Classifies a preprocessed image through the batching scheduler of the model.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    tensor : torch.Tensor
+        The image preprocessed for the input size of the model.
 
     Returns
     -------
     list of tuple
-        A list containing the top-5 classification results, where each item
-        is a tuple of (label_name: str, confidence_score: float).
+        A list containing the top-k classification results, where each item
+        is a tuple of (label_name: str, score: float).
     """
-    img = fetch_image(img_id)
-    model = get_model(model_id)
-    model.eval()
+    with stage_timer("inference", model_id):
+        logits = get_batch_scheduler(model_id).submit(tensor).result()
+    scores, indices = top_k(logits[None], conf.result_top_k, conf.result_scores)
+    return format_scores(scores, indices)[0]
+
+
+def classify_pil_image(model_id: str, img: Image.Image) -> list:
+    """
+    Classifies an in-memory image using the specified pre-trained model.
 
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
+    The image is preprocessed and handed to the batching scheduler of the
+    model, which may run it together with other concurrent requests.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    img : Image.Image
+        The image to be classified.
+
+    Returns
+    -------
+    list of tuple
+        A list containing the top-k classification results, where each item
+        is a tuple of (label_name: str, score: float).
+    """
+    get_batch_scheduler(model_id)  # fail fast on unknown models
+    with stage_timer("preprocess", model_id):
+        tensor = preprocess_image(img, input_size(model_id))
+    return classify_tensor(model_id, tensor)
 
-    # Apply transformation
-    img = img.convert("RGB")
-    preprocessed = transform(img).unsqueeze(0)
 
-    # Get model output
-    out = model(preprocessed)
-    _, indices = torch.sort(out, descending=True)
+def preprocess_dataset_image(image_id: str, sizes: Iterable[int] = (224,)) -> dict[int, torch.Tensor]:
+    """
+    Preprocesses an unedited image of the dataset for several input sizes.
 
-    # Convert scores to percentages
-    percentage = torch.nn.functional.softmax(out, dim=1)[0] * 100
+    The 224x224 crop is read from the memory-mapped tensor store when
+    available, skipping the JPEG decode and the resize. The other sizes
+    share a single decode of the image from `conf.image_folder_path`.
 
-    # Retrieve labels
-    labels = get_labels()
+    Parameters
+    ----------
+    image_id : str
+        The filename of the dataset image.
+    sizes : Iterable[int], optional
+        The input sizes to be produced (default is 224 only).
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each size to the preprocessed image.
+    """
+    image_path = os.path.join(conf.image_folder_path, os.path.basename(image_id))
+    return preprocess_for_sizes(lambda: Image.open(image_path), sizes, tensor_store.get(image_id))
+
+
+def preprocess_uploaded_image(filename: str, sizes: Iterable[int] = (224,)) -> dict[int, torch.Tensor]:
+    """
+    Preprocesses an unedited uploaded image for several input sizes.
+
+    The image is decoded once, downscaled while decoding to
+    `conf.upload_working_size`, since the preprocessing only needs a short
+    side slightly larger than the input size.
+
+    Parameters
+    ----------
+    filename : str
+        The filename of the image in the upload folder.
+    sizes : Iterable[int], optional
+        The input sizes to be produced (default is 224 only).
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each size to the preprocessed image.
+    """
+    image_path = os.path.join(conf.upload_folder_path, os.path.basename(filename))
+    return preprocess_for_sizes(lambda: open_image(image_path, conf.upload_working_size), sizes)
+
+
+def classify_dataset_image(model_id: str, image_id: str) -> list:
+    """
+    Classifies an unedited image of the dataset.
+
+    The image is preprocessed by `preprocess_dataset_image`, which reads the
+    crop from the tensor store when available.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    image_id : str
+        The filename of the dataset image.
+
+    Returns
+    -------
+    list of tuple
+        A list containing the top-k classification results, where each item
+        is a tuple of (label_name: str, score: float).
+    """
+    get_batch_scheduler(model_id)  # fail fast on unknown models
+    size = input_size(model_id)
+    with stage_timer("preprocess", model_id):
+        tensor = preprocess_dataset_image(image_id, [size])[size]
+    return classify_tensor(model_id, tensor)
+
+
+def classify_uploaded_image(model_id: str, filename: str) -> list:
+    """
+    Classifies an unedited uploaded image.
+
+    The image is preprocessed by `preprocess_uploaded_image`, which
+    downscales large images while decoding.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    filename : str
+        The filename of the image in the upload folder.
+
+    Returns
+    -------
+    list of tuple
+        A list containing the top-k classification results, where each item
+        is a tuple of (label_name: str, score: float).
+    """
+    get_batch_scheduler(model_id)  # fail fast on unknown models
+    size = input_size(model_id)
+    with stage_timer("preprocess", model_id):
+        tensor = preprocess_uploaded_image(filename, [size])[size]
+    return classify_tensor(model_id, tensor)
+
+
+def classify_ensemble(model_ids: list[str], tensors: dict[int, torch.Tensor], k: int = 5) -> dict:
+    """
+    Classifies an image with several models and fuses their predictions.
+
+    The image is submitted to the batching scheduler of every model at
+    once, so the models run concurrently on their own worker threads. The
+    fused ranking averages the class probabilities of the models.
+
+    Parameters
+    ----------
+    model_ids : list of str
+        The identifiers of the models of the ensemble.
+    tensors : dict
+        The preprocessed image for the input size of each model, as
+        returned by `preprocess_dataset_image` or `preprocess_uploaded_image`.
+    k : int, optional
+        The number of classes returned for each model and for the ensemble
+        (default is 5).
+
+    Returns
+    -------
+    dict
+        A dictionary with the top-k results of each model ("models") and of
+        the averaged probabilities ("ensemble"), as lists of
+        (label_name: str, confidence_score: float) tuples.
+    """
+    futures = {
+        model_id: get_batch_scheduler(model_id).submit(tensors[input_size(model_id)])
+        for model_id in model_ids
+    }
+    logits = torch.stack([futures[model_id].result() for model_id in model_ids])
+    k = min(k, logits.shape[1])
+
+    percentages, indices = top_k(logits, k)
+    scores = format_scores(percentages, indices)
+
+    probabilities = torch.nn.functional.softmax(logits, dim=1).mean(dim=0, keepdim=True)
+    fused_percentages, fused_indices = torch.topk(probabilities * 100, k, dim=1)
+    return {
+        "models": dict(zip(model_ids, scores)),
+        "ensemble": format_scores(fused_percentages, fused_indices)[0],
+    }
+
+
+def edit_and_classify(model_id: str,
+                      original_image_path: str,
+                      color_value: int,
+                      brightness_value: int,
+                      contrast_value: int,
+                      sharpness_value: int,
+                      working_size: Optional[int] = None) -> tuple[list, Image.Image, np.ndarray]:
+    """
+    Enhances an image and classifies the result without writing it to disk.
+
+    The enhanced image goes straight into preprocessing, avoiding the JPEG
+    encode and decode (and the re-compression artifacts) of the edited file.
+    Its color histogram is computed in the same pass, while the pixels are
+    in memory.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the pre-trained model to be used for classification.
+    original_image_path : str
+        The file path of the original image.
+    color_value : int
+        The color enhancement factor, ranging from -100 to 100.
+    brightness_value : int
+        The brightness enhancement factor, ranging from -100 to 100.
+    contrast_value : int
+        The contrast enhancement factor, ranging from -100 to 100.
+    sharpness_value : int
+        The sharpness enhancement factor, ranging from -100 to 100.
+    working_size : int, optional
+        The length the shorter side is reduced to while decoding, before the
+        enhancements (default is `None`, keep the original resolution).
+
+    Returns
+    -------
+    tuple
+        The top-k classification results, the enhanced image, which can be
+        encoded for display separately, and its histogram with shape (3, 256).
+    """
+    get_batch_scheduler(model_id)  # fail fast on unknown models
 
-    # Extract top-5 classification results
-    output = [(labels[idx], percentage[idx].item()) for idx in indices[0][:5]]
+    with stage_timer("edit", model_id):
+        original_image = open_image(original_image_path, working_size)
+        edited_image = enhance_image(original_image, color_value, brightness_value,
+                                     contrast_value, sharpness_value)
+    with stage_timer("histogram"):
+        histogram = compute_histogram(edited_image)
 
-    img.close()
-    return output
+    return classify_pil_image(model_id, edited_image), edited_image, histogram
@@ -0,0 +1,407 @@
+"""
+Offline compilation of the models into faster CPU variants.
+
+`app/prepare_models.py` compiles every configured model into the variants
+below, serialized as TorchScript under `Configuration.compiled_models_path`:
+
+- "torchscript": the fp32 model traced and frozen, then optimized for
+  inference when loaded;
+- "dynamic_int8": the linear layers quantized to int8, with activations
+  quantized on the fly;
+- "static_int8": every supported layer quantized to int8 (FX graph mode),
+  with the activation ranges calibrated on dataset images;
+- "onnx": the fp32 model exported to ONNX, run by ONNX Runtime.
+
+A JSON manifest records the file, size and top-5 agreement with the fp32
+model of every variant, measured by reloading the written file. At runtime
+only the variants that passed the agreement check are loaded.
+"""
+import copy
+import io
+import json
+import logging
+import os
+from typing import Callable, Optional
+
+import torch
+
+from app.ml.backends import ClassifierBackend, OnnxRuntimeBackend, TorchBackend
+from app.ml.manifest import MANIFEST_NAME, TORCHSCRIPT_VARIANTS, VARIANTS, read_manifest, running_variant
+from app.utils import atomic_write
+
+
+def trace_model(model: torch.nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    """
+    Traces a model to TorchScript and freezes its weights.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model, in evaluation mode.
+    example : torch.Tensor
+        An example input batch.
+
+    Returns
+    -------
+    torch.jit.ScriptModule
+        The frozen TorchScript module.
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, check_trace=False)
+        return torch.jit.freeze(traced)
+
+
+def export_onnx(model: torch.nn.Module, example: torch.Tensor) -> bytes:
+    """
+    Exports a model to ONNX, with a dynamic batch dimension.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model, in evaluation mode.
+    example : torch.Tensor
+        An example input batch.
+
+    Returns
+    -------
+    bytes
+        The serialized ONNX model.
+    """
+    buffer = io.BytesIO()
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (example,), buffer,
+            input_names=["input"],
+            output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            dynamo=False,
+        )
+    return buffer.getvalue()
+
+
+def save_torchscript(model: torch.jit.ScriptModule) -> bytes:
+    """
+    Serializes a TorchScript module.
+
+    Parameters
+    ----------
+    model : torch.jit.ScriptModule
+        The module to be serialized.
+
+    Returns
+    -------
+    bytes
+        The serialized module.
+    """
+    buffer = io.BytesIO()
+    torch.jit.save(model, buffer)
+    return buffer.getvalue()
+
+
+def quantize_dynamic(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Quantizes the linear layers of a model to int8.
+
+    The weights are quantized ahead of time, the activations at every
+    forward pass. This mostly helps the models with large fully connected
+    layers (alexnet, vgg16).
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The fp32 model, in evaluation mode.
+
+    Returns
+    -------
+    torch.nn.Module
+        The quantized copy of the model.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def quantize_static(model: torch.nn.Module, calibration: torch.Tensor, batch_size: int = 8) -> torch.nn.Module:
+    """
+    Quantizes a model to int8 with calibrated activation ranges.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The fp32 model, in evaluation mode.
+    calibration : torch.Tensor
+        The preprocessed calibration images, with shape (N, 3, H, W).
+    batch_size : int, optional
+        The number of calibration images per forward pass (default is 8).
+
+    Returns
+    -------
+    torch.nn.Module
+        The quantized copy of the model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(copy.deepcopy(model), qconfig_mapping, (calibration[:1],))
+    with torch.no_grad():
+        for batch in torch.split(calibration, batch_size):
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def predict(model: Callable[[torch.Tensor], torch.Tensor],
+            images: torch.Tensor,
+            batch_size: int = 8) -> torch.Tensor:
+    """
+    Computes the logits of a set of images.
+
+    Parameters
+    ----------
+    model : Callable[[torch.Tensor], torch.Tensor]
+        The model, or the `predict` method of a backend.
+    images : torch.Tensor
+        The preprocessed images, with shape (N, 3, H, W).
+    batch_size : int, optional
+        The number of images per forward pass (default is 8).
+
+    Returns
+    -------
+    torch.Tensor
+        The logits, with shape (N, number of classes).
+    """
+    with torch.inference_mode():
+        return torch.cat([model(batch) for batch in torch.split(images, batch_size)])
+
+
+def top5_agreement(reference: torch.Tensor, candidate: torch.Tensor) -> dict[str, float]:
+    """
+    Measures how closely the predictions of a variant follow the fp32 model.
+
+    Parameters
+    ----------
+    reference : torch.Tensor
+        The logits of the fp32 model, with shape (N, number of classes).
+    candidate : torch.Tensor
+        The logits of the variant on the same images.
+
+    Returns
+    -------
+    dict
+        The fraction of images with the same top-1 class ("top1_agreement")
+        and the mean fraction of shared top-5 classes ("top5_agreement").
+    """
+    reference_top5 = reference.topk(5, dim=1).indices
+    candidate_top5 = candidate.topk(5, dim=1).indices
+    shared = (reference_top5[:, :, None] == candidate_top5[:, None, :]).any(dim=2).sum(dim=1)
+    return {
+        "top1_agreement": (reference_top5[:, 0] == candidate_top5[:, 0]).float().mean().item(),
+        "top5_agreement": (shared.float() / 5).mean().item(),
+    }
+
+
+def compile_model(model_id: str,
+                  model: torch.nn.Module,
+                  calibration: torch.Tensor,
+                  evaluation: torch.Tensor,
+                  output_dir: str,
+                  variants: tuple = VARIANTS,
+                  min_agreement: float = 0.9) -> dict[str, dict]:
+    """
+    Compiles the variants of a model and checks them against the fp32 model.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    model : torch.nn.Module
+        The fp32 model, in evaluation mode.
+    calibration : torch.Tensor
+        The preprocessed images used to calibrate static quantization.
+    evaluation : torch.Tensor
+        The preprocessed images used for the agreement check.
+    output_dir : str
+        The folder of the compiled models.
+    variants : tuple of str, optional
+        The variants to be produced (default is all of them).
+    min_agreement : float, optional
+        The minimum top-5 agreement a variant needs to be accepted
+        (default is 0.9).
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each compiled variant to its manifest entry:
+        the file name, its size in bytes, the agreement figures and whether
+        the variant was accepted.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    example = evaluation[:1]
+    reference = predict(model, evaluation)
+
+    builders = {
+        "torchscript": lambda: save_torchscript(trace_model(model, example)),
+        "dynamic_int8": lambda: save_torchscript(trace_model(quantize_dynamic(model), example)),
+        "static_int8": lambda: save_torchscript(trace_model(quantize_static(model, calibration), example)),
+        "onnx": lambda: export_onnx(model, example),
+    }
+
+    entries = {}
+    for variant in variants:
+        filename = variant_filename(model_id, variant)
+        try:
+            data = builders[variant]()
+            with atomic_write(os.path.join(output_dir, filename)) as f:
+                f.write(data)
+            # check the written file, as it will be loaded at runtime
+            compiled = load_variant(os.path.join(output_dir, filename), variant)
+        except Exception as e:
+            logging.error(f"Could not compile {model_id} as {variant}: {e}")
+            continue
+
+        agreement = top5_agreement(reference, predict(compiled.predict, evaluation))
+        entries[variant] = {
+            "file": filename,
+            "size": len(data),
+            **agreement,
+            "accepted": agreement["top5_agreement"] >= min_agreement,
+        }
+        logging.info(f"Compiled {model_id} as {variant}: {entries[variant]}")
+    return entries
+
+
+def variant_filename(model_id: str, variant: str) -> str:
+    """
+    Returns the name of the file of a compiled variant.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    variant : str
+        The name of the variant.
+
+    Returns
+    -------
+    str
+        The filename, with the ".onnx" extension for ONNX exports and ".pt"
+        for TorchScript.
+    """
+    extension = "onnx" if variant == "onnx" else "pt"
+    return f"{model_id}.{variant}.{extension}"
+
+
+def optimize(model: torch.jit.ScriptModule, variant: str) -> torch.jit.ScriptModule:
+    """
+    Applies the load-time optimizations of a variant.
+
+    The operator fusions of `torch.jit.optimize_for_inference` produce
+    constants that cannot be serialized, so they are applied after loading,
+    and only to the fp32 "torchscript" variant.
+
+    Parameters
+    ----------
+    model : torch.jit.ScriptModule
+        The loaded variant.
+    variant : str
+        The name of the variant.
+
+    Returns
+    -------
+    torch.jit.ScriptModule
+        The optimized variant.
+    """
+    if variant == "torchscript":
+        return torch.jit.optimize_for_inference(model)
+    return model
+
+
+def write_manifest(output_dir: str, manifest: dict) -> None:
+    """
+    Atomically writes the manifest of the compiled models.
+
+    Parameters
+    ----------
+    output_dir : str
+        The folder of the compiled models.
+    manifest : dict
+        A dictionary mapping each model to the manifest entries of its variants.
+    """
+    with atomic_write(os.path.join(output_dir, MANIFEST_NAME)) as f:
+        f.write(json.dumps(manifest, indent=2).encode())
+
+
+def load_variant(model_path: str, variant: str, **onnx_options) -> ClassifierBackend:
+    """
+    Loads the backend running a compiled variant.
+
+    Parameters
+    ----------
+    model_path : str
+        The file of the variant.
+    variant : str
+        The name of the variant, one of `VARIANTS`.
+    **onnx_options : Any
+        The session options of `OnnxRuntimeBackend`, for the "onnx" variant.
+
+    Returns
+    -------
+    ClassifierBackend
+        The backend running the variant.
+    """
+    if variant == "onnx":
+        return OnnxRuntimeBackend(model_path, **onnx_options)
+    return TorchBackend(optimize(torch.jit.load(model_path, map_location="cpu"), variant))
+
+
+def compiled_model_path(output_dir: str, model_id: str, variant: str) -> Optional[str]:
+    """
+    Returns the file of a compiled variant, if it passed the agreement check.
+
+    Parameters
+    ----------
+    output_dir : str
+        The folder of the compiled models.
+    model_id : str
+        The identifier of the model.
+    variant : str
+        The name of the variant, one of `VARIANTS`.
+
+    Returns
+    -------
+    str or None
+        The path of the variant, or `None` if the variant does not run
+        (see `running_variant`).
+    """
+    running, entry = running_variant(output_dir, model_id, variant)
+    if running != variant:
+        return None
+    return os.path.join(output_dir, entry["file"])
+
+
+def load_compiled_model(output_dir: str, model_id: str, variant: str) -> Optional[torch.jit.ScriptModule]:
+    """
+    Loads a compiled TorchScript variant of a model, if it passed the agreement check.
+
+    Parameters
+    ----------
+    output_dir : str
+        The folder of the compiled models.
+    model_id : str
+        The identifier of the model.
+    variant : str
+        The variant to be loaded, one of `TORCHSCRIPT_VARIANTS`.
+
+    Returns
+    -------
+    torch.jit.ScriptModule or None
+        The compiled model, or `None` if the variant was not compiled or
+        was rejected by the agreement check.
+    """
+    model_path = compiled_model_path(output_dir, model_id, variant)
+    if model_path is None:
+        return None
+    model = optimize(torch.jit.load(model_path, map_location="cpu"), variant)
+    # the weights are not visible as parameters anymore, see `model_size_bytes`
+    model.compiled_size = os.path.getsize(model_path)
+    return model
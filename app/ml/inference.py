@@ -0,0 +1,122 @@
+"""
+Fast CPU inference path shared by the classification code.
+
+The forward pass runs under `torch.inference_mode`, optionally in the
+channels-last memory format, and the top-k results are extracted with
+`torch.topk` instead of sorting all the logits.
+"""
+import logging
+from typing import Optional
+
+import torch
+
+
+def configure_threads(intra_op_threads: Optional[int] = None,
+                      inter_op_threads: Optional[int] = None) -> None:
+    """
+    Sets the number of threads used by torch in this worker process.
+
+    Must be called before the first forward pass, since the inter-op pool
+    cannot be resized once it has started.
+
+    Parameters
+    ----------
+    intra_op_threads : int, optional
+        The number of threads used inside a single operator (default is
+        `None`, keep the torch default).
+    inter_op_threads : int, optional
+        The number of threads used to run independent operators (default is
+        `None`, keep the torch default).
+    """
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logging.warning(f"Could not set inter-op threads: {e}")
+    logging.info(f"Torch threads: intra-op={torch.get_num_threads()}, "
+                 f"inter-op={torch.get_num_interop_threads()}")
+
+
+def prepare_model(model: torch.nn.Module, channels_last: bool = False) -> torch.nn.Module:
+    """
+    Puts a model in evaluation mode and in the requested memory format.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model to be prepared.
+    channels_last : bool, optional
+        Whether to convert the weights to the channels-last memory format
+        (default is `False`).
+
+    Returns
+    -------
+    torch.nn.Module
+        The prepared model.
+    """
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    # compiled TorchScript variants have their memory format fixed when traced
+    if channels_last and not isinstance(model, torch.jit.ScriptModule):
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def forward(model: torch.nn.Module, batch: torch.Tensor, channels_last: bool = False) -> torch.Tensor:
+    """
+    Runs the forward pass without autograd bookkeeping.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model, already prepared with `prepare_model`.
+    batch : torch.Tensor
+        The preprocessed images, with shape (N, 3, H, W).
+    channels_last : bool, optional
+        Whether to feed the batch in the channels-last memory format
+        (default is `False`).
+
+    Returns
+    -------
+    torch.Tensor
+        The logits, with shape (N, number of classes).
+    """
+    if channels_last:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        return model(batch)
+
+
+def top_k(logits: torch.Tensor, k: int = 5, scores: str = "percentages") -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Extracts the k most likely classes of each image.
+
+    The classes are selected on the logits, and only the k selected values
+    are converted to probabilities, normalized with the log-sum-exp of the
+    row instead of a full softmax.
+
+    Parameters
+    ----------
+    logits : torch.Tensor
+        The model output, with shape (N, number of classes).
+    k : int, optional
+        The number of classes to keep (default is 5).
+    scores : str, optional
+        The scores returned: "percentages" (the default), "probabilities"
+        or the raw "logits".
+
+    Returns
+    -------
+    tuple of torch.Tensor
+        The scores and the class indices, both with shape (N, k), sorted by
+        decreasing confidence.
+    """
+    values, indices = torch.topk(logits, k, dim=1)
+    if scores != "logits":
+        values = torch.exp(values - torch.logsumexp(logits, dim=1, keepdim=True))
+        if scores == "percentages":
+            values = values * 100
+    return values, indices
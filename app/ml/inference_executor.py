@@ -0,0 +1,174 @@
+"""
+Bounded execution layer for the CPU-heavy image editing and classification work.
+
+The work is offloaded from the asyncio event loop to a thread or process
+pool. Admission control rejects new work when the pool and its queue are
+full, and every submitted call is bounded by a timeout.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the executor cannot accept more work."""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when a submitted call does not complete in time."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking callables in a bounded pool without blocking the event loop.
+
+    At most `max_workers + max_queue` calls can be pending at the same time;
+    a slot is released only when the underlying call actually finishes, so
+    timed out calls still count against the limit while they run.
+
+    Attributes
+    ----------
+    kind : str
+        The pool type, either "thread" or "process".
+    max_workers : int
+        The number of workers of the pool.
+    max_queue : int
+        The number of calls that may wait for a free worker.
+    timeout : float
+        The maximum number of seconds to wait for a call.
+    """
+
+    def __init__(self,
+                 kind: str = "thread",
+                 max_workers: int = 2,
+                 max_queue: int = 8,
+                 timeout: float = 30.0) -> None:
+        """
+        Initializes the executor. The pool is created on first use.
+
+        Parameters
+        ----------
+        kind : str, optional
+            The pool type, either "thread" or "process" (default is "thread").
+        max_workers : int, optional
+            The number of workers of the pool (default is 2).
+        max_queue : int, optional
+            The number of calls that may wait for a free worker (default is 8).
+        timeout : float, optional
+            The maximum number of seconds to wait for a call (default is 30).
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool: Executor | None = None
+        self._pending = 0
+        self._futures: set[Future] = set()
+
+    @property
+    def pending(self) -> int:
+        """
+        Returns the number of calls that are running or waiting for a worker.
+
+        Returns
+        -------
+        int
+            The number of pending calls.
+        """
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        """
+        Returns the number of calls being run by a worker.
+
+        Returns
+        -------
+        int
+            The number of running calls.
+        """
+        return sum(future.running() for future in list(self._futures))
+
+    def _get_pool(self) -> Executor:
+        """
+        Returns the underlying pool, creating it if needed.
+
+        Returns
+        -------
+        Executor
+            The thread or process pool.
+        """
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="inference")
+        return self._pool
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs `func(*args, **kwargs)` in the pool and waits for its result.
+
+        Parameters
+        ----------
+        func : Callable
+            The blocking callable to run. With a process pool it must be picklable.
+        *args : Any
+            Positional arguments for `func`.
+        **kwargs : Any
+            Keyword arguments for `func`.
+
+        Returns
+        -------
+        Any
+            The value returned by `func`.
+
+        Raises
+        ------
+        InferenceQueueFullError
+            If the pool and its queue are full.
+        InferenceTimeoutError
+            If the call does not complete within `timeout` seconds.
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            raise InferenceQueueFullError("Inference queue is full.")
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if self.kind == "thread":
+            # keep the context variables of the request, e.g. its metrics endpoint
+            call = functools.partial(contextvars.copy_context().run, call)
+        future = self._get_pool().submit(call)
+        self._pending += 1
+        self._futures.add(future)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError(f"Inference did not complete in {self.timeout} seconds.")
+
+    def _release(self, future: Future) -> None:
+        """
+        Frees the slot of a finished call.
+
+        Parameters
+        ----------
+        future : Future
+            The future of the finished call.
+        """
+        self._pending -= 1
+        self._futures.discard(future)
+
+    def shutdown(self) -> None:
+        """
+        Shuts down the pool, cancelling the calls that did not start yet.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
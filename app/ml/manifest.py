@@ -0,0 +1,77 @@
+"""
+Manifest of the compiled model variants.
+
+The manifest is written by `app.ml.compilation` and read both when the
+models are loaded and when the result cache keys are built, which happens
+before the ML stack is imported. This module therefore does not import
+torch, and is the only place deciding which variant of a model runs.
+"""
+import importlib.util
+import json
+import logging
+import os
+from typing import Optional
+
+TORCHSCRIPT_VARIANTS = ("torchscript", "dynamic_int8", "static_int8")
+VARIANTS = TORCHSCRIPT_VARIANTS + ("onnx",)
+MANIFEST_NAME = "manifest.json"
+
+
+def read_manifest(output_dir: str) -> dict:
+    """
+    Reads the manifest of the compiled models.
+
+    Parameters
+    ----------
+    output_dir : str
+        The folder of the compiled models.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each model to the manifest entries of its
+        variants, empty if nothing was compiled.
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def running_variant(output_dir: str, model_id: str, variant: str) -> tuple[str, Optional[dict]]:
+    """
+    Resolves the variant a model actually runs.
+
+    A compiled variant runs only if it was compiled, passed the agreement
+    check and, for "onnx", ONNX Runtime is installed. Otherwise the eager
+    model runs.
+
+    Parameters
+    ----------
+    output_dir : str
+        The folder of the compiled models.
+    model_id : str
+        The identifier of the model.
+    variant : str
+        The configured variant, "eager" or one of `VARIANTS`.
+
+    Returns
+    -------
+    tuple of (str, dict or None)
+        The variant that runs and its manifest entry, `None` for "eager".
+    """
+    if variant not in VARIANTS:
+        return "eager", None
+    entry = read_manifest(output_dir).get(model_id, {}).get(variant)
+    if entry is None:
+        logging.warning(f"No {variant} variant of {model_id} in {output_dir}, run prepare_models.py")
+        return "eager", None
+    if not entry["accepted"]:
+        logging.warning(f"The {variant} variant of {model_id} failed the agreement check "
+                        f"({entry['top5_agreement']:.3f})")
+        return "eager", None
+    if variant == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+        logging.warning("ONNX Runtime is not installed")
+        return "eager", None
+    return variant, entry
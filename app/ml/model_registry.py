@@ -0,0 +1,190 @@
+"""
+Process-wide registry of the classification models.
+
+Models are loaded once, wrapped in their inference backend and reused by
+every request. When the configured memory budget is exceeded, the least
+recently used models are evicted.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+import torch
+
+from app.config import Configuration
+from app.metrics import stage_timer
+from app.ml.backends import ClassifierBackend
+
+conf = Configuration()
+
+
+class ModelRegistry:
+    """
+    Keeps the loaded models resident in memory with LRU eviction.
+
+    Attributes
+    ----------
+    loader : Callable[[str], ClassifierBackend]
+        The function used to build the backend of a model from its identifier.
+    memory_budget : int or None
+        The maximum memory (in bytes) the resident models may use,
+        or `None` to never evict.
+    """
+
+    def __init__(self,
+                 loader: Callable[[str], ClassifierBackend],
+                 memory_budget_mb: Optional[int] = None) -> None:
+        """
+        Initializes an empty registry.
+
+        Parameters
+        ----------
+        loader : Callable[[str], ClassifierBackend]
+            The function used to build the backend of a model from its identifier.
+        memory_budget_mb : int, optional
+            The memory budget in MB (default is `None`, no eviction).
+        """
+        self.loader = loader
+        self.memory_budget: Optional[int] = (
+            memory_budget_mb * 1024 * 1024 if memory_budget_mb is not None else None
+        )
+        self._models: "OrderedDict[str, ClassifierBackend]" = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+        # held while a model loads, so that the resident models stay available
+        self._load_locks: dict[str, threading.Lock] = {}
+
+    def get(self, model_id: str) -> ClassifierBackend:
+        """
+        Returns the resident model, loading it on first use.
+
+        Concurrent requests for a model being loaded wait for that load,
+        while the resident models remain available meanwhile.
+
+        Parameters
+        ----------
+        model_id : str
+            The identifier of the model (must be in `conf.models`).
+
+        Returns
+        -------
+        ClassifierBackend
+            The backend running the model.
+        """
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+                return model
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_id)
+                if model is not None:
+                    # loaded by another thread meanwhile
+                    self._models.move_to_end(model_id)
+                    return model
+
+            with stage_timer("model_load", model_id):
+                model = self.loader(model_id)
+            if model is None:
+                raise ImportError(f"Model {model_id} could not be loaded.")
+
+            size = model.size_bytes()
+            with self._lock:
+                self._evict_for(size)
+                self._models[model_id] = model
+                self._sizes[model_id] = size
+            logging.info(f"Model {model_id} loaded on {model.name} ({size / 2 ** 20:.1f} MB)")
+            return model
+
+    def preload(self, model_ids: Iterable[str]) -> None:
+        """
+        Loads the given models without running them.
+
+        Used by the pre-fork launcher: the weights are loaded once in the
+        parent process and shared copy-on-write by the forked workers, which
+        must run the first forward pass themselves, since the torch thread
+        pools do not survive a fork.
+
+        Parameters
+        ----------
+        model_ids : Iterable[str]
+            The identifiers of the models to be loaded.
+        """
+        for model_id in model_ids:
+            self.get(model_id)
+
+    def warm_up(self, model_ids: Iterable[str], input_sizes: Optional[dict] = None) -> None:
+        """
+        Loads the given models and runs a dummy forward pass on each of them.
+
+        Parameters
+        ----------
+        model_ids : Iterable[str]
+            The identifiers of the models to be warmed up.
+        input_sizes : dict, optional
+            The input size of the models not taking 224x224 images (default
+            is `None`, all the models take 224x224 images).
+        """
+        input_sizes = input_sizes or {}
+        for model_id in model_ids:
+            model = self.get(model_id)
+            size = input_sizes.get(model_id, 224)
+            model.predict(torch.zeros(1, 3, size, size))
+            logging.info(f"Model {model_id} warmed up")
+
+    def evict(self, model_id: str) -> None:
+        """
+        Removes a model from the registry, if present.
+
+        Parameters
+        ----------
+        model_id : str
+            The identifier of the model to be evicted.
+        """
+        with self._lock:
+            if self._models.pop(model_id, None) is not None:
+                self._sizes.pop(model_id, None)
+                logging.info(f"Model {model_id} evicted")
+
+    def loaded_models(self) -> list[str]:
+        """
+        Returns the identifiers of the resident models, least recently used first.
+
+        Returns
+        -------
+        list of str
+            The identifiers of the loaded models.
+        """
+        with self._lock:
+            return list(self._models)
+
+    def memory_usage(self) -> int:
+        """
+        Returns the memory used by the resident models.
+
+        Returns
+        -------
+        int
+            The total size of the loaded models in bytes.
+        """
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def _evict_for(self, size: int) -> None:
+        """
+        Evicts least recently used models until `size` more bytes fit in the budget.
+
+        Parameters
+        ----------
+        size : int
+            The size in bytes of the model about to be added.
+        """
+        if self.memory_budget is None:
+            return
+        while self._models and self.memory_usage() + size > self.memory_budget:
+            oldest = next(iter(self._models))
+            self.evict(oldest)
@@ -0,0 +1,397 @@
+"""
+Content-addressed cache of classification results.
+
+Results are keyed on a hash of the source image bytes, the model and the
+variant it runs, the enhancement values and the settings that change the
+result, so identical requests skip editing and classification entirely.
+A size-bounded LRU lives in memory, and an optional on-disk tier, bounded
+by its own number of entries, keeps the results across restarts.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import Configuration
+from app.ml.manifest import running_variant
+
+conf = Configuration()
+
+
+class ResultCache:
+    """
+    Two-tier (memory and disk) cache of classification results.
+
+    Attributes
+    ----------
+    max_entries : int
+        The maximum number of results kept in memory.
+    disk_path : str or None
+        The folder of the on-disk tier, or `None` to keep results in memory only.
+    disk_max_entries : int or None
+        The maximum number of results kept on disk, or `None` for no limit.
+    hits : int
+        The number of lookups answered from memory.
+    disk_hits : int
+        The number of lookups answered from disk.
+    misses : int
+        The number of lookups that found nothing.
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 disk_path: Optional[str] = None,
+                 disk_max_entries: Optional[int] = None) -> None:
+        """
+        Initializes an empty cache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of results kept in memory (default is 1024).
+        disk_path : str, optional
+            The folder of the on-disk tier (default is `None`, memory only).
+        disk_max_entries : int, optional
+            The maximum number of results kept on disk (default is `None`,
+            no limit).
+        """
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        # counted by the first trim, in the background
+        self._disk_entries: Optional[int] = None
+        self._trimming = False
+
+    @staticmethod
+    def make_key(image_bytes: bytes,
+                 model_id: str,
+                 color_value: int,
+                 brightness_value: int,
+                 contrast_value: int,
+                 sharpness_value: int,
+                 settings: str = "") -> str:
+        """
+        Builds the cache key of a classification request.
+
+        Parameters
+        ----------
+        image_bytes : bytes
+            The content of the source (unedited) image.
+        model_id : str
+            The identifier of the model.
+        color_value : int
+            The color adjustment value (-100 to 100).
+        brightness_value : int
+            The brightness adjustment value (-100 to 100).
+        contrast_value : int
+            The contrast adjustment value (-100 to 100).
+        sharpness_value : int
+            The sharpness adjustment value (-100 to 100).
+        settings : str, optional
+            The configuration settings that change the result of the
+            request, e.g. the enhancement engine (default is "", none).
+
+        Returns
+        -------
+        str
+            The hexadecimal key.
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(
+            f"|{model_id}|{color_value}|{brightness_value}|{contrast_value}|{sharpness_value}|{settings}".encode()
+        )
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[list]:
+        """
+        Looks up a result, promoting disk hits to memory.
+
+        Parameters
+        ----------
+        key : str
+            The key built with `make_key`.
+
+        Returns
+        -------
+        list or None
+            The cached classification scores, or `None` on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        scores = self._read_disk(key)
+        with self._lock:
+            if scores is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store_memory(key, scores)
+            return scores
+
+    def put(self, key: str, scores: list) -> None:
+        """
+        Stores a result in memory and, if enabled, on disk.
+
+        Parameters
+        ----------
+        key : str
+            The key built with `make_key`.
+        scores : list
+            The classification scores to be cached.
+        """
+        scores = [list(score) for score in scores]
+        with self._lock:
+            self._store_memory(key, scores)
+        self._write_disk(key, scores)
+
+    def stats(self) -> dict:
+        """
+        Reports the cache counters.
+
+        Returns
+        -------
+        dict
+            The number of memory hits, disk hits and misses, the hit rate and
+            the number of results currently held in memory.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": self.disk_path is not None,
+            }
+
+    def _store_memory(self, key: str, scores: list) -> None:
+        """
+        Inserts a result in the in-memory LRU. The caller must hold the lock.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        scores : list
+            The classification scores.
+        """
+        self._entries[key] = scores
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_file(self, key: str) -> str:
+        """
+        Returns the path of the on-disk entry of a key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+
+        Returns
+        -------
+        str
+            The path of the JSON file holding the entry.
+        """
+        return os.path.join(self.disk_path, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[list]:
+        """
+        Reads a result from the on-disk tier.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+
+        Returns
+        -------
+        list or None
+            The cached scores, or `None` if missing, unreadable or disabled.
+        """
+        if not self.disk_path:
+            return None
+        try:
+            with open(self._disk_file(key)) as f:
+                scores = json.load(f)
+            # the oldest entries are evicted first, see `_trim_disk`
+            os.utime(self._disk_file(key))
+            return scores
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Unreadable cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, scores: list) -> None:
+        """
+        Atomically writes a result to the on-disk tier.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        scores : list
+            The classification scores.
+        """
+        if not self.disk_path:
+            return
+        try:
+            os.makedirs(self.disk_path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(scores, f)
+            os.replace(tmp_path, self._disk_file(key))
+        except OSError as e:
+            logging.warning(f"Could not write cache entry {key}: {e}")
+            return
+        if self.disk_max_entries is None:
+            return
+        with self._lock:
+            if self._disk_entries is not None:
+                self._disk_entries += 1
+            over = self._disk_entries is None or self._disk_entries > self.disk_max_entries
+            trim = over and not self._trimming
+            self._trimming = self._trimming or trim
+        if trim:
+            # listing the folder is too slow for the request writing the entry
+            threading.Thread(target=self._trim_disk, name="result-cache-trim", daemon=True).start()
+
+    def _list_disk(self) -> list[os.DirEntry]:
+        """
+        Lists the entries of the on-disk tier.
+
+        Returns
+        -------
+        list of os.DirEntry
+            The JSON files of the entries.
+        """
+        return [entry for entry in os.scandir(self.disk_path) if entry.name.endswith(".json")]
+
+    def _trim_disk(self) -> None:
+        """
+        Deletes the least recently used entries of the on-disk tier.
+
+        The entries are counted again, since other processes share the
+        folder. Above `disk_max_entries`, the oldest ones are deleted down to
+        90% of it, so that the folder is not listed at every write.
+        """
+        try:
+            entries = []
+            for entry in self._list_disk():
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+            evicted = []
+            if len(entries) > self.disk_max_entries:
+                entries.sort()
+                evicted = entries[:len(entries) - int(self.disk_max_entries * 0.9)]
+            for _, path in evicted:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"Could not delete cache entry {path}: {e}")
+            with self._lock:
+                self._disk_entries = len(entries) - len(evicted)
+            if evicted:
+                logging.info(f"Result cache evicted {len(evicted)} entries from disk")
+        except OSError as e:
+            logging.warning(f"Could not trim the result cache: {e}")
+        finally:
+            with self._lock:
+                self._trimming = False
+
+
+def cache_folder(cache_dir: Optional[str], result_scores: str, top_k: int) -> Optional[str]:
+    """
+    Returns the folder of the on-disk tier for a format of the results.
+
+    Results formatted with other payload settings must not be served, so
+    each format has its own folder.
+
+    Parameters
+    ----------
+    cache_dir : str or None
+        The root folder of the on-disk tier, or `None` if disabled.
+    result_scores : str
+        The kind of scores of the results (see `Configuration.result_scores`).
+    top_k : int
+        The number of classes of the results.
+
+    Returns
+    -------
+    str or None
+        The folder of the on-disk tier, or `None` if disabled.
+    """
+    return os.path.join(cache_dir, f"{result_scores}-top{top_k}") if cache_dir else None
+
+
+@functools.lru_cache(maxsize=None)
+def model_variant(model_id: str) -> str:
+    """
+    Describes the variant a model runs, which its results depend on.
+
+    The variant is resolved by `running_variant`, as `get_backend` does,
+    once per process, like the backends of the model registry.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+
+    Returns
+    -------
+    str
+        The variant, its manifest entry with the modification time of the
+        compiled file, and the input size of the model.
+    """
+    configured = conf.model_backends.get(model_id, "eager")
+    variant, entry = running_variant(conf.compiled_models_path, model_id, configured)
+    if entry is not None:
+        try:
+            entry = dict(entry, mtime=os.path.getmtime(os.path.join(conf.compiled_models_path, entry["file"])))
+        except OSError:
+            entry = dict(entry, mtime=None)
+    return json.dumps({"backend": variant, "entry": entry, "input_size": conf.input_sizes.get(model_id, 224)},
+                      sort_keys=True)
+
+
+def open_result_cache(max_entries: int) -> ResultCache:
+    """
+    Opens the result cache with the settings of the configuration.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of results kept in memory.
+
+    Returns
+    -------
+    ResultCache
+        The cache, with its on-disk tier in the folder of the configured
+        format of the results.
+    """
+    return ResultCache(
+        max_entries,
+        cache_folder(conf.result_cache_dir, conf.result_scores, conf.result_top_k),
+        conf.result_cache_disk_max_entries,
+    )
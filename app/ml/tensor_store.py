@@ -0,0 +1,124 @@
+"""
+Memory-mapped store of the preprocessed dataset images.
+
+The store is made of two files written by `app/prepare_tensors.py`: a
+`.npy` array of uint8 224x224 RGB crops, and a `.json` index mapping each
+filename to its row. The same layout stores the precomputed color
+histograms of the dataset, one (3, 256) row per image. The array is
+memory-mapped on first use, so opening the store is cheap and only the
+crops actually requested are paged in.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class TensorStore:
+    """
+    Read-only, lazily memory-mapped access to the preprocessed crops.
+
+    Attributes
+    ----------
+    path : str
+        The path of the store, without the `.npy` and `.json` extensions.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the store. Nothing is read until the first lookup.
+
+        Parameters
+        ----------
+        path : str
+            The path of the store, without the `.npy` and `.json` extensions.
+        """
+        self.path = path
+        self._array: Optional[np.ndarray] = None
+        self._index: Optional[dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        """
+        Loads the index and memory-maps the crops, if the store exists.
+        """
+        with self._lock:
+            if self._index is not None:
+                return
+            try:
+                with open(f"{self.path}.json") as f:
+                    index = json.load(f)
+                # copy-on-write mapping: pages are shared with the file and the
+                # array is writable, so torch can wrap it without warnings
+                self._array = np.load(f"{self.path}.npy", mmap_mode="c")
+            except FileNotFoundError:
+                logging.info(f"No preprocessed store at {self.path}, decoding images on demand")
+                index = {}
+            self._index = index
+
+    def __contains__(self, filename: str) -> bool:
+        self._open()
+        return filename in self._index
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._index)
+
+    def get(self, filename: str) -> Optional[np.ndarray]:
+        """
+        Returns the row of a dataset image, e.g. its preprocessed crop.
+
+        Parameters
+        ----------
+        filename : str
+            The filename of the dataset image.
+
+        Returns
+        -------
+        np.ndarray or None
+            A view of the row (in the crop store, the uint8 crop with shape
+            (224, 224, 3)), or `None` if the image is not in the store.
+        """
+        self._open()
+        row = self._index.get(filename)
+        if row is None:
+            return None
+        return self._array[row]
+
+
+def write_tensor_store(path: str,
+                       filenames: list[str],
+                       load_crop: Callable[[str], np.ndarray],
+                       shape: tuple = (224, 224, 3),
+                       dtype: np.dtype = np.uint8) -> None:
+    """
+    Writes a store, one crop at a time.
+
+    Parameters
+    ----------
+    path : str
+        The path of the store, without the `.npy` and `.json` extensions.
+    filenames : list of str
+        The filenames of the images to be stored.
+    load_crop : Callable[[str], np.ndarray]
+        The function returning the row of a filename, by default its uint8
+        crop with shape (224, 224, 3).
+    shape : tuple, optional
+        The shape of a row (default is (224, 224, 3)).
+    dtype : np.dtype, optional
+        The type of the rows (default is `np.uint8`).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    array = np.lib.format.open_memmap(
+        f"{path}.npy", mode="w+", dtype=dtype, shape=(len(filenames), *shape)
+    )
+    for row, filename in enumerate(filenames):
+        array[row] = load_crop(filename)
+    array.flush()
+    del array
+
+    with open(f"{path}.json", "w") as f:
+        json.dump({filename: row for row, filename in enumerate(filenames)}, f)
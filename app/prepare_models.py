@@ -1,7 +1,13 @@
 import importlib
 import logging
+import os
+import random
+
+import torch
 
 from .config import Configuration
+from .ml.classification_utils import input_size, preprocess_dataset_image
+from .ml.compilation import compile_model, read_manifest, write_manifest
 
 conf = Configuration()
 
@@ -30,5 +36,50 @@ def prepare_models():
             logging.error("Model {} not found".format(model_name))
 
 
+def compile_models():
+    """
+    Compiles the configured models into faster CPU variants.
+
+    For every model, the variants listed in `conf.compiled_variants`
+    (TorchScript and int8-quantized) are written to
+    `conf.compiled_models_path`. Static quantization is calibrated on
+    `conf.calibration_images` dataset images, and every variant is compared
+    with the fp32 model on `conf.agreement_images` other images: the
+    variants sharing less than `conf.min_top5_agreement` of the top-5
+    classes are recorded as rejected in the manifest and never loaded.
+    Select the variant run by each model with `conf.model_backends`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the image folder does not exist. Run `prepare_images.py` first.
+    """
+    filenames = sorted(f for f in os.listdir(conf.image_folder_path) if f.endswith(".JPEG"))
+    random.Random(0).shuffle(filenames)
+    calibration_files = filenames[:conf.calibration_images]
+    agreement_files = filenames[conf.calibration_images:conf.calibration_images + conf.agreement_images]
+
+    def load_images(files: list, size: int) -> torch.Tensor:
+        return torch.stack([preprocess_dataset_image(f, [size])[size] for f in files])
+
+    manifest = read_manifest(conf.compiled_models_path)
+    for model_name in conf.models:
+        module = importlib.import_module("torchvision.models")
+        model = module.__getattribute__(model_name)(weights="DEFAULT").eval()
+        size = input_size(model_name)
+        manifest[model_name] = compile_model(
+            model_name,
+            model,
+            load_images(calibration_files, size),
+            load_images(agreement_files, size),
+            conf.compiled_models_path,
+            variants=conf.compiled_variants,
+            min_agreement=conf.min_top5_agreement,
+        )
+        write_manifest(conf.compiled_models_path, manifest)
+        del model  # free up memory
+
+
 if __name__ == "__main__":
     prepare_models()
+    compile_models()
@@ -0,0 +1,70 @@
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+from .config import Configuration
+from .histograms import HISTOGRAM_SHAPE, compute_histogram
+from .ml.classification_utils import crop_image
+from .ml.tensor_store import write_tensor_store
+
+conf = Configuration()
+
+
+def prepare_tensors():
+    """
+    Preprocesses the ImageNet subset into a memory-mapped tensor store.
+
+    This function resizes and center-crops every image of the configured image
+    folder to the 224x224 input of the models and writes the uint8 crops to a
+    single `.npy` file, together with a `.json` index by filename. The
+    classifier then reads unedited dataset images from the store instead of
+    decoding them. Run it again whenever the dataset changes.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the image folder does not exist. Run `prepare_images.py` first.
+    """
+    img_folder = conf.image_folder_path
+    filenames = sorted(f for f in os.listdir(img_folder) if f.endswith(".JPEG"))
+
+    def load_crop(filename: str) -> np.ndarray:
+        with Image.open(os.path.join(img_folder, filename)) as img:
+            return np.asarray(crop_image(img))
+
+    write_tensor_store(conf.tensor_store_path, filenames, load_crop)
+    logging.info(f"{len(filenames)} preprocessed images stored in {conf.tensor_store_path}.npy")
+
+
+def prepare_histograms():
+    """
+    Precomputes the color histograms of the ImageNet subset.
+
+    The exact red, green and blue histograms of every image of the
+    configured image folder, at full resolution, are written to a store
+    with the layout of the tensor store, so that `/histogram` serves the
+    unedited dataset images without decoding them. Run it again whenever
+    the dataset changes.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the image folder does not exist. Run `prepare_images.py` first.
+    """
+    img_folder = conf.image_folder_path
+    filenames = sorted(f for f in os.listdir(img_folder) if f.endswith(".JPEG"))
+
+    def load_histogram(filename: str) -> np.ndarray:
+        with Image.open(os.path.join(img_folder, filename)) as img:
+            return compute_histogram(img)
+
+    write_tensor_store(conf.histogram_store_path, filenames, load_histogram,
+                       shape=HISTOGRAM_SHAPE, dtype=np.uint32)
+    logging.info(f"{len(filenames)} histograms stored in {conf.histogram_store_path}.npy")
+
+
+if __name__ == "__main__":
+    prepare_tensors()
+    prepare_histograms()
@@ -0,0 +1,284 @@
+"""
+Background startup of the ML stack, with liveness and readiness reporting.
+
+The web layer does not import torch: the classification module is
+imported, the torch thread pools are sized and the resident models are
+warmed up by a background thread once the app serves requests. The pages,
+`/info` and the static files answer at once; the endpoints that classify
+wait for the ML stack to be imported (see `StartupMonitor.wait_ml`).
+
+The time from the start of the process to the moment the app serves
+(liveness) and to the moment the models are warm (readiness) are measured
+and compared with the budgets of the configuration.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from types import ModuleType
+from typing import Iterable, Optional
+
+IMPORTED_AT = time.monotonic()
+
+ML_MODULE = "app.ml.classification_utils"
+
+STARTING, IMPORTING, WARMING_UP, READY, FAILED = "starting", "importing", "warming_up", "ready", "failed"
+
+
+def process_age() -> float:
+    """
+    Returns the number of seconds since this process started.
+
+    The start time is read from `/proc`, so that the import of the
+    interpreter and of the app are counted. Elsewhere, the time since this
+    module was imported is returned instead.
+
+    Returns
+    -------
+    float
+        The age of the process in seconds.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # the command name may contain spaces, the fields after it do not
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - IMPORTED_AT
+
+
+class StartupMonitor:
+    """
+    Runs the background startup phase and reports its progress.
+
+    Attributes
+    ----------
+    phase : str
+        "starting", "importing", "warming_up", "ready" or "failed".
+    models : dict
+        The state ("pending", "loaded" or "failed") of each model warmed up
+        at startup.
+    timings : dict
+        The measured durations in seconds: "live" (process start to
+        serving), "ml_import", "warm_up" and "ready" (process start to
+        readiness).
+    error : str or None
+        The reason the startup failed, if it did.
+    """
+
+    def __init__(self, live_budget: Optional[float] = None, ready_budget: Optional[float] = None) -> None:
+        """
+        Initializes the monitor before the startup phase.
+
+        Parameters
+        ----------
+        live_budget : float, optional
+            The seconds allowed from process start to serving (default is
+            `None`, no budget).
+        ready_budget : float, optional
+            The seconds allowed from process start to readiness (default is
+            `None`, no budget).
+        """
+        self.live_budget = live_budget
+        self.ready_budget = ready_budget
+        self.phase = STARTING
+        self.models: dict[str, str] = {}
+        self.timings: dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._ml: Future = Future()
+        # the future is only completed by the startup thread, never cancelled by a waiter
+        self._ml.set_running_or_notify_cancel()
+
+    @property
+    def ml(self) -> Optional[ModuleType]:
+        """
+        The classification module, or `None` while it is not imported.
+        """
+        if self._ml.done() and self._ml.exception() is None:
+            return self._ml.result()
+        return None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the models are warm and the app can take traffic.
+        """
+        return self.phase == READY
+
+    def mark_live(self) -> None:
+        """
+        Records that the web layer serves requests.
+        """
+        self.timings["live"] = process_age()
+        self._check_budget("live", self.live_budget)
+
+    def start(self,
+              warm_up_models: Iterable[str],
+              input_sizes: Optional[dict] = None,
+              intra_op_threads: Optional[int] = None,
+              inter_op_threads: Optional[int] = None) -> threading.Thread:
+        """
+        Starts the startup phase in a background thread.
+
+        Parameters
+        ----------
+        warm_up_models : Iterable[str]
+            The models loaded and warmed up before the app is ready.
+        input_sizes : dict, optional
+            The input size of the models not taking 224x224 images.
+        intra_op_threads : int, optional
+            The number of torch intra-op threads.
+        inter_op_threads : int, optional
+            The number of torch inter-op threads.
+
+        Returns
+        -------
+        threading.Thread
+            The thread running the startup phase.
+        """
+        warm_up_models = list(warm_up_models)
+        self.models = dict.fromkeys(warm_up_models, "pending")
+        thread = threading.Thread(
+            target=self._run,
+            args=(warm_up_models, input_sizes, intra_op_threads, inter_op_threads),
+            name="startup",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _run(self,
+             warm_up_models: list[str],
+             input_sizes: Optional[dict],
+             intra_op_threads: Optional[int],
+             inter_op_threads: Optional[int]) -> None:
+        """
+        Imports the ML stack, then loads and warms up the models.
+
+        Parameters
+        ----------
+        warm_up_models : list of str
+            The models loaded and warmed up before the app is ready.
+        input_sizes : dict or None
+            The input size of the models not taking 224x224 images.
+        intra_op_threads : int or None
+            The number of torch intra-op threads.
+        inter_op_threads : int or None
+            The number of torch inter-op threads.
+        """
+        try:
+            self.phase = IMPORTING
+            start = time.perf_counter()
+            module = importlib.import_module(ML_MODULE)
+            from app.ml.inference import configure_threads
+            # sized before the waiting requests run their first forward pass
+            configure_threads(intra_op_threads, inter_op_threads)
+            self.timings["ml_import"] = time.perf_counter() - start
+            self._ml.set_result(module)
+            logging.info(f"ML stack imported in {self.timings['ml_import']:.2f} s")
+        except Exception as e:
+            self._fail(f"Could not import the ML stack: {e}")
+            self._ml.set_exception(e)
+            return
+
+        self.phase = WARMING_UP
+        start = time.perf_counter()
+        for model_id in warm_up_models:
+            try:
+                module.model_registry.warm_up([model_id], input_sizes)
+                self.models[model_id] = "loaded"
+            except Exception as e:
+                # the other models can still serve, but the app is not ready
+                self.models[model_id] = "failed"
+                logging.error(f"Could not warm up {model_id}: {e}")
+        self.timings["warm_up"] = time.perf_counter() - start
+        failed = [model_id for model_id, state in self.models.items() if state == "failed"]
+        if failed:
+            self._fail(f"Could not warm up {', '.join(failed)}")
+            return
+
+        self.timings["ready"] = process_age()
+        self.phase = READY
+        logging.info(f"Ready {self.timings['ready']:.2f} s after the process started")
+        self._check_budget("ready", self.ready_budget)
+
+    def _fail(self, error: str) -> None:
+        """
+        Marks the startup as failed.
+
+        Parameters
+        ----------
+        error : str
+            The reason of the failure.
+        """
+        self.error = error
+        self.phase = FAILED
+        logging.error(error)
+
+    def _check_budget(self, name: str, budget: Optional[float]) -> None:
+        """
+        Warns when a startup milestone took longer than its budget.
+
+        Parameters
+        ----------
+        name : str
+            The milestone, "live" or "ready".
+        budget : float or None
+            The allowed number of seconds, or `None` for no budget.
+        """
+        if budget is not None and self.timings[name] > budget:
+            logging.warning(f"Startup: {name} after {self.timings[name]:.2f} s, "
+                            f"over the budget of {budget:.2f} s")
+
+    async def wait_ml(self, timeout: Optional[float] = None) -> ModuleType:
+        """
+        Waits for the ML stack to be imported, without blocking the event loop.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum number of seconds to wait (default is `None`, no limit).
+
+        Returns
+        -------
+        ModuleType
+            The classification module.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            If the import did not finish in time (an alias of the builtin
+            `TimeoutError` from Python 3.11).
+        Exception
+            The error that made the import fail.
+        """
+        if self._ml.done():
+            return self._ml.result()
+        return await asyncio.wait_for(asyncio.wrap_future(self._ml), timeout)
+
+    def status(self) -> dict:
+        """
+        Describes the progress of the startup.
+
+        Returns
+        -------
+        dict
+            The phase, whether the app is ready, the state of each model,
+            the models currently resident, the measured durations and the
+            budgets, and the error of a failed startup.
+        """
+        ml = self.ml
+        return {
+            "phase": self.phase,
+            "ready": self.ready,
+            "models": dict(self.models),
+            "loaded_models": ml.model_registry.loaded_models() if ml is not None else [],
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "budgets": {"live": self.live_budget, "ready": self.ready_budget},
+            "error": self.error,
+        }
@@ -54,33 +54,30 @@ function downloadClassificationJSON(elementID) {
 /**
  * Downloads histogram data as a JSON file.
  *
- * This function retrieves histogram data from `computeHistogram()`, which analyzes pixel intensities
- * in the red, green, and blue channels. If no histogram data is available, an alert notifies the user.
- * The histogram data is then formatted as JSON and downloaded as a `.json` file.
+ * This function retrieves the histogram computed by the server through `loadHistogram()`, with the
+ * pixel intensity counts of the red, green, and blue channels. If no histogram data is available,
+ * an alert notifies the user. The histogram data is then formatted as JSON and downloaded as a `.json` file.
  *
  * @throws {Error} If no histogram data is available, an alert is displayed.
  */
 function downloadHistogramJSON() {
-    const histogramData = computeHistogram();
+    loadHistogram().then(function (histogramData) {
+        const jsonContent = JSON.stringify({
+            red: histogramData.red,
+            green: histogramData.green,
+            blue: histogramData.blue
+        }, null, 2);
 
-    if (!histogramData) {
-        alert("No histogram data available. Please select an image first.");
-        return;
-    }
-
-    const jsonContent = JSON.stringify({
-        red: histogramData.red,
-        green: histogramData.green,
-        blue: histogramData.blue
-    }, null, 2);
+        const blob = new Blob([jsonContent], {type: "application/json"});
+        const url = URL.createObjectURL(blob);
 
-    const blob = new Blob([jsonContent], {type: "application/json"});
-    const url = URL.createObjectURL(blob);
-
-    const a = document.createElement("a");
-    a.href = url;
-    a.download = "histogram_data.json";
-    document.body.appendChild(a);
-    a.click();
-    document.body.removeChild(a);
+        const a = document.createElement("a");
+        a.href = url;
+        a.download = "histogram_data.json";
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+    }).catch(function () {
+        alert("No histogram data available. Please select an image first.");
+    });
 }
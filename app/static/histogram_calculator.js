@@ -1,74 +1,45 @@
 $(document).ready(function () {
-    var imageElement = document.getElementById("selectedImage");
-
-    if (!imageElement || !imageElement.src) {
-        console.error("No image source found at page load.");
-        return;
-    }
-
-    console.log("Image Source: ", imageElement.src);
-
-    if (imageElement.complete) {
-        processHistogram();
-    } else {
-        imageElement.onload = processHistogram;
-    }
+    loadHistogram().then(function (histogramData) {
+        plotHistogram("histogram_output", histogramData.red, histogramData.green, histogramData.blue);
+    }).catch(function (error) {
+        console.error("Error loading histogram:", error);
+    });
 });
 
-/**
- * Processes and plots the histogram for the loaded image.
- *
- * This function retrieves the histogram data of an image using `computeHistogram()`
- * and then visualizes it using `plotHistogram()`.
- */
-function processHistogram() {
-    var histogramData = computeHistogram();
-    if (histogramData) {
-        plotHistogram("histogram_output", histogramData.red, histogramData.green, histogramData.blue);
-    }
-}
+var histogramPromise = null;
 
 /**
- * Computes the histogram of an image.
+ * Loads the histogram of the displayed image, computed by the server.
  *
- * This function extracts pixel data from an image element, processes it to count the
- * intensity distribution for each color channel (red, green, and blue), and returns
- * the computed histogram data.
+ * The histogram is read from the `histogram` attribute of the 'histogramData' script element when
+ * the server computed it while editing the image, otherwise it is fetched from the URL in its
+ * `histogram_url` attribute. The result is loaded once and shared by the plot and the download.
  *
- * @returns {{red: number[], green: number[], blue: number[]} | null}
- *     An object containing three arrays (`red`, `green`, and `blue`) with pixel intensity counts,
- *     or `null` if no valid image is found.
+ * @returns {Promise<{red: number[], green: number[], blue: number[]}>}
+ *     A promise resolved with three arrays (`red`, `green`, and `blue`) of 256 pixel intensity counts.
  */
-function computeHistogram() {
-    var imageElement = document.getElementById("selectedImage");
-
-    if (!imageElement || !imageElement.src) {
-        console.error("No image loaded.");
-        return null;
+function loadHistogram() {
+    if (histogramPromise) {
+        return histogramPromise;
     }
 
-    var canvas = document.createElement("canvas");
-    var ctx = canvas.getContext("2d");
-
-    canvas.width = imageElement.width;
-    canvas.height = imageElement.height;
-    ctx.drawImage(imageElement, 0, 0, canvas.width, canvas.height);
-    var imageData = ctx.getImageData(0, 0, canvas.width, canvas.height);
-    var data = imageData.data;
+    var script = document.getElementById("histogramData");
+    var histogram = script ? script.getAttribute("histogram") : null;
+    var histogramUrl = script ? script.getAttribute("histogram_url") : null;
 
-    var red = new Array(256).fill(0);
-    var green = new Array(256).fill(0);
-    var blue = new Array(256).fill(0);
-
-    for (var i = 0; i < data.length; i += 4) {
-        red[data[i]]++;
-        green[data[i + 1]]++;
-        blue[data[i + 2]]++;
+    if (histogram) {
+        histogramPromise = Promise.resolve(JSON.parse(histogram));
+    } else if (histogramUrl) {
+        histogramPromise = fetch(histogramUrl).then(function (response) {
+            if (!response.ok) {
+                throw new Error(`Histogram request failed with status ${response.status}`);
+            }
+            return response.json();
+        });
+    } else {
+        histogramPromise = Promise.reject(new Error("No histogram available for this image."));
     }
-
-    console.log("Computed Histogram Data: ", {red, green, blue});
-
-    return {red, green, blue};
+    return histogramPromise;
 }
 
 /**
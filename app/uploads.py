@@ -0,0 +1,135 @@
+"""
+Validation and storage of the uploaded images.
+
+Kept apart from the classification code, so that the web layer can store
+uploads without importing the ML stack.
+"""
+import os
+from typing import Optional
+
+from fastapi import UploadFile
+from PIL import Image, ImageFile
+
+from app.config import Configuration
+from app.utils import UPLOAD_PREFIX, atomic_write, new_artifact_id
+
+conf = Configuration()
+
+
+class UploadRejectedError(Exception):
+    """
+    Raised when an upload is refused before being stored.
+
+    Attributes
+    ----------
+    status_code : int
+        The HTTP status code describing the rejection.
+    """
+    status_code = 400
+
+
+class UploadTooLargeError(UploadRejectedError):
+    """Raised when an upload exceeds the configured size or dimensions."""
+    status_code = 413
+
+
+class UnsupportedImageError(UploadRejectedError):
+    """Raised when an upload is not a JPEG or PNG image."""
+    status_code = 415
+
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = {b"\xff\xd8\xff": ".jpg", b"\x89PNG\r\n\x1a\n": ".png"}
+
+
+def check_image_header(image: Image.Image) -> None:
+    """
+    Validates the format and dimensions parsed from an image header.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image whose header has been parsed. Its pixels are not needed.
+
+    Raises
+    ------
+    UnsupportedImageError
+        If the image is not a JPEG or PNG.
+    UploadTooLargeError
+        If the image has more than `conf.max_upload_pixels` pixels.
+    """
+    if image.format not in ("JPEG", "PNG"):
+        raise UnsupportedImageError(f"Unsupported image format: {image.format}")
+    width, height = image.size
+    if width * height > conf.max_upload_pixels:
+        raise UploadTooLargeError(
+            f"Image is {width}x{height}, above the limit of {conf.max_upload_pixels} pixels."
+        )
+
+
+def store_uploaded_image(file: UploadFile) -> str:
+    """
+    Saves an uploaded image to the designated upload folder under a unique identifier.
+
+    The upload is streamed to disk in chunks, so it is never held in memory
+    as a whole. The format and dimensions are validated from the header as
+    soon as the first chunks arrive, and the upload is rejected as soon as
+    it exceeds `conf.max_upload_size_mb`. The extension of the stored file
+    follows the format detected from the content, not the name given by the
+    client.
+
+    Parameters
+    ----------
+    file : UploadFile
+        The uploaded file containing the image data.
+
+    Returns
+    -------
+    str
+        The artifact identifier (filename) of the saved image.
+
+    Raises
+    ------
+    UploadTooLargeError
+        If the upload is too large, in bytes or in pixels.
+    UnsupportedImageError
+        If the upload is not a JPEG or PNG image.
+    """
+    chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+    extension = next((ext for signature, ext in IMAGE_SIGNATURES.items() if chunk.startswith(signature)), None)
+    if extension is None:
+        raise UnsupportedImageError("The uploaded file is not a JPEG or PNG image.")
+
+    upload_dir = conf.upload_folder_path
+    os.makedirs(upload_dir, exist_ok=True)
+    filename = new_artifact_id(UPLOAD_PREFIX, extension)
+    file_path = os.path.join(upload_dir, filename)
+
+    max_bytes = conf.max_upload_size_mb * 1024 * 1024
+    parser: Optional[ImageFile.Parser] = ImageFile.Parser()
+    received = 0
+
+    with atomic_write(file_path) as f:
+        while chunk:
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLargeError(
+                    f"Upload exceeds the limit of {conf.max_upload_size_mb} MB."
+                )
+
+            if parser is not None:
+                try:
+                    parser.feed(chunk)
+                except (OSError, SyntaxError) as e:
+                    raise UnsupportedImageError(f"Invalid image header: {e}")
+                if parser.image is not None:
+                    check_image_header(parser.image)
+                    parser = None  # header validated, stop parsing
+
+            f.write(chunk)
+            chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+
+        if parser is not None:
+            raise UnsupportedImageError("The uploaded file is not a valid image.")
+
+    return filename
@@ -1,30 +1,18 @@
+import math
 import os
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Optional
 
+from app import enhancement
 from app.config import Configuration
+from app.metrics import stage_timer
 from PIL import Image, ImageEnhance
-import asyncio
 
 conf = Configuration()
 
 
-def list_images():
-    """
-    Returns the list of available images in the configured image folder.
-
-    This function filters and retrieves all image filenames with a `.JPEG` extension
-    from the image folder specified in the configuration.
-
-    Returns
-    -------
-    list of str
-        A list of image filenames with the `.JPEG` extension.
-    """
-    img_names = filter(
-        lambda x: x.endswith(".JPEG"), os.listdir(conf.image_folder_path)
-    )
-    return list(img_names)
-
-
 def scale_values(value: int) -> float:
     """
     Scales a given integer value from the range [-100, 100] to the range [0, 2].
@@ -45,23 +33,53 @@ def scale_values(value: int) -> float:
     return (value + 100) / 100
 
 
-def edit_image(original_image_path: str,
-               color_value: int,
-               brightness_value: int,
-               contrast_value: int,
-               sharpness_value: int,
-               edited_image_path: str) -> None:
+def open_image(image_path: str, working_size: Optional[int] = None) -> Image.Image:
     """
-    Applies image enhancements based on user-selected values and saves the edited image.
+    Opens an image, optionally downscaling it while decoding.
 
-    This function modifies the original image using Pillow's enhancement functions
-    for color, brightness, contrast, and sharpness, based on scaled values obtained
-    from a form input. The edited image is saved at the specified path.
+    When `working_size` is given and the shorter side of the image is larger,
+    the image is reduced so that its shorter side is about `working_size`
+    pixels. JPEG images are decoded directly at a reduced scale (draft mode),
+    so the full-resolution pixels are never materialized.
 
     Parameters
     ----------
-    original_image_path : str
-        The file path of the original image.
+    image_path : str
+        The file path of the image.
+    working_size : int, optional
+        The target length of the shorter side (default is `None`, keep the
+        original resolution).
+
+    Returns
+    -------
+    Image.Image
+        The loaded image. Unlike `Image.open`, the file is already closed.
+    """
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if working_size and min(width, height) > working_size:
+            scale = working_size / min(width, height)
+            image.thumbnail((math.ceil(width * scale), math.ceil(height * scale)))
+        image.load()
+    return image
+
+
+def enhance_image(image: Image.Image,
+                  color_value: int,
+                  brightness_value: int,
+                  contrast_value: int,
+                  sharpness_value: int) -> Image.Image:
+    """
+    Applies the color, brightness, contrast and sharpness enhancements to an image.
+
+    Depending on `Configuration.enhancement_engine`, the enhancements are either
+    chained with Pillow's `ImageEnhance` or fused in a single vectorized pass by
+    `app.enhancement`.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image to be enhanced. It is not modified.
     color_value : int
         The color enhancement factor, ranging from -100 to 100.
     brightness_value : int
@@ -70,17 +88,17 @@ def edit_image(original_image_path: str,
         The contrast enhancement factor, ranging from -100 to 100.
     sharpness_value : int
         The sharpness enhancement factor, ranging from -100 to 100.
-    edited_image_path : str, optional
-        The file path where the edited image will be saved (default is
-        "app/static/imagenet_subset/edited.jpeg").
 
     Returns
     -------
-    None
-        The function modifies and saves the edited image but does not return a value.
+    Image.Image
+        The enhanced RGB image.
     """
-    original_image = Image.open(original_image_path)
-    edited_image = original_image.copy()
+    if conf.enhancement_engine == "numpy":
+        return enhancement.enhance_image(image, color_value, brightness_value,
+                                         contrast_value, sharpness_value)
+
+    edited_image = image.copy()
 
     if edited_image.mode != "RGB":
         edited_image = edited_image.convert("RGB")
@@ -89,58 +107,123 @@ def edit_image(original_image_path: str,
     edited_image = ImageEnhance.Brightness(edited_image).enhance(scale_values(brightness_value))
     edited_image = ImageEnhance.Contrast(edited_image).enhance(scale_values(contrast_value))
     edited_image = ImageEnhance.Sharpness(edited_image).enhance(scale_values(sharpness_value))
+    return edited_image
 
-    edited_image.save(edited_image_path, format="JPEG")
 
+def render_edited_image(original_image_path: str,
+                        color_value: int,
+                        brightness_value: int,
+                        contrast_value: int,
+                        sharpness_value: int,
+                        working_size: Optional[int] = None) -> bytes:
+    """
+    Applies image enhancements and returns the edited image encoded as JPEG.
 
-async def remove_file_after_time(file_path: str) -> None:
+    Parameters
+    ----------
+    original_image_path : str
+        The file path of the original image.
+    color_value : int
+        The color enhancement factor, ranging from -100 to 100.
+    brightness_value : int
+        The brightness enhancement factor, ranging from -100 to 100.
+    contrast_value : int
+        The contrast enhancement factor, ranging from -100 to 100.
+    sharpness_value : int
+        The sharpness enhancement factor, ranging from -100 to 100.
+    working_size : int, optional
+        The length the shorter side is reduced to before editing (default is
+        `None`, keep the original resolution). See `open_image`.
+
+    Returns
+    -------
+    bytes
+        The JPEG-encoded edited image.
     """
-        Deletes a specified file after a delay of 2 minutes.
+    with stage_timer("edit"):
+        original_image = open_image(original_image_path, working_size)
+        edited_image = enhance_image(original_image, color_value, brightness_value,
+                                     contrast_value, sharpness_value)
 
-        This function waits for 10 seconds before checking if the file
-        exists at the given path. If the file is found, it is removed from
-        the filesystem.
+    with stage_timer("encode"):
+        buffer = BytesIO()
+        edited_image.save(buffer, format="JPEG")
+    return buffer.getvalue()
 
-        Parameters
-        ----------
-        file_path : str
-            The absolute or relative path of the file to be deleted.
 
-        Notes
-        -----
-        - This function is typically used as a background task in FastAPI.
-        - If the file is already deleted before this function executes, no action is taken.
-        - The delay is implemented using `asyncio.sleep(10)`, which blocks execution within this function.
+UPLOAD_PREFIX = "upload-"
+EDITED_PREFIX = "edited-"
 
-        """
-    await  asyncio.sleep(10)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        print(f"{file_path} deleted")
+# Crockford's base32 alphabet, used by ULIDs
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
 
 
-def get_filename(image_path: str, filename: str) -> str:
+def generate_ulid() -> str:
     """
-    Generates a unique filename by appending a counter if a file with the same name already exists.
+    Generates a ULID: a 48-bit millisecond timestamp followed by 80 random bits.
+
+    ULIDs are unique without any coordination and sort by creation time.
+
+    Returns
+    -------
+    str
+        The 26-character, Crockford base32 encoded ULID.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(ULID_ALPHABET[index])
+    return "".join(reversed(chars))
+
+
+def new_artifact_id(prefix: str, extension: str) -> str:
+    """
+    Allocates a unique identifier for an uploaded or edited image.
+
+    The identifier is built without touching the filesystem, so concurrent
+    requests never pick the same name. Its prefix tells which folder the
+    artifact lives in.
 
     Parameters
     ----------
-    image_path : str
-        The directory where the file will be stored.
-    filename : str
-        The original filename.
+    prefix : str
+        Either `UPLOAD_PREFIX` or `EDITED_PREFIX`.
+    extension : str
+        The extension of the image format, e.g. ".jpg".
 
     Returns
     -------
     str
-        A unique filename with an incremented counter if necessary.
+        The artifact identifier, e.g. "upload-01HZY3K4QJ6V7X8W9ZB2C3D4E5.jpg".
     """
-    name, ext = os.path.splitext(filename)
-    file_counter = 1
-    unique_name = f"{name}{ext}"
+    return f"{prefix}{generate_ulid()}{extension}"
 
-    while os.path.exists(os.path.join(image_path, unique_name)):
-        unique_name = f"{name}_{file_counter}{ext}"
-        file_counter += 1
 
-    return unique_name
+@contextmanager
+def atomic_write(file_path: str):
+    """
+    Opens a file for binary writing, making it visible only once complete.
+
+    The content is written to a temporary ".part" file in the same folder,
+    which is renamed to `file_path` on success and removed on failure.
+
+    Parameters
+    ----------
+    file_path : str
+        The final path of the file.
+
+    Yields
+    ------
+    BinaryIO
+        The file object to write to.
+    """
+    tmp_path = f"{file_path}.part"
+    try:
+        with open(tmp_path, "xb") as f:
+            yield f
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
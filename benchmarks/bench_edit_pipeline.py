@@ -0,0 +1,106 @@
+"""
+Compares the disk round-trip and the in-memory edit-then-classify pipelines.
+
+The disk pipeline reproduces the original flow: the edited image is encoded
+to JPEG, then re-opened and decoded before preprocessing. The in-memory
+pipeline preprocesses the enhanced image directly. The forward pass is the
+same in both and is left out.
+
+Usage::
+
+    python -m benchmarks.bench_edit_pipeline --image app/static/imagenet_subset/n01440764_tench.JPEG
+"""
+import argparse
+import os
+import tempfile
+
+from PIL import Image
+
+from app.ml.classification_utils import preprocess_image
+from app.utils import enhance_image
+from benchmarks.harness import median_ms
+
+EDIT_VALUES = (30, -20, 40, 50)
+
+
+def edit_image(original_image_path: str,
+               color_value: int,
+               brightness_value: int,
+               contrast_value: int,
+               sharpness_value: int,
+               edited_image_path: str) -> None:
+    """
+    Applies the enhancements and saves the edited image, as the app originally did.
+
+    This is the reference of the disk pipeline: the app now edits in memory
+    and never writes the image before classifying it.
+
+    Parameters
+    ----------
+    original_image_path : str
+        The file path of the original image.
+    color_value : int
+        The color enhancement factor, ranging from -100 to 100.
+    brightness_value : int
+        The brightness enhancement factor, ranging from -100 to 100.
+    contrast_value : int
+        The contrast enhancement factor, ranging from -100 to 100.
+    sharpness_value : int
+        The sharpness enhancement factor, ranging from -100 to 100.
+    edited_image_path : str
+        The file path where the edited image is saved.
+    """
+    with Image.open(original_image_path) as original_image:
+        edited_image = enhance_image(original_image, color_value, brightness_value,
+                                     contrast_value, sharpness_value)
+    edited_image.save(edited_image_path, format="JPEG")
+
+
+def disk_pipeline(image_path: str, edited_image_path: str) -> None:
+    """
+    Edits the image to a JPEG file, then decodes and preprocesses it.
+
+    Parameters
+    ----------
+    image_path : str
+        The file path of the original image.
+    edited_image_path : str
+        The file path where the edited image is written.
+    """
+    edit_image(image_path, *EDIT_VALUES, edited_image_path)
+    with Image.open(edited_image_path) as edited_image:
+        preprocess_image(edited_image)
+
+
+def memory_pipeline(image_path: str) -> None:
+    """
+    Edits the image in memory and preprocesses it directly.
+
+    Parameters
+    ----------
+    image_path : str
+        The file path of the original image.
+    """
+    with Image.open(image_path) as original_image:
+        edited_image = enhance_image(original_image, *EDIT_VALUES)
+    preprocess_image(edited_image)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", required=True, help="path of the image to be edited")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        edited_image_path = os.path.join(tmp_dir, "edited.jpg")
+        disk_ms = median_ms(lambda: disk_pipeline(args.image, edited_image_path), args.repeat)
+    memory_ms = median_ms(lambda: memory_pipeline(args.image), args.repeat)
+
+    print(f"disk round-trip: {disk_ms:8.2f} ms")
+    print(f"in-memory:       {memory_ms:8.2f} ms")
+    print(f"saved:           {disk_ms - memory_ms:8.2f} ms ({disk_ms / memory_ms:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the chained Pillow enhancement with the fused vectorized engine.
+
+For each image size the script reports the median latency of both engines,
+the throughput of the engine on a batch, and the largest per-pixel
+difference between the two outputs.
+
+Usage::
+
+    python -m benchmarks.bench_enhancement --sizes 224 512 1024 --batch-size 8
+"""
+import argparse
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from app import enhancement
+from app.utils import scale_values
+from benchmarks.harness import median_ms
+
+EDIT_VALUES = (30, -20, 40, 50)
+
+
+def pil_enhance(image: Image.Image) -> Image.Image:
+    """
+    Applies the four enhancements with chained `ImageEnhance` passes.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The RGB image to be enhanced.
+
+    Returns
+    -------
+    Image.Image
+        The enhanced image.
+    """
+    color_value, brightness_value, contrast_value, sharpness_value = EDIT_VALUES
+    image = ImageEnhance.Color(image).enhance(scale_values(color_value))
+    image = ImageEnhance.Brightness(image).enhance(scale_values(brightness_value))
+    image = ImageEnhance.Contrast(image).enhance(scale_values(contrast_value))
+    return ImageEnhance.Sharpness(image).enhance(scale_values(sharpness_value))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[224, 512, 1024, 2048])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>6}{'pil ms':>10}{'fused ms':>10}{'batch ms/img':>14}{'max diff':>10}")
+    for size in args.sizes:
+        # a smooth gradient with noise, closer to a photo than uniform noise
+        gradient = np.linspace(0, 255, size, dtype=np.float32)
+        pixels = np.stack([gradient[None, :].repeat(size, 0),
+                           gradient[:, None].repeat(size, 1),
+                           gradient[::-1, None].repeat(size, 1)], axis=-1)
+        pixels = np.clip(pixels + rng.normal(0, 20, pixels.shape), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels)
+
+        pil_ms = median_ms(lambda: pil_enhance(image), args.repeat)
+        fused_ms = median_ms(lambda: enhancement.enhance_image(image, *EDIT_VALUES), args.repeat)
+
+        batch = np.repeat(pixels[None], args.batch_size, axis=0)
+        values = np.tile(EDIT_VALUES, (args.batch_size, 1))
+        batch_ms = median_ms(lambda: enhancement.enhance_batch(batch, values), args.repeat) / args.batch_size
+
+        diff = np.abs(np.asarray(pil_enhance(image), dtype=int)
+                      - np.asarray(enhancement.enhance_image(image, *EDIT_VALUES), dtype=int))
+        print(f"{size:>6}{pil_ms:>10.2f}{fused_ms:>10.2f}{batch_ms:>14.2f}{diff.max():>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compares the original and the fast inference paths for every configured model.
+
+The baseline reproduces the original `classify_image` forward pass: eager
+model with autograd enabled and a full `torch.sort` over the logits. The
+fast path runs under `torch.inference_mode`, optionally channels-last,
+and extracts the results with `torch.topk`.
+
+Usage::
+
+    python -m benchmarks.bench_inference --batch-size 1 --repeat 20
+"""
+import argparse
+import importlib
+import json
+import statistics
+
+import torch
+
+from app.config import Configuration
+from app.ml.inference import configure_threads, forward, prepare_model, top_k
+from benchmarks.harness import time_runs
+
+conf = Configuration()
+
+
+def baseline_step(model: torch.nn.Module, batch: torch.Tensor) -> None:
+    """
+    Runs the forward pass and result extraction as the original code did.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model in evaluation mode, with autograd enabled.
+    batch : torch.Tensor
+        The input batch.
+    """
+    out = model(batch)
+    _, indices = torch.sort(out, descending=True)
+    percentage = torch.nn.functional.softmax(out, dim=1) * 100
+    [[percentage[row][idx].item() for idx in indices[row][:5]] for row in range(out.shape[0])]
+
+
+def fast_step(model: torch.nn.Module, batch: torch.Tensor, channels_last: bool) -> None:
+    """
+    Runs the forward pass and result extraction through the fast path.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        The model prepared with `prepare_model`.
+    batch : torch.Tensor
+        The input batch.
+    channels_last : bool
+        Whether the model and the batch use the channels-last memory format.
+    """
+    percentages, indices = top_k(forward(model, batch, channels_last), 5)
+    percentages.tolist(), indices.tolist()
+
+
+def load_model(model_id: str, pretrained: bool) -> torch.nn.Module:
+    """
+    Builds a fresh torchvision model.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    pretrained : bool
+        Whether to load the default pretrained weights.
+
+    Returns
+    -------
+    torch.nn.Module
+        The model in evaluation mode.
+    """
+    module = importlib.import_module("torchvision.models")
+    model = module.__getattribute__(model_id)(weights="DEFAULT" if pretrained else None)
+    return model.eval()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=list(conf.models))
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--no-channels-last", action="store_true")
+    parser.add_argument("--random-weights", action="store_true",
+                        help="skip downloading the pretrained weights")
+    parser.add_argument("--intra-op-threads", type=int, default=conf.intra_op_threads)
+    parser.add_argument("--inter-op-threads", type=int, default=conf.inter_op_threads)
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    args = parser.parse_args()
+
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    channels_last = not args.no_channels_last
+    batch = torch.rand(args.batch_size, 3, 224, 224)
+
+    results = {}
+    print(f"{'model':<14}{'baseline ms':>14}{'fast ms':>14}{'speedup':>10}")
+    for model_id in args.models:
+        model = load_model(model_id, not args.random_weights)
+        baseline = time_runs(lambda: baseline_step(model, batch), args.repeat, args.warmup)
+
+        model = prepare_model(model, channels_last)
+        fast = time_runs(lambda: fast_step(model, batch, channels_last), args.repeat, args.warmup)
+
+        results[model_id] = {
+            "baseline_ms": statistics.median(baseline),
+            "fast_ms": statistics.median(fast),
+        }
+        speedup = results[model_id]["baseline_ms"] / results[model_id]["fast_ms"]
+        print(f"{model_id:<14}{results[model_id]['baseline_ms']:>14.2f}"
+              f"{results[model_id]['fast_ms']:>14.2f}{speedup:>9.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"batch_size": args.batch_size, "channels_last": channels_last,
+                       "threads": torch.get_num_threads(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Drives the /editor, /upload and /info endpoints in-process at several concurrency levels.
+
+The app is served through an ASGI transport, without sockets, and started
+with its lifespan; the first request is sent once `/health/ready` reports
+the models warm.
+Every scenario is run at each concurrency level: that many clients send
+requests back to back until `--requests` have completed. The throughput,
+the p50/p95/p99 latency, the failed requests and the peak resident memory
+of the process are reported. The clients share the event loop of the app,
+so the figures measure the service, not a network stack.
+
+The requests are generated from a fixed seed: the dataset images and
+models are cycled and, unless `--no-edits` is given, every editor and
+upload request carries random enhancement values, so that the result
+cache rarely hits. The on-disk result cache is disabled, so that runs do
+not depend on earlier ones.
+
+Usage::
+
+    python -m benchmarks.bench_load --scenarios editor upload info --concurrency 1 4 16 --output load.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from app.config import Configuration
+from benchmarks.bench_stages import load_backend
+from benchmarks.harness import compare_with_baseline, peak_rss_mb, save_results, summarize
+
+Configuration.result_cache_dir = None  # every run starts from a cold cache
+Configuration.job_workers = 0  # no scenario submits jobs
+conf = Configuration()
+
+SCENARIOS = ("editor", "upload", "info")
+
+
+class RequestFactory:
+    """
+    Builds the reproducible sequence of requests of each scenario.
+
+    Attributes
+    ----------
+    filenames : list of str
+        The dataset images cycled by the requests.
+    models : list of str
+        The models cycled by the requests.
+    edits : bool
+        Whether the editor and upload requests carry enhancement values.
+    """
+
+    def __init__(self, filenames: list[str], models: list[str], edits: bool, seed: int) -> None:
+        """
+        Initializes the factory.
+
+        Parameters
+        ----------
+        filenames : list of str
+            The dataset images cycled by the requests.
+        models : list of str
+            The models cycled by the requests.
+        edits : bool
+            Whether the editor and upload requests carry enhancement values.
+        seed : int
+            The seed of the enhancement values.
+        """
+        self.filenames = filenames
+        self.models = models
+        self.edits = edits
+        self._random = random.Random(seed)
+        self._images: dict[str, bytes] = {}
+
+    def form(self, index: int) -> dict:
+        """
+        Returns the form fields of the editor and upload requests.
+
+        Parameters
+        ----------
+        index : int
+            The position of the request in its scenario.
+
+        Returns
+        -------
+        dict
+            The model and the enhancement values.
+        """
+        fields = {"model_id": self.models[index % len(self.models)]}
+        if self.edits:
+            for name in ("color_value", "brightness_value", "contrast_value", "sharpness_value"):
+                fields[name] = str(self._random.randint(-100, 100))
+        return fields
+
+    def image(self, index: int) -> tuple[str, bytes]:
+        """
+        Returns the dataset image of a request.
+
+        Parameters
+        ----------
+        index : int
+            The position of the request in its scenario.
+
+        Returns
+        -------
+        tuple
+            The filename and the content of the image.
+        """
+        filename = self.filenames[index % len(self.filenames)]
+        if filename not in self._images:
+            with open(os.path.join(conf.image_folder_path, filename), "rb") as f:
+                self._images[filename] = f.read()
+        return filename, self._images[filename]
+
+    async def send(self, client: httpx.AsyncClient, scenario: str, index: int) -> httpx.Response:
+        """
+        Sends one request of a scenario.
+
+        Parameters
+        ----------
+        client : httpx.AsyncClient
+            The client bound to the app.
+        scenario : str
+            "editor", "upload" or "info".
+        index : int
+            The position of the request in its scenario.
+
+        Returns
+        -------
+        httpx.Response
+            The response of the app.
+        """
+        if scenario == "info":
+            return await client.get("/info", params={"offset": index % len(self.filenames), "limit": 50})
+        filename, content = self.image(index)
+        if scenario == "editor":
+            return await client.post("/editor", data={**self.form(index), "image_id": filename})
+        return await client.post("/upload", data=self.form(index),
+                                 files={"file": (filename, content, "image/jpeg")})
+
+
+async def run_case(client: httpx.AsyncClient,
+                   factory: RequestFactory,
+                   scenario: str,
+                   concurrency: int,
+                   requests: int) -> dict:
+    """
+    Runs a scenario with a number of concurrent clients.
+
+    Parameters
+    ----------
+    client : httpx.AsyncClient
+        The client bound to the app.
+    factory : RequestFactory
+        The builder of the requests.
+    scenario : str
+        "editor", "upload" or "info".
+    concurrency : int
+        The number of clients sending requests at the same time.
+    requests : int
+        The total number of requests.
+
+    Returns
+    -------
+    dict
+        The throughput, the latency summary, the failed requests and the
+        peak resident memory.
+    """
+    timings = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await factory.send(client, scenario, index)
+            timings.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_s": requests / elapsed,
+        **summarize(timings),
+        "errors": errors,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """
+    Starts the app and runs every scenario at every concurrency level.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        The command line options.
+
+    Returns
+    -------
+    dict
+        The metrics of each "scenario/cN" case.
+    """
+    Configuration.warm_up_models = tuple(args.models)
+    import main as service  # imported here, after the configuration overrides
+    from app.ml.classification_utils import model_registry
+
+    if args.random_weights:
+        model_registry.loader = lambda model_id: load_backend(model_id, pretrained=False)
+
+    results = {}
+    print(f"{'case':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'RSS MB':>10}")
+    async with service.lifespan(service.app):
+        while not service.startup.ready:
+            if service.startup.error:
+                raise RuntimeError(service.startup.error)
+            await asyncio.sleep(0.1)
+        filenames = service.image_catalog.filenames()[:args.images]
+        factory = RequestFactory(filenames, args.models, not args.no_edits, args.seed)
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=conf.inference_timeout * 2) as client:
+            for scenario in args.scenarios:
+                await run_case(client, factory, scenario, 1, args.warmup)
+                for concurrency in args.concurrency:
+                    name = f"{scenario}/c{concurrency}"
+                    results[name] = await run_case(client, factory, scenario, concurrency, args.requests)
+                    result = results[name]
+                    print(f"{name:<16}{result['requests_per_s']:>10.1f}{result['p50_ms']:>10.1f}"
+                          f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}"
+                          f"{result['peak_rss_mb']:>10.1f}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and concurrency")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per scenario")
+    parser.add_argument("--models", nargs="+", default=list(conf.warm_up_models))
+    parser.add_argument("--images", type=int, default=64, help="number of dataset images cycled")
+    parser.add_argument("--no-edits", action="store_true", help="send the editor and upload requests unedited")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--random-weights", action="store_true",
+                        help="skip downloading the pretrained weights")
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative change flagged as a regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        save_results(args.output, results, benchmark="load", scenarios=args.scenarios,
+                     concurrency=args.concurrency, requests=args.requests, models=args.models,
+                     edits=not args.no_edits, seed=args.seed, executor=conf.inference_executor,
+                     inference_workers=conf.inference_workers)
+    if args.baseline and compare_with_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
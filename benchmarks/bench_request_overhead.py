@@ -0,0 +1,130 @@
+"""
+Measures the per-request overhead of classification outside the forward pass.
+
+Each stage is timed as the original `classify_image` ran it and as it runs
+now: loading the labels (re-parsing `imagenet_labels.json` vs. the cached
+tuple), preprocessing (building `transforms.Compose` on every call vs. the
+cached pipeline of the input size) and extracting the top-5 results (full
+sort and softmax vs. `top_k` on the logits). The logits are random, so the
+forward pass is left out.
+
+Usage::
+
+    python -m benchmarks.bench_request_overhead --image app/static/imagenet_subset/n01440764_tench.JPEG
+"""
+import argparse
+import json
+import os
+
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from app.config import Configuration
+from app.ml.classification_utils import format_scores, get_labels, preprocess_image
+from app.ml.inference import top_k
+from benchmarks.harness import median_ms
+
+conf = Configuration()
+
+
+def original_labels() -> list:
+    """
+    Loads the labels as the original `get_labels` did, on every call.
+
+    Returns
+    -------
+    list of str
+        The ImageNet labels.
+    """
+    with open(os.path.join(conf.image_folder_path, "imagenet_labels.json")) as f:
+        return json.load(f)
+
+
+def original_preprocess(img: Image.Image) -> torch.Tensor:
+    """
+    Preprocesses an image as the original code did, building the pipeline on every call.
+
+    Parameters
+    ----------
+    img : Image.Image
+        The image to be preprocessed.
+
+    Returns
+    -------
+    torch.Tensor
+        The preprocessed image.
+    """
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+    return transform(img.convert("RGB"))
+
+
+def original_results(logits: torch.Tensor, labels: list) -> list:
+    """
+    Extracts the top-5 results as the original `classify_image` did.
+
+    Parameters
+    ----------
+    logits : torch.Tensor
+        The logits of one image, with shape (1, number of classes).
+    labels : list of str
+        The ImageNet labels.
+
+    Returns
+    -------
+    list of tuple
+        The top-5 (label, percentage) pairs.
+    """
+    _, indices = torch.sort(logits, descending=True)
+    percentage = torch.nn.functional.softmax(logits, dim=1)[0] * 100
+    return [(labels[idx], percentage[idx].item()) for idx in indices[0][:5]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", required=True, help="path of the image to preprocess")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    args = parser.parse_args()
+
+    image = Image.open(args.image)
+    image.load()
+    logits = torch.randn(1, 1000)
+    labels = get_labels()
+
+    stages = {
+        "labels": (original_labels,
+                   get_labels),
+        "preprocess": (lambda: original_preprocess(image),
+                       lambda: preprocess_image(image)),
+        "results": (lambda: original_results(logits, original_labels()),
+                    lambda: format_scores(*top_k(logits, 5))),
+        "results (labels loaded)": (lambda: original_results(logits, labels),
+                                    lambda: format_scores(*top_k(logits, 5))),
+    }
+
+    report = {}
+    print(f"{'stage':<26}{'before us':>12}{'after us':>12}{'saved us':>12}")
+    for name, (before, after) in stages.items():
+        before_us = median_ms(before, args.repeat) * 1000
+        after_us = median_ms(after, args.repeat) * 1000
+        report[name] = {"before_us": before_us, "after_us": after_us}
+        print(f"{name:<26}{before_us:>12.1f}{after_us:>12.1f}{before_us - after_us:>12.1f}")
+
+    # a request loads the labels once, preprocesses the image and extracts the results
+    before_total = report["preprocess"]["before_us"] + report["results"]["before_us"]
+    after_total = report["preprocess"]["after_us"] + report["results"]["after_us"]
+    print(f"{'per request':<26}{before_total:>12.1f}{after_total:>12.1f}{before_total - after_total:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Microbenchmarks of each stage of the classification pipeline, per model.
+
+The stages shared by all the models (decoding the JPEG, applying the
+enhancements, encoding the edited image) are timed once; preprocessing,
+the forward pass of a single image and the extraction of the results are
+timed for every model, through the same functions the service runs.
+Pass `--baseline` with the JSON file of an earlier run to compare them.
+
+Usage::
+
+    python -m benchmarks.bench_stages --image app/static/imagenet_subset/n01440764_tench.JPEG --output stages.json
+"""
+import argparse
+import importlib
+import sys
+from io import BytesIO
+
+from PIL import Image
+
+from app.config import Configuration
+from app.ml.backends import TorchBackend
+from app.ml.classification_utils import format_scores, input_size, preprocess_image
+from app.ml.inference import configure_threads, top_k
+from app.utils import enhance_image
+from benchmarks.harness import compare_with_baseline, peak_rss_mb, save_results, summarize, time_runs
+
+conf = Configuration()
+
+EDIT_VALUES = (30, -20, 40, 50)
+
+
+def decode(image_bytes: bytes) -> Image.Image:
+    """
+    Decodes a JPEG image.
+
+    Parameters
+    ----------
+    image_bytes : bytes
+        The encoded image.
+
+    Returns
+    -------
+    Image.Image
+        The decoded RGB image.
+    """
+    with Image.open(BytesIO(image_bytes)) as img:
+        return img.convert("RGB")
+
+
+def encode(image: Image.Image) -> bytes:
+    """
+    Encodes an image as JPEG, as the edited images are for display.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image to be encoded.
+
+    Returns
+    -------
+    bytes
+        The JPEG-encoded image.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def load_backend(model_id: str, pretrained: bool) -> TorchBackend:
+    """
+    Builds the eager backend of a model, as the service runs it by default.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    pretrained : bool
+        Whether to load the default pretrained weights.
+
+    Returns
+    -------
+    TorchBackend
+        The backend running the model.
+    """
+    module = importlib.import_module("torchvision.models")
+    model = module.__getattribute__(model_id)(weights="DEFAULT" if pretrained else None)
+    return TorchBackend(model, conf.channels_last)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", required=True, help="path of the JPEG image run through the stages")
+    parser.add_argument("--models", nargs="+", default=list(conf.models))
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--random-weights", action="store_true",
+                        help="skip downloading the pretrained weights")
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    configure_threads(conf.intra_op_threads, conf.inter_op_threads)
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+    image = decode(image_bytes)
+    edited = enhance_image(image, *EDIT_VALUES)
+
+    cases = {
+        "pipeline/decode": lambda: decode(image_bytes),
+        "pipeline/edit": lambda: enhance_image(image, *EDIT_VALUES),
+        "pipeline/encode": lambda: encode(edited),
+    }
+    for model_id in args.models:
+        size = input_size(model_id)
+        backend = load_backend(model_id, not args.random_weights)
+        tensor = preprocess_image(edited, size)
+        logits = backend.predict(tensor[None])
+        cases[f"{model_id}/preprocess"] = lambda size=size: preprocess_image(edited, size)
+        cases[f"{model_id}/forward"] = lambda backend=backend, tensor=tensor: backend.predict(tensor[None])
+        cases[f"{model_id}/results"] = (
+            lambda logits=logits: format_scores(*top_k(logits, conf.result_top_k, conf.result_scores))
+        )
+
+    results = {}
+    print(f"{'stage':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, step in cases.items():
+        results[name] = summarize(time_runs(step, args.repeat, args.warmup))
+        print(f"{name:<32}{results[name]['p50_ms']:>10.2f}{results[name]['p95_ms']:>10.2f}"
+              f"{results[name]['p99_ms']:>10.2f}")
+    print(f"peak RSS {peak_rss_mb():.1f} MB")
+
+    if args.output:
+        save_results(args.output, results, benchmark="stages", image=args.image,
+                     repeat=args.repeat, channels_last=conf.channels_last, peak_rss_mb=peak_rss_mb())
+    if args.baseline and compare_with_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Measures how long a fresh process takes to import the app, to serve and to be ready.
+
+Each run starts a new interpreter: the import of `main` is timed in one,
+then the app is started with uvicorn in another, which is polled until
+`/health/live` and `/health/ready` answer 200. The durations are counted
+from the start of the server process; the import of the ML stack and the
+warm-up of the models reported by `/health/ready` are recorded too. The
+median liveness and readiness times are checked against `live_budget` and
+`ready_budget` of the configuration.
+
+The models of `--models` (`warm_up_models` by default) must have been
+downloaded by `prepare_models`; pass `--models` without names to measure
+the web layer only.
+
+Usage::
+
+    python -m benchmarks.bench_startup --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from app.config import Configuration
+from benchmarks.harness import compare_with_baseline, save_results, summarize
+
+conf = Configuration()
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+SERVER_SCRIPT = """
+import sys
+import uvicorn
+from app.config import Configuration
+Configuration.warm_up_models = tuple(sys.argv[2:])
+Configuration.job_workers = 0
+uvicorn.run("main:app", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def free_port() -> int:
+    """
+    Finds a free TCP port on the loopback interface.
+
+    Returns
+    -------
+    int
+        The port number.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_status(url: str) -> tuple[Optional[int], Optional[dict]]:
+    """
+    Sends a GET request, without failing when the server is not up yet.
+
+    Parameters
+    ----------
+    url : str
+        The URL to be requested.
+
+    Returns
+    -------
+    tuple
+        The status code and the JSON body, or `None` and `None` if the
+        server did not answer.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return None, None
+
+
+def time_import() -> float:
+    """
+    Times the import of `main` in a fresh interpreter.
+
+    Returns
+    -------
+    float
+        The duration in milliseconds.
+    """
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1]) * 1000
+
+
+def time_startup(models: list[str], timeout: float) -> dict[str, float]:
+    """
+    Starts the app in a new process and waits for it to be live, then ready.
+
+    Parameters
+    ----------
+    models : list of str
+        The models warmed up by the app.
+    timeout : float
+        The maximum number of seconds to wait for readiness.
+
+    Returns
+    -------
+    dict
+        The live and ready times measured by the client, and the ML import
+        and warm-up times reported by the app, in milliseconds.
+    """
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", SERVER_SCRIPT, str(port), *models])
+    times = {}
+    try:
+        while "ready" not in times:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"The app was not ready after {timeout} s")
+            if server.poll() is not None:
+                raise RuntimeError(f"The app exited with status {server.returncode}")
+            if "live" not in times and get_status(f"{base_url}/health/live")[0] == 200:
+                times["live"] = (time.perf_counter() - start) * 1000
+            if "live" in times:
+                status, body = get_status(f"{base_url}/health/ready")
+                if status == 200:
+                    times["ready"] = (time.perf_counter() - start) * 1000
+                    times["ml_import"] = body["timings"]["ml_import"] * 1000
+                    times["warm_up"] = body["timings"]["warm_up"] * 1000
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="*", default=list(conf.warm_up_models))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for readiness")
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    timings: dict[str, list[float]] = {"import": [], "live": [], "ready": [], "ml_import": [], "warm_up": []}
+    for _ in range(args.repeat):
+        timings["import"].append(time_import())
+        for name, value in time_startup(args.models, args.timeout).items():
+            timings[name].append(value)
+
+    results = {name: summarize(values) for name, values in timings.items()}
+    print(f"{'milestone':<16}{'p50 ms':>10}{'max ms':>10}{'budget ms':>12}")
+    budgets = {"live": conf.live_budget, "ready": conf.ready_budget}
+    over_budget = 0
+    for name, values in timings.items():
+        budget = budgets.get(name)
+        over = budget is not None and results[name]["p50_ms"] > budget * 1000
+        over_budget += over
+        budget_ms = f"{budget * 1000:.0f}" if budget is not None else "-"
+        print(f"{name:<16}{results[name]['p50_ms']:>10.0f}{max(values):>10.0f}{budget_ms:>12}"
+              f"{'  OVER BUDGET' if over else ''}")
+
+    if args.output:
+        save_results(args.output, results, benchmark="startup", models=args.models, repeat=args.repeat,
+                     live_budget=conf.live_budget, ready_budget=conf.ready_budget)
+    regressions = compare_with_baseline(results, args.baseline, args.tolerance) if args.baseline else 0
+    if over_budget or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures how upload processing scales with the input megapixels.
+
+For each size, a JPEG photo-like image is generated and processed twice:
+decoding at full resolution (before) and with decode-time downscaling to
+`Configuration.upload_working_size` (after). Each run decodes, enhances and
+preprocesses the image in a fresh process, reporting the latency and the
+peak RSS growth of that process. The forward pass is left out.
+
+Usage::
+
+    python -m benchmarks.bench_upload_downscale --megapixels 1 4 12 24
+"""
+import argparse
+import math
+import os
+import resource
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from app.config import Configuration
+from benchmarks.harness import current_rss_kb, median_ms, run_isolated
+
+conf = Configuration()
+
+EDIT_VALUES = (30, -20, 40, 50)
+
+
+def run_case(image_path: str, working_size, repeat: int, results) -> None:
+    """
+    Processes an image `repeat` times and reports latency and peak RSS growth.
+
+    Runs in a child process, so that the peak RSS only reflects this case.
+
+    Parameters
+    ----------
+    image_path : str
+        The file path of the JPEG image.
+    working_size : int or None
+        The decode-time working size, or `None` for full resolution.
+    repeat : int
+        The number of timed runs.
+    results : multiprocessing.Queue
+        The queue receiving the (median latency ms, peak RSS growth MB) tuple.
+    """
+    from app.ml.classification_utils import preprocess_image
+    from app.utils import enhance_image, open_image
+
+    baseline_kb = current_rss_kb()
+    latency_ms = median_ms(
+        lambda: preprocess_image(enhance_image(open_image(image_path, working_size), *EDIT_VALUES)),
+        repeat,
+        warmup=0,
+    )
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((latency_ms, (peak_kb - baseline_kb) / 1024))
+
+
+def make_image(path: str, megapixels: float) -> None:
+    """
+    Writes a 4:3 JPEG image with smooth gradients and noise.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the image.
+    megapixels : float
+        The number of pixels of the image, in millions.
+    """
+    height = int(math.sqrt(megapixels * 1e6 * 3 / 4))
+    width = int(height * 4 / 3)
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 10, pixels.shape).astype(np.float32)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, format="JPEG", quality=90)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 4, 12, 24])
+    parser.add_argument("--working-size", type=int, default=conf.upload_working_size)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="seconds to wait for each case, run in its own process")
+    args = parser.parse_args()
+
+    print(f"working size: {args.working_size}")
+    print(f"{'MP':>6}{'before ms':>12}{'after ms':>12}{'before MB':>12}{'after MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for megapixels in args.megapixels:
+            image_path = os.path.join(tmp_dir, f"{megapixels}.jpg")
+            make_image(image_path, megapixels)
+            before_ms, before_mb = run_isolated(run_case, image_path, None, args.repeat, timeout=args.timeout)
+            after_ms, after_mb = run_isolated(run_case, image_path, args.working_size, args.repeat,
+                                              timeout=args.timeout)
+            print(f"{megapixels:>6.1f}{before_ms:>12.1f}{after_ms:>12.1f}{before_mb:>12.1f}{after_mb:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
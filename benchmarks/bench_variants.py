@@ -0,0 +1,155 @@
+"""
+Compares the eager models with their compiled variants.
+
+For every model, the eager fp32 model and each variant compiled by
+`python -m app.prepare_models` (TorchScript, int8 and ONNX Runtime) are
+loaded in a fresh process, which reports the median latency, the resident
+memory added by loading the model and the peak resident memory while
+running it. The accuracy delta
+is the top-1 and top-5 agreement of each variant with the eager model on
+dataset images, together with the verdict recorded in the manifest.
+
+Usage::
+
+    python -m benchmarks.bench_variants --models resnet18 alexnet --batch-size 1 8
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+
+import torch
+
+from app.config import Configuration
+from app.ml.backends import TorchBackend
+from app.ml.compilation import load_variant, read_manifest, top5_agreement
+from benchmarks.harness import current_rss_kb, median_ms, run_isolated
+
+conf = Configuration()
+
+
+def load_backend(model_id: str, variant: str, file):
+    """
+    Loads the eager model or a compiled variant, ignoring the manifest verdict.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    variant : str
+        "eager" or the name of a compiled variant.
+    file : str or None
+        The file of the compiled variant.
+
+    Returns
+    -------
+    ClassifierBackend
+        The backend running the model.
+    """
+    if variant == "eager":
+        module = importlib.import_module("torchvision.models")
+        return TorchBackend(module.__getattribute__(model_id)(weights="DEFAULT"), conf.channels_last)
+    return load_variant(
+        os.path.join(conf.compiled_models_path, file),
+        variant,
+        **({"intra_op_threads": conf.onnx_intra_op_threads,
+            "inter_op_threads": conf.onnx_inter_op_threads,
+            "graph_optimization": conf.onnx_graph_optimization} if variant == "onnx" else {}),
+    )
+
+
+def run_case(model_id: str, variant: str, file, images: torch.Tensor,
+             batch_sizes: list, repeat: int, results) -> None:
+    """
+    Measures a model in a child process, so that the memory figures only reflect it.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the model.
+    variant : str
+        "eager" or the name of a compiled variant.
+    file : str or None
+        The file of the compiled variant.
+    images : torch.Tensor
+        The preprocessed dataset images used for the agreement.
+    batch_sizes : list of int
+        The batch sizes whose latency is measured.
+    repeat : int
+        The number of timed runs per batch size.
+    results : multiprocessing.Queue
+        The queue receiving the measurements.
+    """
+    baseline_kb = current_rss_kb()
+    backend = load_backend(model_id, variant, file)
+    loaded_kb = current_rss_kb()
+
+    latencies = {}
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            batch = images[:batch_size]
+            latencies[batch_size] = median_ms(lambda: backend.predict(batch), repeat)
+        logits = torch.cat([backend.predict(batch) for batch in torch.split(images, 8)])
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        "latency_ms": latencies,
+        "load_mb": (loaded_kb - baseline_kb) / 1024,
+        "peak_mb": (peak_kb - baseline_kb) / 1024,
+        "logits": logits,
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=list(conf.models))
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--images", type=int, default=64,
+                        help="number of dataset images used for the agreement")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="seconds to wait for each case, run in its own process")
+    parser.add_argument("--output", help="path of a JSON file for the results")
+    args = parser.parse_args()
+
+    from app.ml.classification_utils import input_size, preprocess_dataset_image
+
+    manifest = read_manifest(conf.compiled_models_path)
+    filenames = sorted(f for f in os.listdir(conf.image_folder_path) if f.endswith(".JPEG"))
+    filenames = filenames[:max(args.images, *args.batch_size)]
+
+    report = {}
+    header = "".join(f"{f'b{b} ms':>10}" for b in args.batch_size)
+    print(f"{'model':<14}{'variant':<14}{header}{'load MB':>10}{'peak MB':>10}"
+          f"{'top1 agr':>10}{'top5 agr':>10}  manifest")
+    for model_id in args.models:
+        size = input_size(model_id)
+        images = torch.stack([preprocess_dataset_image(f, [size])[size] for f in filenames])
+
+        variants = {"eager": None}
+        variants.update({variant: entry["file"] for variant, entry in manifest.get(model_id, {}).items()})
+        reference = None
+        for variant, file in variants.items():
+            result = run_isolated(run_case, model_id, variant, file, images, args.batch_size, args.repeat,
+                                  timeout=args.timeout)
+            logits = result.pop("logits")
+            if reference is None:
+                reference = logits
+            result.update(top5_agreement(reference, logits))
+            entry = manifest.get(model_id, {}).get(variant)
+            verdict = "-" if entry is None else ("accepted" if entry["accepted"] else "rejected")
+            report.setdefault(model_id, {})[variant] = {**result, "manifest": verdict}
+
+            latencies = "".join(f"{result['latency_ms'][b]:>10.2f}" for b in args.batch_size)
+            print(f"{model_id:<14}{variant:<14}{latencies}{result['load_mb']:>10.1f}"
+                  f"{result['peak_mb']:>10.1f}{result['top1_agreement']:>10.3f}"
+                  f"{result['top5_agreement']:>10.3f}  {verdict}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"threads": torch.get_num_threads(), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Shared helpers of the benchmark suite: timing loops, latency summaries,
+memory figures, isolated runs in a fresh process, JSON results and the
+comparison with a baseline run.
+
+Results are saved as `{"meta": {...}, "results": {case: {metric: value}}}`.
+Metrics ending in `_ms` are latencies (lower is better) and metrics ending
+in `_per_s` are throughputs (higher is better); the other ones are reported
+but never flagged as regressions.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Optional
+
+import numpy as np
+import torch
+
+
+def time_runs(step: Callable[[], Any], repeat: int, warmup: int = 1) -> list[float]:
+    """
+    Times a benchmark step.
+
+    Parameters
+    ----------
+    step : Callable[[], Any]
+        The step to be timed.
+    repeat : int
+        The number of timed runs.
+    warmup : int, optional
+        The number of untimed runs executed first (default is 1).
+
+    Returns
+    -------
+    list of float
+        The duration of each timed run in milliseconds.
+    """
+    for _ in range(warmup):
+        step()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        step()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def median_ms(step: Callable[[], Any], repeat: int, warmup: int = 1) -> float:
+    """
+    Returns the median duration of a step in milliseconds.
+
+    Parameters
+    ----------
+    step : Callable[[], Any]
+        The step to be timed.
+    repeat : int
+        The number of timed runs.
+    warmup : int, optional
+        The number of untimed runs executed first (default is 1).
+
+    Returns
+    -------
+    float
+        The median duration in milliseconds.
+    """
+    return statistics.median(time_runs(step, repeat, warmup))
+
+
+def summarize(timings_ms: list[float]) -> dict[str, float]:
+    """
+    Summarizes the durations of repeated runs.
+
+    Parameters
+    ----------
+    timings_ms : list of float
+        The duration of each run in milliseconds.
+
+    Returns
+    -------
+    dict
+        The mean, p50, p95 and p99 latency in milliseconds.
+    """
+    timings = np.asarray(timings_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process so far.
+
+    Returns
+    -------
+    float
+        The peak resident set size in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_kb() -> int:
+    """
+    Returns the current resident set size of this process.
+
+    Returns
+    -------
+    int
+        The resident set size in KB.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run_isolated(target: Callable[..., None], *args, timeout: Optional[float] = None) -> Any:
+    """
+    Runs a benchmark case in a fresh process and returns its result.
+
+    The memory figures of the case then only reflect it. The case receives
+    a queue as its last argument, and must put its result in it.
+
+    Parameters
+    ----------
+    target : Callable[..., None]
+        The function running the case, defined at module level.
+    *args : Any
+        The arguments of `target`, without the result queue.
+    timeout : float, optional
+        The maximum number of seconds to wait for the result (default is
+        `None`, no limit).
+
+    Returns
+    -------
+    Any
+        The result put in the queue by the case.
+
+    Raises
+    ------
+    RuntimeError
+        If the process exited without a result, e.g. because it crashed.
+    TimeoutError
+        If the result did not arrive in time.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            # the process may have put its result just before exiting
+            exited = not process.is_alive()
+            try:
+                result = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if exited:
+                    raise RuntimeError(f"The benchmark process exited with status {process.exitcode}")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"The benchmark process gave no result after {timeout} s")
+    except BaseException:
+        process.kill()
+        process.join()
+        raise
+    process.join()
+    return result
+
+
+def run_metadata() -> dict:
+    """
+    Describes the environment of a run, so that results are compared fairly.
+
+    Returns
+    -------
+    dict
+        The git commit, Python and torch versions, CPU count and number of
+        torch threads.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpu_count": os.cpu_count(),
+        "threads": torch.get_num_threads(),
+    }
+
+
+def save_results(path: str, results: dict, **meta) -> None:
+    """
+    Writes the results of a run to a JSON file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the JSON file.
+    results : dict
+        The metrics of each benchmark case.
+    **meta : Any
+        The options of the run, stored with the environment metadata.
+    """
+    with open(path, "w") as f:
+        json.dump({"meta": {**run_metadata(), **meta}, "results": results}, f, indent=2)
+
+
+def compare_with_baseline(results: dict, baseline_path: str, tolerance: float = 0.1) -> int:
+    """
+    Prints the change of every metric with respect to a baseline run.
+
+    Parameters
+    ----------
+    results : dict
+        The metrics of each benchmark case of the current run.
+    baseline_path : str
+        The JSON file written by `save_results` for the baseline run.
+    tolerance : float, optional
+        The relative change tolerated before a latency or throughput is
+        flagged as a regression (default is 0.1, i.e. 10%).
+
+    Returns
+    -------
+    int
+        The number of regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = 0
+    print(f"\n{'case':<32}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(case, {}).get(metric)
+            change = relative_change(reference, value)
+            if change is None:
+                continue
+            regressed = ((metric.endswith("_ms") and change > tolerance)
+                         or (metric.endswith("_per_s") and change < -tolerance))
+            regressions += regressed
+            print(f"{case:<32}{metric:<16}{reference:>12.2f}{value:>12.2f}{change:>+10.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regression(s) above {tolerance:.0%}")
+    return regressions
+
+
+def relative_change(reference: Optional[float], value) -> Optional[float]:
+    """
+    Computes the relative change of a numeric metric.
+
+    Parameters
+    ----------
+    reference : float or None
+        The value in the baseline run, if any.
+    value : Any
+        The value in the current run.
+
+    Returns
+    -------
+    float or None
+        The relative change, or `None` if the metric cannot be compared.
+    """
+    if not isinstance(reference, (int, float)) or not isinstance(value, (int, float)) or not reference:
+        return None
+    return (value - reference) / reference
@@ -1,18 +1,126 @@
+import asyncio
+import functools
+import hashlib
 import json
-from fastapi import FastAPI, Request, UploadFile, File, BackgroundTasks, HTTPException
-from fastapi.responses import HTMLResponse
+import time
+from typing import Iterable, Optional
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.routing import Mount
 from starlette.responses import JSONResponse
 
+from app.catalog import ImageCatalog
 from app.config import Configuration
 from app.forms.classification_form import EditedImageForm, UploadedImageForm
-from app.ml.classification_utils import classify_image, store_uploaded_image
-from app.utils import list_images, edit_image, remove_file_after_time, get_filename
+from app.histograms import dataset_histogram, edited_histogram, histogram_to_dict
+from app.janitor import ArtifactJanitor
+from app.jobs import DONE, FAILED, QUEUED, JobSupervisor, open_job_queue
+from app.metrics import CONTENT_TYPE, current_endpoint, render_samples, stage_metrics, stage_timer
+from app.ml.inference_executor import InferenceExecutor, InferenceQueueFullError, InferenceTimeoutError
+from app.ml.result_cache import ResultCache, model_variant, open_result_cache
+from app.startup import StartupMonitor, process_age
+from app.uploads import UploadRejectedError, store_uploaded_image
+from app.utils import EDITED_PREFIX, atomic_write, new_artifact_id, render_edited_image
 import os
+from urllib.parse import urlencode
 
-app = FastAPI()
 config = Configuration()
+inference_executor = InferenceExecutor(
+    kind=config.inference_executor,
+    max_workers=config.inference_workers,
+    max_queue=config.inference_queue_size,
+    timeout=config.inference_timeout,
+)
+result_cache = open_result_cache(config.result_cache_size)
+image_catalog = ImageCatalog(config.image_folder_path)
+janitor = ArtifactJanitor(
+    (config.upload_folder_path, config.edit_folder_path),
+    ttl=config.artifact_ttl,
+    interval=config.artifact_sweep_interval,
+    high_water_mb=config.artifact_high_water_mb,
+)
+job_queue = open_job_queue()
+job_supervisor = JobSupervisor(job_queue, config.job_workers, ttl=config.job_ttl)
+startup = StartupMonitor(config.live_budget, config.ready_budget)
+
+
+app_prepared = False
+
+
+def prepare_app(preload_models: Iterable[str] = ()) -> None:
+    """
+    Runs the startup work shared by all the processes serving the app.
+
+    The artifacts left behind by a previous process are removed, except the
+    uploaded images of the unfinished jobs, the image catalog is indexed and
+    the given models are loaded without running them, which imports the ML
+    stack. The pre-fork launcher (`serve.py`) calls it once in the parent
+    process, so that its workers inherit the catalog and share the weights;
+    otherwise `lifespan` calls it, with no models.
+
+    Parameters
+    ----------
+    preload_models : Iterable[str], optional
+        The models to be loaded (default is none).
+    """
+    global app_prepared
+    for payload in job_queue.unfinished_payloads():
+        if payload["source"] == "upload":
+            janitor.schedule(os.path.join(config.upload_folder_path, payload["image_id"]), ttl=config.job_ttl)
+    janitor.sweep_orphans()
+    image_catalog.refresh()
+    preload_models = list(preload_models)
+    if preload_models:
+        from app.ml.classification_utils import model_registry
+        model_registry.preload(preload_models)
+    app_prepared = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts serving at once, preparing the resident models in the background.
+
+    Unless `prepare_app` already ran in a parent process, the artifacts
+    left behind by a previous process are removed and the image catalog is
+    indexed. The ML stack is then imported by a background thread, which
+    sizes the torch thread pools and loads the models listed in
+    `Configuration.warm_up_models`, pre-warming them with a dummy forward
+    pass, so that the first classification does not pay for loading the
+    weights; `/health/ready` reports its progress. The janitor starts
+    sweeping expired artifacts, and the job workers are started unless a
+    parent process already started them.
+
+    Parameters
+    ----------
+    app : FastAPI
+        The application being started.
+    """
+    if not app_prepared:
+        prepare_app()
+    startup.start(config.warm_up_models, config.input_sizes, config.intra_op_threads, config.inter_op_threads)
+    janitor_task = asyncio.create_task(janitor.run())
+    supervise_jobs = not job_supervisor.started
+    if supervise_jobs:
+        job_supervisor.start()
+        jobs_task = asyncio.create_task(job_supervisor.run())
+    startup.mark_live()
+    yield
+    janitor_task.cancel()
+    if supervise_jobs:
+        jobs_task.cancel()
+        job_supervisor.stop()
+    inference_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount(
     "/static",
@@ -22,24 +130,678 @@ app.mount(
 templates = Jinja2Templates(directory="app/templates")
 
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Rejects uploads whose declared size is above the limit before reading them.
+
+    The check relies on the `Content-Length` header, so the body of an
+    oversized request is never parsed. Uploads without the header are still
+    capped while being stored by `store_uploaded_image`.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming HTTP request.
+    call_next : Callable
+        The next handler of the request.
+
+    Returns
+    -------
+    Response
+        A 413 response for oversized uploads, otherwise the response of the app.
+    """
+    if request.method == "POST":
+        content_length = request.headers.get("content-length", "")
+        # leave some room for the multipart boundaries and the other form fields
+        max_files = config.batch_max_images if request.url.path == "/batch" else 1
+        max_bytes = max_files * config.max_upload_size_mb * 1024 * 1024 + 64 * 1024
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload exceeds the limit of {config.max_upload_size_mb} MB."},
+            )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Times every request and labels the stages it runs with its endpoint.
+
+    Requests to unknown paths (and to the static files) are labelled
+    "other", so that the number of histograms stays bounded.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming HTTP request.
+    call_next : Callable
+        The next handler of the request.
+
+    Returns
+    -------
+    Response
+        The response of the app.
+    """
+    path = request.url.path
+    endpoint = path if path in route_paths() else "other"
+    token = current_endpoint.set(endpoint)
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        stage_metrics.observe("request", time.perf_counter() - start, endpoint=endpoint)
+        current_endpoint.reset(token)
+
+
+@functools.lru_cache(maxsize=None)
+def route_paths() -> frozenset:
+    """
+    Returns the paths of the routes of the app.
+
+    Returns
+    -------
+    frozenset of str
+        The paths used as endpoint labels of the metrics.
+    """
+    return frozenset(route.path for route in app.routes if not isinstance(route, Mount))
+
+
+async def run_inference(func, *args, **kwargs):
+    """
+    Runs a blocking editing or classification call in the inference executor.
+
+    Parameters
+    ----------
+    func : Callable
+        The blocking function to run.
+    *args : Any
+        Positional arguments for `func`.
+    **kwargs : Any
+        Keyword arguments for `func`.
+
+    Returns
+    -------
+    Any
+        The value returned by `func`.
+
+    Raises
+    ------
+    HTTPException
+        With status 503 if the inference queue is full, or 504 if the call
+        timed out.
+    """
+    try:
+        return await inference_executor.run(func, *args, **kwargs)
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(config.inference_retry_after)},
+        )
+    except InferenceTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+async def require_ml():
+    """
+    Returns the classification module, waiting for the startup to import it.
+
+    Returns
+    -------
+    ModuleType
+        The `app.ml.classification_utils` module.
+
+    Raises
+    ------
+    HTTPException
+        With status 503 if the ML stack is not imported within the
+        inference timeout, or could not be imported.
+    """
+    try:
+        return await startup.wait_ml(config.inference_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="The service is starting.",
+            headers={"Retry-After": str(config.inference_retry_after)},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"The ML stack is unavailable: {str(e)}")
+
+
+def cache_settings(model_id: str, edit_values: tuple, source: str = "dataset") -> str:
+    """
+    Describes the configuration settings that change a classification result.
+
+    The variant run for the model always matters, the enhancement engine
+    only when the image is edited, and the working size only for uploaded
+    images, which are downscaled to it.
+
+    Parameters
+    ----------
+    model_id : str
+        The identifier of the selected model.
+    edit_values : tuple of int
+        The color, brightness, contrast and sharpness values.
+    source : str, optional
+        The folder of the original image, either "dataset" (the default) or
+        "upload".
+
+    Returns
+    -------
+    str
+        The settings, to be part of the result cache key.
+    """
+    settings = [f"model={model_variant(model_id)}"]
+    if any(edit_values):
+        settings.append(f"engine={config.enhancement_engine}")
+    if source == "upload":
+        settings.append(f"working_size={config.upload_working_size}")
+    return ",".join(settings)
+
+
+def get_cache_key(image_path: str, model_id: str, edit_values: tuple, source: str = "dataset") -> str:
+    """
+    Builds the result cache key of a classification request.
+
+    The whole source image is read and hashed, so the handlers run it in
+    the thread pool rather than on the event loop.
+
+    Parameters
+    ----------
+    image_path : str
+        The file path of the source (unedited) image.
+    model_id : str
+        The identifier of the selected model.
+    edit_values : tuple of int
+        The color, brightness, contrast and sharpness values.
+    source : str, optional
+        The folder of the original image, either "dataset" (the default) or
+        "upload".
+
+    Returns
+    -------
+    str
+        The cache key.
+
+    Raises
+    ------
+    HTTPException
+        With status 404 if the source image does not exist.
+    """
+    try:
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+    except OSError:
+        raise HTTPException(status_code=404, detail=f"Image not found: {os.path.basename(image_path)}")
+    return ResultCache.make_key(image_bytes, model_id, *edit_values,
+                                cache_settings(model_id, edit_values, source))
+
+
+def preview_path(source: str, image_id: str, edit_values: tuple, endpoint: str = "/preview") -> str:
+    """
+    Returns the URL rendering an edited image on demand.
+
+    Parameters
+    ----------
+    source : str
+        The folder of the original image, either "dataset" or "upload".
+    image_id : str
+        The filename of the original image.
+    edit_values : tuple of int
+        The color, brightness, contrast and sharpness values.
+    endpoint : str, optional
+        The endpoint serving the edited image (default is "/preview");
+        "/histogram" serves its histogram instead.
+
+    Returns
+    -------
+    str
+        The URL of the endpoint for the edited image.
+    """
+    color_value, brightness_value, contrast_value, sharpness_value = edit_values
+    return f"{endpoint}?" + urlencode({
+        "source": source,
+        "image_id": image_id,
+        "color_value": color_value,
+        "brightness_value": brightness_value,
+        "contrast_value": contrast_value,
+        "sharpness_value": sharpness_value,
+    })
+
+
+def save_jpeg(image: Image.Image, image_path: str) -> None:
+    """
+    Atomically saves an image as JPEG.
+
+    Parameters
+    ----------
+    image : Image.Image
+        The image to be saved.
+    image_path : str
+        The file path of the JPEG file.
+    """
+    with stage_timer("encode"), atomic_write(image_path) as f:
+        image.save(f, format="JPEG")
+
+
+async def display_edited_image(edited_image: Image.Image,
+                               source: str,
+                               image_id: str,
+                               edit_values: tuple) -> str:
+    """
+    Returns the URL displaying an edited image.
+
+    By default the edited image is not encoded here: the page loads it from
+    the `/preview` endpoint, which renders it on demand. If
+    `Configuration.store_edited_images` is set, the image is encoded to the
+    edited folder instead and scheduled for deletion.
+
+    Parameters
+    ----------
+    edited_image : Image.Image
+        The edited image.
+    source : str
+        The folder of the original image, either "dataset" or "upload".
+    image_id : str
+        The filename of the original image.
+    edit_values : tuple of int
+        The color, brightness, contrast and sharpness values.
+
+    Returns
+    -------
+    str
+        The URL of the edited image.
+    """
+    if not config.store_edited_images:
+        return preview_path(source, image_id, edit_values)
+
+    os.makedirs(config.edit_folder_path, exist_ok=True)
+    edited_image_name = new_artifact_id(EDITED_PREFIX, ".jpg")
+    edited_image_path = os.path.join(config.edit_folder_path, edited_image_name)
+
+    try:
+        await run_inference(save_jpeg, edited_image, edited_image_path)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving edited image: {str(e)}")
+    janitor.schedule(edited_image_path)
+
+    return f"/static/edited/{edited_image_name}"
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a strong ETag from the values a response depends on.
+
+    Parameters
+    ----------
+    *parts : Any
+        The values identifying the content of the response.
+
+    Returns
+    -------
+    str
+        The quoted ETag.
+    """
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Checks whether the client already holds the current version of a response.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, possibly carrying an `If-None-Match` header.
+    etag : str
+        The ETag of the current version of the response.
+
+    Returns
+    -------
+    bool
+        `True` if the response can be answered with 304 Not Modified.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
 @app.get("/info")
-def info() -> dict[str, list[str]]:
+def info(request: Request,
+         offset: int = Query(0, ge=0),
+         limit: Optional[int] = Query(None, ge=1, le=config.info_max_limit),
+         prefix: Optional[str] = None,
+         label: Optional[str] = None):
     """
     Retrieves available models and images.
 
     This function compiles a list of preconfigured model names and available
-    image files, returning them in a structured dictionary format.
+    image files, returning them in a structured dictionary format. The images
+    come from the cached image catalog and can be paginated and filtered.
+    The response carries an ETag, so polling clients sending it back in
+    `If-None-Match` get an empty 304 response while nothing changed.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request object.
+    offset : int
+        The number of matching images to skip, at least 0.
+    limit : int, optional
+        The maximum number of images returned, between 1 and
+        `info_max_limit` (default is `None`, all).
+    prefix : str, optional
+        Only return images whose filename starts with this prefix.
+    label : str, optional
+        Only return images whose class label contains this text.
 
     Returns
     -------
-    dict[str, list[str]]
+    JSONResponse
         A dictionary containing:
         - "models": A list of available model names.
         - "images": A list of available image filenames.
+        - "total": The number of images matching the filters.
     """
-    list_of_images = list_images()
-    list_of_models = Configuration.models
-    return {"models": list_of_models, "images": list_of_images}
+    image_catalog.refresh()
+    etag = make_etag(image_catalog.version, Configuration.models, offset, limit, prefix, label)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    entries, total = image_catalog.query(offset, limit, prefix, label)
+    list_of_images = [entry.filename for entry in entries]
+    list_of_models = list(Configuration.models)
+    return JSONResponse(
+        {"models": list_of_models, "images": list_of_images, "total": total},
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/info/images")
+def info_images(request: Request,
+                offset: int = Query(0, ge=0),
+                limit: int = Query(100, ge=1, le=config.info_max_limit),
+                prefix: Optional[str] = None,
+                label: Optional[str] = None):
+    """
+    Retrieves the metadata of the available images.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request object.
+    offset : int
+        The number of matching images to skip, at least 0.
+    limit : int, optional
+        The maximum number of images returned, between 1 and
+        `info_max_limit` (default is 100).
+    prefix : str, optional
+        Only return images whose filename starts with this prefix.
+    label : str, optional
+        Only return images whose class label contains this text.
+
+    Returns
+    -------
+    JSONResponse
+        A dictionary containing the total number of matches and, for each
+        image of the page, its filename, label, width, height and byte size.
+    """
+    image_catalog.refresh()
+    etag = make_etag("images", image_catalog.version, offset, limit, prefix, label)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    entries, total = image_catalog.query(offset, limit, prefix, label)
+    return JSONResponse(
+        {"total": total, "offset": offset, "images": [entry._asdict() for entry in entries]},
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/info/batching")
+def info_batching() -> dict:
+    """
+    Reports the micro-batching statistics of each model.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each model that served requests to its
+        configured batching knobs, number of batches and images, mean
+        batch size and histogram of achieved batch sizes.
+    """
+    ml = startup.ml
+    return ml.batching_stats() if ml is not None else {}
+
+
+@app.get("/info/cache")
+def info_cache() -> dict:
+    """
+    Reports the counters of the classification result cache.
+
+    Returns
+    -------
+    dict
+        The memory hits, disk hits, misses, hit rate and number of cached results.
+    """
+    return result_cache.stats()
+
+
+@app.get("/health/live")
+def health_live() -> dict:
+    """
+    Reports that the process serves requests (liveness probe).
+
+    Answers as soon as the web layer started, before the ML stack is
+    imported.
+
+    Returns
+    -------
+    dict
+        The startup phase and the age of the process in seconds.
+    """
+    return {"status": "alive", "phase": startup.phase, "uptime": round(process_age(), 3)}
+
+
+@app.get("/health/ready")
+def health_ready() -> JSONResponse:
+    """
+    Reports whether the models are warm and the app can take traffic (readiness probe).
+
+    Returns
+    -------
+    JSONResponse
+        The progress of the startup (see `StartupMonitor.status`): the
+        phase, the state of each warmed up model, the resident models and
+        the measured startup durations, with status 200 once ready and 503
+        before.
+    """
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """
+    Exposes the service metrics in the Prometheus text format.
+
+    Besides the latency histograms of every request stage, labelled by
+    endpoint and model, the response reports the depth of the inference and
+    batching queues, the inferences in flight, the result cache lookups, the
+    classification jobs by state, the resident models and the disk usage of
+    the temporary artifacts.
+
+    Returns
+    -------
+    Response
+        The metrics as plain text.
+    """
+    ml = startup.ml
+    running = inference_executor.running
+    cache = result_cache.stats()
+    batching = ml.batching_stats() if ml is not None else {}
+    lines = stage_metrics.render()
+    lines += render_samples(
+        "classifier_inference_queue_depth", "Calls waiting for a free inference worker.",
+        {(): max(0, inference_executor.pending - running)},
+    )
+    lines += render_samples(
+        "classifier_inference_in_flight", "Calls being run by the inference workers.",
+        {(): running},
+    )
+    lines += render_samples(
+        "classifier_batch_queue_depth", "Images waiting for the next batch of each model.",
+        {(("model", model_id),): stats["queued"] for model_id, stats in batching.items()},
+    )
+    lines += render_samples(
+        "classifier_batch_images_total", "Images classified through the batching scheduler of each model.",
+        {(("model", model_id),): stats["images"] for model_id, stats in batching.items()},
+        kind="counter",
+    )
+    lines += render_samples(
+        "classifier_result_cache_lookups_total", "Result cache lookups by outcome.",
+        {(("result", "memory_hit"),): cache["hits"],
+         (("result", "disk_hit"),): cache["disk_hits"],
+         (("result", "miss"),): cache["misses"]},
+        kind="counter",
+    )
+    lines += render_samples(
+        "classifier_result_cache_hit_ratio", "Fraction of the result cache lookups served from a cache tier.",
+        {(): cache["hit_rate"]},
+    )
+    lines += render_samples(
+        "classifier_result_cache_entries", "Results held in the memory tier of the cache.",
+        {(): cache["entries"]},
+    )
+    lines += render_samples(
+        "classifier_jobs", "Classification jobs by state.",
+        {(("state", state),): count for state, count in job_queue.counts().items()},
+    )
+    lines += render_samples(
+        "classifier_models_loaded", "Models resident in the model registry.",
+        {(): len(ml.model_registry.loaded_models()) if ml is not None else 0},
+    )
+    lines += render_samples(
+        "classifier_model_memory_bytes", "Memory used by the weights of the resident models.",
+        {(): ml.model_registry.memory_usage() if ml is not None else 0},
+    )
+    lines += render_samples(
+        "classifier_artifacts", "Uploaded and edited images waiting for deletion.",
+        {(): janitor.pending()},
+    )
+    lines += render_samples(
+        "classifier_artifact_disk_bytes", "Disk space used by the uploaded and edited images.",
+        {(): janitor.disk_usage()},
+    )
+    return Response(content="\n".join(lines) + "\n", media_type=CONTENT_TYPE)
+
+
+@app.get("/preview")
+async def preview(source: str,
+                  image_id: str,
+                  color_value: int = 0,
+                  brightness_value: int = 0,
+                  contrast_value: int = 0,
+                  sharpness_value: int = 0):
+    """
+    Renders an edited image on demand.
+
+    Edited images are classified in memory and never written to disk, so
+    this endpoint encodes them for display only when the page requests them.
+
+    Parameters
+    ----------
+    source : str
+        The folder of the original image, either "dataset" or "upload".
+    image_id : str
+        The filename of the original image.
+    color_value : int
+        The color adjustment value (-100 to 100).
+    brightness_value : int
+        The brightness adjustment value (-100 to 100).
+    contrast_value : int
+        The contrast adjustment value (-100 to 100).
+    sharpness_value : int
+        The sharpness adjustment value (-100 to 100).
+
+    Returns
+    -------
+    Response
+        The edited image encoded as JPEG.
+    """
+    folders = {"dataset": config.image_folder_path, "upload": config.upload_folder_path}
+    if source not in folders:
+        raise HTTPException(status_code=404, detail=f"Unknown image source: {source}")
+
+    image_path = os.path.join(folders[source], os.path.basename(image_id))
+    if not os.path.exists(image_path):
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+
+    edit_values = [max(-100, min(value, 100))
+                   for value in (color_value, brightness_value, contrast_value, sharpness_value)]
+    working_size = config.upload_working_size if source == "upload" else None
+    content = await run_inference(render_edited_image, image_path, *edit_values, working_size)
+    return Response(content=content, media_type="image/jpeg")
+
+
+@app.get("/histogram")
+async def image_histogram(source: str,
+                          image_id: str,
+                          color_value: int = 0,
+                          brightness_value: int = 0,
+                          contrast_value: int = 0,
+                          sharpness_value: int = 0) -> dict:
+    """
+    Returns the exact color histogram of an original or edited image.
+
+    The histograms of the unedited dataset images are precomputed by
+    `prepare_tensors.py`; the other ones are computed with NumPy over every
+    pixel of the image, at the resolution it is displayed at.
+
+    Parameters
+    ----------
+    source : str
+        The folder of the original image, either "dataset" or "upload".
+    image_id : str
+        The filename of the original image.
+    color_value : int
+        The color adjustment value (-100 to 100).
+    brightness_value : int
+        The brightness adjustment value (-100 to 100).
+    contrast_value : int
+        The contrast adjustment value (-100 to 100).
+    sharpness_value : int
+        The sharpness adjustment value (-100 to 100).
+
+    Returns
+    -------
+    dict
+        The 256 pixel counts of each channel, keyed by "red", "green" and "blue".
+    """
+    folders = {"dataset": config.image_folder_path, "upload": config.upload_folder_path}
+    if source not in folders:
+        raise HTTPException(status_code=404, detail=f"Unknown image source: {source}")
+
+    image_path = os.path.join(folders[source], os.path.basename(image_id))
+    if not os.path.exists(image_path):
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+
+    edit_values = [max(-100, min(value, 100))
+                   for value in (color_value, brightness_value, contrast_value, sharpness_value)]
+    if source == "dataset" and not any(edit_values):
+        counts = await run_inference(dataset_histogram, image_id)
+    else:
+        # edited uploads are displayed at the working size, see `/preview`
+        working_size = config.upload_working_size if source == "upload" and any(edit_values) else None
+        counts = await run_inference(edited_histogram, image_path, *edit_values, working_size)
+    return histogram_to_dict(counts)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -86,27 +848,26 @@ def editor_get(request: Request):
         "editor_select.html",
         {
             "request": request,
-            "images": list_images(),
+            "images": image_catalog.filenames(),
             "models": Configuration.models
         },
     )
 
 
 @app.post("/editor", response_class=HTMLResponse)
-async def editor_post(request: Request, background_tasks: BackgroundTasks):
+async def editor_post(request: Request):
     """
     Processes edited image classification.
 
     This function handles POST requests to the `/editor` endpoint.
     It collects parameters from the form on the "editor_select.html" page,
-    processes the image using `edit_image()`, and classifies the edited image.
+    enhances the image in memory and classifies it using `edit_and_classify()`,
+    once the background startup imported the ML stack.
 
     Parameters
     ----------
     request : Request
         The HTTP request containing form data.
-    background_tasks : BackgroundTasks
-        A FastAPI background task manager for deferred file deletion.
 
     Returns
     -------
@@ -114,43 +875,54 @@ async def editor_post(request: Request, background_tasks: BackgroundTasks):
         The rendered "editor_output.html" page with classification results.
     """
     form = EditedImageForm(request)
-    await form.load_data()
+    with stage_timer("parse_form"):
+        await form.load_data()
 
     if not form.is_valid():
         return {"errors": form.errors}
 
-    original_image_path = f"app/static/imagenet_subset/{form.image_id}"
+    original_image_path = os.path.join(config.image_folder_path, os.path.basename(form.image_id))
+    edit_values = (form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value)
 
-    if any([form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value]):
-        edited_image_directory = "app/static/edited/"
-        edited_image_name = get_filename(edited_image_directory, form.image_id)
-        edited_image_path = os.path.join(edited_image_directory, edited_image_name)
+    cache_key = await run_in_threadpool(get_cache_key, original_image_path, form.model_id, edit_values)
+    cached_scores = await run_in_threadpool(result_cache.get, cache_key)
+    if cached_scores is not None:
+        return templates.TemplateResponse(
+            "editor_output.html",
+            {
+                "request": request,
+                "image_id": form.image_id,
+                "image_path": (preview_path("dataset", form.image_id, edit_values) if any(edit_values)
+                               else f"/static/imagenet_subset/{form.image_id}"),
+                "classification_scores": json.dumps(cached_scores),
+                "histogram_url": preview_path("dataset", form.image_id, edit_values, "/histogram"),
+            },
+        )
 
+    ml = await require_ml()
+    if any(edit_values):
         try:
-            edit_image(
-                original_image_path,
-                form.color_value,
-                form.brightness_value,
-                form.contrast_value,
-                form.sharpness_value,
-                edited_image_path
+            classification_scores, edited_image, histogram = await run_inference(
+                ml.edit_and_classify, form.model_id, original_image_path, *edit_values
             )
+        except HTTPException:
+            raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error editing image: {str(e)}")
-        try:
-            classification_scores = classify_image(model_id=form.model_id, img_id=edited_image_name)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error classifying image: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error classifying edited image: {str(e)}")
+        await run_in_threadpool(result_cache.put, cache_key, classification_scores)
 
-        background_tasks.add_task(remove_file_after_time, edited_image_path)
+        image_path = await display_edited_image(
+            edited_image, "dataset", form.image_id, edit_values
+        )
 
         return templates.TemplateResponse(
             "editor_output.html",
             {
                 "request": request,
-                "image_id": edited_image_name,
-                "image_path": f"/static/edited/{edited_image_name}",
+                "image_id": form.image_id,
+                "image_path": image_path,
                 "classification_scores": json.dumps(classification_scores),
+                "histogram": json.dumps(histogram_to_dict(histogram)),
             },
         )
 
@@ -158,9 +930,14 @@ async def editor_post(request: Request, background_tasks: BackgroundTasks):
     model_id = form.model_id
 
     try:
-        classification_scores = classify_image(model_id=model_id, img_id=image_id)
+        classification_scores = await run_inference(
+            ml.classify_dataset_image, model_id=model_id, image_id=image_id
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error classifying original image: {str(e)}")
+    await run_in_threadpool(result_cache.put, cache_key, classification_scores)
 
     return templates.TemplateResponse(
         "editor_output.html",
@@ -169,6 +946,7 @@ async def editor_post(request: Request, background_tasks: BackgroundTasks):
             "image_id": image_id,
             "image_path": f"/static/imagenet_subset/{image_id}",
             "classification_scores": json.dumps(classification_scores),
+            "histogram_url": preview_path("dataset", image_id, edit_values, "/histogram"),
         },
     )
 
@@ -203,7 +981,7 @@ def upload_get(request: Request):
 
 
 @app.post("/upload")
-async def upload_post(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_post(request: Request, file: UploadFile = File(...)):
     """
     Handles image upload and classification.
 
@@ -215,8 +993,6 @@ async def upload_post(request: Request, background_tasks: BackgroundTasks, file:
     ----------
     request : Request
         The HTTP request containing form data.
-    background_tasks : BackgroundTasks
-        A FastAPI background task manager for deferred file deletion.
     file : UploadFile
         The image file uploaded by the user.
 
@@ -226,55 +1002,64 @@ async def upload_post(request: Request, background_tasks: BackgroundTasks, file:
         The rendered template displaying classification results.
     """
     form = UploadedImageForm(file=file, request=request)
-    await form.load_data()
+    with stage_timer("parse_form"):
+        await form.load_data()
 
     if not form.is_valid():
         return {"errors": form.errors}
 
-    original_image_directory = "app/static/uploads/"
-    os.makedirs(original_image_directory, exist_ok=True)
-
     try:
-        filename = store_uploaded_image(form.file)
+        with stage_timer("store_upload"):
+            filename = await run_in_threadpool(store_uploaded_image, form.file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving uploaded file: {str(e)}")
 
-    original_image_path = os.path.join(original_image_directory, filename)
-
-    if any([form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value]):
-        edited_image_directory = "app/static/edited/"
-        os.makedirs(edited_image_directory, exist_ok=True)
+    original_image_path = os.path.join(config.upload_folder_path, filename)
+    janitor.schedule(original_image_path)
+    edit_values = (form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value)
 
-        edited_image_name = get_filename(edited_image_directory, filename)
-        edited_image_path = os.path.join(edited_image_directory, edited_image_name)
+    cache_key = await run_in_threadpool(get_cache_key, original_image_path, form.model_id, edit_values, "upload")
+    cached_scores = await run_in_threadpool(result_cache.get, cache_key)
+    if cached_scores is not None:
+        return templates.TemplateResponse(
+            "classification_upload_output.html",
+            {
+                "request": request,
+                "image_id": filename,
+                "image_path": (preview_path("upload", filename, edit_values) if any(edit_values)
+                               else f"/static/uploads/{filename}"),
+                "classification_scores": json.dumps(cached_scores),
+                "histogram_url": preview_path("upload", filename, edit_values, "/histogram"),
+            },
+        )
 
+    ml = await require_ml()
+    if any(edit_values):
         try:
-            edit_image(
-                original_image_path,
-                form.color_value,
-                form.brightness_value,
-                form.contrast_value,
-                form.sharpness_value,
-                edited_image_path
+            classification_scores, edited_image, histogram = await run_inference(
+                ml.edit_and_classify, form.model_id, original_image_path, *edit_values,
+                config.upload_working_size
             )
+        except HTTPException:
+            raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error editing image: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error classifying edited image: {str(e)}")
+        await run_in_threadpool(result_cache.put, cache_key, classification_scores)
 
-        try:
-            classification_scores = classify_image(model_id=form.model_id, img_id=edited_image_name)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error classifying image: {str(e)}")
-
-        background_tasks.add_task(remove_file_after_time, original_image_path)
-        background_tasks.add_task(remove_file_after_time, edited_image_path)
+        image_path = await display_edited_image(
+            edited_image, "upload", filename, edit_values
+        )
 
         return templates.TemplateResponse(
             "classification_upload_output.html",
             {
                 "request": request,
-                "image_id": edited_image_name,
-                "image_path": f"/static/edited/{edited_image_name}",
+                "image_id": filename,
+                "image_path": image_path,
                 "classification_scores": json.dumps(classification_scores),
+                "histogram": json.dumps(histogram_to_dict(histogram)),
             },
         )
 
@@ -282,11 +1067,14 @@ async def upload_post(request: Request, background_tasks: BackgroundTasks, file:
     model_id = form.model_id
 
     try:
-        classification_scores = classify_image(model_id=model_id, img_id=image_id)
+        classification_scores = await run_inference(
+            ml.classify_uploaded_image, model_id=model_id, filename=image_id
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error classifying original image: {str(e)}")
-
-    background_tasks.add_task(remove_file_after_time, original_image_path)
+    await run_in_threadpool(result_cache.put, cache_key, classification_scores)
 
     return templates.TemplateResponse(
         "classification_upload_output.html",
@@ -295,5 +1083,542 @@ async def upload_post(request: Request, background_tasks: BackgroundTasks, file:
             "image_id": image_id,
             "image_path": f"/static/uploads/{image_id}",
             "classification_scores": json.dumps(classification_scores),
+            "histogram_url": preview_path("upload", image_id, edit_values, "/histogram"),
         },
     )
+
+
+async def read_batch_request(request: Request) -> tuple[list, list, list]:
+    """
+    Parses the body of a batch or ensemble classification request.
+
+    The body is either a JSON object with the "image_ids" and "model_ids"
+    lists, or a multipart form with repeated "image_ids", "model_ids" and
+    "files" fields, so that images can be uploaded along with the request.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request.
+
+    Returns
+    -------
+    tuple
+        The dataset image identifiers, the model identifiers and the
+        uploaded files.
+
+    Raises
+    ------
+    HTTPException
+        With status 400 if the body is malformed.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=config.batch_max_images)
+        image_ids = form.getlist("image_ids")
+        model_ids = form.getlist("model_ids")
+        files = [file for file in form.getlist("files") if isinstance(file, StarletteUploadFile)]
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="The request body is not valid JSON.")
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail="The request body must be a JSON object.")
+        image_ids = body.get("image_ids", [])
+        model_ids = body.get("model_ids", [])
+        files = []
+
+    for name, values in (("image_ids", image_ids), ("model_ids", model_ids)):
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise HTTPException(status_code=400, detail=f"{name} must be a list of strings.")
+    return image_ids, model_ids, files
+
+
+def load_batch_inputs(items: list[dict], model_ids: list[str]) -> list[dict]:
+    """
+    Reads each image of a batch once, for all the requested models.
+
+    The cached results are looked up first, and the image is preprocessed
+    only for the input sizes of the models that still have to classify it.
+    The items are not modified, since with a process executor the changes
+    would not reach the caller.
+
+    Parameters
+    ----------
+    items : list of dict
+        The images of the batch, with their "source", "image_id" and "path".
+    model_ids : list of str
+        The identifiers of the requested models.
+
+    Returns
+    -------
+    list of dict
+        For each item, in the same order, the cache keys of its results
+        ("keys"), the cached results ("cached") and the preprocessed tensors
+        by input size ("tensors"), or the "error" and "status" that prevented
+        reading the image.
+    """
+    ml = startup.ml  # imported before the batch was accepted
+    inputs = []
+    for item in items:
+        try:
+            with open(item["path"], "rb") as f:
+                image_bytes = f.read()
+        except OSError:
+            inputs.append({"error": f"Image not found: {item['image_id']}", "status": 404})
+            continue
+
+        keys = {
+            model_id: ResultCache.make_key(image_bytes, model_id, 0, 0, 0, 0,
+                                           cache_settings(model_id, (0, 0, 0, 0), item["source"]))
+            for model_id in model_ids
+        }
+        cached = {model_id: result_cache.get(key) for model_id, key in keys.items()}
+        cached = {model_id: scores for model_id, scores in cached.items() if scores is not None}
+        inputs.append({"keys": keys, "cached": cached})
+        if len(cached) == len(model_ids):
+            continue
+
+        sizes = {ml.input_size(model_id) for model_id in model_ids if model_id not in cached}
+        try:
+            if item["source"] == "upload":
+                inputs[-1]["tensors"] = ml.preprocess_uploaded_image(item["image_id"], sizes)
+            else:
+                inputs[-1]["tensors"] = ml.preprocess_dataset_image(item["image_id"], sizes)
+        except Exception as e:
+            inputs[-1] = {"error": f"Error reading image: {str(e)}", "status": 500}
+    return inputs
+
+
+def batch_result(item: dict, model_id: str, **fields) -> str:
+    """
+    Formats a result of a batch request as one line of NDJSON.
+
+    Parameters
+    ----------
+    item : dict
+        The image of the batch.
+    model_id : str
+        The identifier of the model.
+    **fields : Any
+        The result fields, either "scores" or "error" and "status".
+
+    Returns
+    -------
+    str
+        The JSON object of the result, followed by a newline.
+    """
+    result = {"index": item["index"], "source": item["source"], "image_id": item["image_id"]}
+    if "filename" in item:
+        result["filename"] = item["filename"]
+    return json.dumps({**result, "model_id": model_id, **fields}) + "\n"
+
+
+@app.post("/batch")
+async def batch_post(request: Request):
+    """
+    Classifies several images with several models in one request.
+
+    The request lists dataset images ("image_ids"), uploaded files
+    ("files") and models ("model_ids"); every image is classified with
+    every model. Each image is read and preprocessed once for all the
+    models. The work is then grouped by model: the images of a model are
+    classified in batches of its `max_batch_size`, one model after the
+    other, so each model is loaded once per request.
+
+    The results are streamed as NDJSON, one line per image and model, as
+    soon as their batch finishes. Cached results come first. A line holds
+    either the top-5 "scores" or an "error" with its HTTP "status", so
+    a failing image does not abort the rest of the batch.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, with a JSON or multipart body.
+
+    Returns
+    -------
+    StreamingResponse
+        The `application/x-ndjson` stream of results.
+    """
+    image_ids, model_ids, files = await read_batch_request(request)
+
+    if not model_ids:
+        raise HTTPException(status_code=400, detail="At least one model_id is required.")
+    unknown_models = [model_id for model_id in model_ids if model_id not in config.models]
+    if unknown_models:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown_models)}")
+    model_ids = list(dict.fromkeys(model_ids))
+    if not image_ids and not files:
+        raise HTTPException(status_code=400, detail="At least one image_id or file is required.")
+    if len(image_ids) + len(files) > config.batch_max_images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch holds at most {config.batch_max_images} images.",
+        )
+
+    ml = await require_ml()
+    items = [
+        {"source": "dataset", "image_id": image_id,
+         "path": os.path.join(config.image_folder_path, os.path.basename(image_id))}
+        for image_id in image_ids
+    ]
+    for file in files:
+        item = {"source": "upload", "filename": file.filename, "image_id": None}
+        try:
+            item["image_id"] = await run_in_threadpool(store_uploaded_image, file)
+        except UploadRejectedError as e:
+            item["error"], item["status"] = str(e), e.status_code
+        except Exception as e:
+            item["error"], item["status"] = f"Error saving uploaded file: {str(e)}", 500
+        finally:
+            await file.close()
+        if "error" not in item:
+            item["path"] = os.path.join(config.upload_folder_path, item["image_id"])
+            janitor.schedule(item["path"])
+        items.append(item)
+    for index, item in enumerate(items):
+        item["index"] = index
+
+    readable = [item for item in items if "error" not in item]
+    for item, inputs in zip(readable, await run_inference(load_batch_inputs, readable, model_ids)):
+        item.update(inputs)
+
+    async def stream_results():
+        for item in items:
+            if "error" in item:
+                for model_id in model_ids:
+                    yield batch_result(item, model_id, error=item["error"], status=item["status"])
+                continue
+            for model_id, scores in item["cached"].items():
+                yield batch_result(item, model_id, scores=scores)
+
+        for model_id in model_ids:
+            pending = [item for item in items if "tensors" in item and model_id not in item["cached"]]
+            batch_size = ml.batching_options(model_id)["max_batch_size"]
+            size = ml.input_size(model_id)
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                try:
+                    results = await run_inference(
+                        ml.classify_tensors, model_id, [item["tensors"][size] for item in chunk]
+                    )
+                except HTTPException as e:
+                    for item in chunk:
+                        yield batch_result(item, model_id, error=e.detail, status=e.status_code)
+                    continue
+                except Exception as e:
+                    for item in chunk:
+                        yield batch_result(item, model_id, error=f"Error classifying image: {str(e)}",
+                                           status=500)
+                    continue
+
+                for item, scores in zip(chunk, results):
+                    await run_in_threadpool(result_cache.put, item["keys"][model_id], scores)
+                    yield batch_result(item, model_id, scores=scores)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post("/ensemble")
+async def ensemble_post(request: Request, top_k: int = 5):
+    """
+    Classifies one image with several models and fuses their predictions.
+
+    The body names one dataset image ("image_ids") or carries one uploaded
+    file ("files"), and optionally the models of the ensemble ("model_ids",
+    all the configured models by default), in the same formats as `/batch`.
+    The image is decoded once and preprocessed once per distinct input size
+    (e.g. 299 for inception_v3), then all the models run concurrently.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, with a JSON or multipart body.
+    top_k : int
+        The number of classes returned for each model and for the ensemble.
+
+    Returns
+    -------
+    dict
+        The image identifier, the top-k results of each model ("models")
+        and the top-k results of the averaged probabilities ("ensemble").
+    """
+    image_ids, model_ids, files = await read_batch_request(request)
+
+    model_ids = list(dict.fromkeys(model_ids)) or list(config.models)
+    unknown_models = [model_id for model_id in model_ids if model_id not in config.models]
+    if unknown_models:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown_models)}")
+    if len(image_ids) + len(files) != 1:
+        raise HTTPException(status_code=400, detail="Exactly one image_id or file is required.")
+    if not 1 <= top_k <= config.ensemble_max_top_k:
+        raise HTTPException(
+            status_code=400,
+            detail=f"top_k must be between 1 and {config.ensemble_max_top_k}.",
+        )
+
+    ml = await require_ml()
+    sizes = {ml.input_size(model_id) for model_id in model_ids}
+    if files:
+        try:
+            image_id = await run_in_threadpool(store_uploaded_image, files[0])
+        except UploadRejectedError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error saving uploaded file: {str(e)}")
+        finally:
+            await files[0].close()
+        janitor.schedule(os.path.join(config.upload_folder_path, image_id))
+        source, preprocess = "upload", ml.preprocess_uploaded_image
+    else:
+        image_id = os.path.basename(image_ids[0])
+        if not os.path.exists(os.path.join(config.image_folder_path, image_id)):
+            raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+        source, preprocess = "dataset", ml.preprocess_dataset_image
+
+    try:
+        tensors = await run_inference(preprocess, image_id, sizes)
+        results = await run_inference(ml.classify_ensemble, model_ids, tensors, top_k)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error classifying image: {str(e)}")
+
+    return {"source": source, "image_id": image_id, **results}
+
+
+def job_status(job: dict) -> dict:
+    """
+    Describes a classification job to its client.
+
+    Parameters
+    ----------
+    job : dict
+        The job, as returned by `JobQueue.get`.
+
+    Returns
+    -------
+    dict
+        The identifier, state, current stage, number of attempts and last
+        error of the job, the URLs to follow it and, once it is done, its
+        "result": the classification scores, the URL of the (edited) image
+        and its histogram or the URL of the histogram.
+    """
+    status = {
+        "job_id": job["id"],
+        "state": job["state"],
+        "stage": job["stage"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events",
+    }
+    if job["state"] == DONE:
+        payload, result = job["payload"], job["result"]
+        source, image_id = payload["source"], payload["image_id"]
+        edit_values = tuple(payload["edit_values"])
+        folder = "uploads" if source == "upload" else "imagenet_subset"
+        status["result"] = {
+            "source": source,
+            "image_id": image_id,
+            "model_id": payload["model_id"],
+            "image_path": (preview_path(source, image_id, edit_values) if any(edit_values)
+                           else f"/static/{folder}/{image_id}"),
+            "classification_scores": result["classification_scores"],
+            "histogram": result["histogram"],
+            "histogram_url": preview_path(source, image_id, edit_values, "/histogram"),
+        }
+    return status
+
+
+async def submit_job(source: str, image_id: str, model_id: str, edit_values: tuple) -> JSONResponse:
+    """
+    Queues the edit and classification of an image.
+
+    A cached result is recorded as a finished job, without going through
+    the workers.
+
+    Parameters
+    ----------
+    source : str
+        The folder of the original image, either "dataset" or "upload".
+    image_id : str
+        The filename of the original image.
+    model_id : str
+        The identifier of the selected model.
+    edit_values : tuple of int
+        The color, brightness, contrast and sharpness values.
+
+    Returns
+    -------
+    JSONResponse
+        The status of the new job, with status 202.
+
+    Raises
+    ------
+    HTTPException
+        With status 503 if the queue is full, or 404 if the image does not
+        exist.
+    """
+    counts = await run_in_threadpool(job_queue.counts)
+    if counts[QUEUED] >= config.job_queue_size:
+        raise HTTPException(
+            status_code=503,
+            detail=f"The job queue is full ({config.job_queue_size} jobs).",
+            headers={"Retry-After": str(config.inference_retry_after)},
+        )
+
+    folder = config.upload_folder_path if source == "upload" else config.image_folder_path
+    cache_key = await run_in_threadpool(get_cache_key, os.path.join(folder, image_id), model_id, edit_values, source)
+    cached_scores = await run_in_threadpool(result_cache.get, cache_key)
+    payload = {
+        "source": source,
+        "image_id": image_id,
+        "model_id": model_id,
+        "edit_values": list(edit_values),
+        "cache_key": cache_key,
+    }
+    result = {"classification_scores": cached_scores, "histogram": None} if cached_scores is not None else None
+    job_id = await run_in_threadpool(job_queue.submit, "classify", payload, result)
+    job = await run_in_threadpool(job_queue.get, job_id)
+    return JSONResponse(status_code=202, content=job_status(job), headers={"Location": f"/jobs/{job_id}"})
+
+
+@app.post("/jobs/editor")
+async def editor_job_post(request: Request):
+    """
+    Queues the classification of an edited dataset image.
+
+    Takes the same form as `POST /editor`, but returns at once with the
+    identifier of the job instead of waiting for its result.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request containing form data.
+
+    Returns
+    -------
+    JSONResponse
+        The status of the new job, with status 202.
+    """
+    form = EditedImageForm(request)
+    with stage_timer("parse_form"):
+        await form.load_data()
+
+    if not form.is_valid():
+        return JSONResponse(status_code=400, content={"errors": form.errors})
+
+    edit_values = (form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value)
+    return await submit_job("dataset", os.path.basename(form.image_id), form.model_id, edit_values)
+
+
+@app.post("/jobs/upload")
+async def upload_job_post(request: Request, file: UploadFile = File(...)):
+    """
+    Queues the classification of an uploaded image.
+
+    Takes the same form as `POST /upload`, but returns at once with the
+    identifier of the job instead of waiting for its result. The uploaded
+    image is kept for `Configuration.job_ttl` seconds.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request containing form data.
+    file : UploadFile
+        The image file uploaded by the user.
+
+    Returns
+    -------
+    JSONResponse
+        The status of the new job, with status 202.
+    """
+    form = UploadedImageForm(file=file, request=request)
+    with stage_timer("parse_form"):
+        await form.load_data()
+
+    if not form.is_valid():
+        return JSONResponse(status_code=400, content={"errors": form.errors})
+
+    try:
+        with stage_timer("store_upload"):
+            filename = await run_in_threadpool(store_uploaded_image, form.file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving uploaded file: {str(e)}")
+    janitor.schedule(os.path.join(config.upload_folder_path, filename), ttl=config.job_ttl)
+
+    edit_values = (form.color_value, form.brightness_value, form.contrast_value, form.sharpness_value)
+    return await submit_job("upload", filename, form.model_id, edit_values)
+
+
+@app.get("/jobs/{job_id}")
+def job_get(job_id: str) -> dict:
+    """
+    Reports the state of a classification job, and its result once done.
+
+    Parameters
+    ----------
+    job_id : str
+        The identifier of the job.
+
+    Returns
+    -------
+    dict
+        The status of the job (see `job_status`).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Streams the progress of a classification job as server-sent events.
+
+    A "stage" event is sent whenever the job changes state or stage (e.g.
+    "queued", "load_model", "edit", "classify", or "queued" again before a
+    retry), then a final "done" or "failed" event carries the full status.
+
+    Parameters
+    ----------
+    job_id : str
+        The identifier of the job.
+
+    Returns
+    -------
+    StreamingResponse
+        The `text/event-stream` of the job.
+    """
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    async def stream_events():
+        nonlocal job
+        last_progress = None
+        last_sent = time.monotonic()
+        while job is not None:
+            status = job_status(job)
+            if job["state"] in (DONE, FAILED):
+                yield f"event: {job['state']}\ndata: {json.dumps(status)}\n\n"
+                return
+            progress = (job["state"], job["stage"], job["attempts"])
+            if progress != last_progress:
+                last_progress, last_sent = progress, time.monotonic()
+                yield f"event: stage\ndata: {json.dumps(status)}\n\n"
+            elif time.monotonic() - last_sent > 15:
+                # keeps proxies from closing an idle connection
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(config.job_poll_interval)
+            job = await run_in_threadpool(job_queue.get, job_id)
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
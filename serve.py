@@ -0,0 +1,285 @@
+"""
+Pre-fork launcher serving the app with several worker processes.
+
+`uvicorn main:app --workers N` starts every worker from scratch, so each of
+them loads its own copy of the model weights. This launcher loads the
+models once in the parent process and then forks the workers, which share
+the weight pages copy-on-write: the forward pass only reads them, so they
+are never duplicated. The memory-mapped tensor store and the image catalog
+are shared the same way.
+
+The torch thread pools do not survive a fork, so the parent never runs a
+forward pass: each worker sizes its pools and warms the models up after
+being forked. The number of workers and of torch threads per worker are
+configured together; by default the cores are split evenly between the
+workers. Models run by ONNX Runtime, whose sessions start their own
+threads, are loaded by each worker instead. The job workers are started
+by the parent process only, and shared by all the workers.
+
+The memory used by each worker is reported once all of them are ready and
+then every `server_memory_report_interval` seconds. The private memory of
+a worker is what each extra worker costs; the shared weights are counted
+once in the proportional set size (PSS).
+
+Usage::
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import time
+from typing import Optional
+
+import torch
+import uvicorn
+
+from app.config import Configuration
+from app.startup import FAILED, READY, StartupMonitor
+
+conf = Configuration()
+
+
+def worker_threads(workers: int, threads: Optional[int]) -> int:
+    """
+    Chooses the number of torch intra-op threads of each worker.
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes.
+    threads : int or None
+        The requested number of threads per worker, or `None` to split the
+        cores evenly between the workers.
+
+    Returns
+    -------
+    int
+        The number of threads per worker.
+    """
+    cores = os.cpu_count() or 1
+    if threads is None:
+        return max(1, cores // workers)
+    if workers * threads > cores:
+        logging.warning(f"{workers} workers x {threads} threads oversubscribe the {cores} cores")
+    return threads
+
+
+def process_memory(pid: int) -> dict[str, float]:
+    """
+    Reads the memory used by a process from `/proc`.
+
+    Parameters
+    ----------
+    pid : int
+        The process identifier.
+
+    Returns
+    -------
+    dict
+        The resident ("rss"), proportional ("pss") and private ("private")
+        memory of the process, in MB.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def report_memory(parent_pid: int, workers: dict[int, int]) -> None:
+    """
+    Logs the memory used by the parent and each worker.
+
+    Parameters
+    ----------
+    parent_pid : int
+        The identifier of the parent process.
+    workers : dict
+        The identifier of each worker process mapped to its index.
+    """
+    lines = [f"{'process':<12}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'private MB':>12}"]
+    private = []
+    for name, pid in [("parent", parent_pid)] + [(f"worker {i}", pid) for pid, i in sorted(workers.items())]:
+        try:
+            memory = process_memory(pid)
+        except OSError:
+            continue
+        if name != "parent":
+            private.append(memory["private"])
+        lines.append(f"{name:<12}{pid:>8}{memory['rss']:>10.1f}{memory['pss']:>10.1f}{memory['private']:>12.1f}")
+    if private:
+        lines.append(f"each extra worker uses about {sum(private) / len(private):.1f} MB of private memory")
+    logging.info("Worker memory:\n" + "\n".join(lines))
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    Uvicorn server telling the parent when the app is ready to serve.
+
+    Attributes
+    ----------
+    ready_fd : int
+        The write end of the pipe read by the parent.
+    monitor : StartupMonitor
+        The startup monitor of the app, which warms the models up in the
+        background once the server started.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int, monitor: StartupMonitor) -> None:
+        super().__init__(config)
+        self.ready_fd = ready_fd
+        self.monitor = monitor
+        self._ready_task: Optional[asyncio.Task] = None
+
+    async def startup(self, sockets: Optional[list] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self._ready_task = asyncio.create_task(self.signal_ready())
+
+    async def signal_ready(self) -> None:
+        """
+        Tells the parent once the models are warm, or failed to warm up.
+        """
+        while self.monitor.phase not in (READY, FAILED):
+            await asyncio.sleep(0.1)
+        os.write(self.ready_fd, b"1")
+
+
+def run_worker(app, monitor: StartupMonitor, sock: socket.socket, ready_fd: int, log_level: str) -> None:
+    """
+    Serves the app on the inherited socket until told to stop.
+
+    Parameters
+    ----------
+    app : FastAPI
+        The app prepared by the parent.
+    monitor : StartupMonitor
+        The startup monitor of the app.
+    sock : socket.socket
+        The listening socket shared by the workers.
+    ready_fd : int
+        The write end of the pipe signalling readiness to the parent.
+    log_level : str
+        The log level of uvicorn.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, lifespan="on", log_level=log_level)
+    WorkerServer(config, ready_fd, monitor).run(sockets=[sock])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=conf.server_workers)
+    parser.add_argument("--threads", type=int, default=conf.intra_op_threads,
+                        help="torch intra-op threads per worker (default: split the cores)")
+    parser.add_argument("--report-interval", type=float, default=conf.server_memory_report_interval,
+                        help="seconds between two memory reports, 0 to report at startup only")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(message)s", force=True)
+
+    threads = worker_threads(args.workers, args.threads)
+    # read by the lifespan of every worker
+    Configuration.intra_op_threads = threads
+    if Configuration.onnx_intra_op_threads is None:
+        Configuration.onnx_intra_op_threads = threads
+    logging.info(f"Starting {args.workers} workers with {threads} torch threads each")
+
+    # the parent only loads the weights: a forward pass would start thread
+    # pools that the forked workers cannot use
+    torch.set_num_threads(1)
+    gc.disable()
+    import main as service
+    service.prepare_app(
+        m for m in conf.warm_up_models if conf.model_backends.get(m, "eager") != "onnx"
+    )
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logging.info(f"Listening on http://{args.host}:{args.port}")
+
+    # the objects created so far are never collected, so the collector of the
+    # workers does not write to their pages and they stay shared
+    gc.freeze()
+    gc.enable()
+
+    ready_read, ready_write = os.pipe()
+    workers: dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            status = 0
+            try:
+                run_worker(service.app, service.startup, sock, ready_write, args.log_level)
+            except BaseException:
+                logging.exception(f"Worker {index} failed")
+                status = 1
+            finally:
+                os._exit(status)
+        workers[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    # the forked workers see the supervisor as started and leave it alone
+    service.job_supervisor.start()
+    for index in range(args.workers):
+        spawn(index)
+
+    ready = 0
+    next_report = None
+    while workers:
+        readable, _, _ = select.select([ready_read], [], [], 1.0)
+        if readable:
+            ready += len(os.read(ready_read, 64))
+            if ready == args.workers and next_report is None:
+                next_report = time.monotonic()
+
+        # the job workers are reaped by their supervisor
+        for pid in list(workers):
+            exited, status = os.waitpid(pid, os.WNOHANG)
+            if exited == 0:
+                continue
+            index = workers.pop(pid)
+            if not stopping:
+                logging.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting it")
+                spawn(index)
+        if not stopping:
+            service.job_supervisor.supervise()
+
+        if next_report is not None and time.monotonic() >= next_report and not stopping:
+            report_memory(os.getpid(), workers)
+            next_report = (time.monotonic() + args.report_interval) if args.report_interval else float("inf")
+
+    service.job_supervisor.stop()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()